@@ -0,0 +1,139 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .models import Activity
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityRecorder:
+    """
+    Write-behind buffer for the activity log.
+
+    Views hand their activities to record() and return straight away. The
+    buffer is written with a single bulk_create once it holds
+    ACTIVITY_LOG_BUFFER_SIZE rows, every ACTIVITY_LOG_FLUSH_INTERVAL seconds,
+    and when the process exits. Set ACTIVITY_LOG_BUFFERED = False to write
+    each activity synchronously instead.
+
+    A batch the database turns down (failover, pool timeout) goes back to
+    the front of the buffer for the next flush. At most
+    ACTIVITY_LOG_MAX_PENDING activities are kept waiting; past that the
+    oldest are dropped.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, user, type, description):
+        activity = Activity(
+            user_id=user.pk,
+            type=type,
+            description=description,
+            timestamp=timezone.now()
+        )
+
+        if not settings.ACTIVITY_LOG_BUFFERED:
+            activity.save()
+            return
+
+        with self._lock:
+            self._buffer.append(activity)
+            full = len(self._buffer) >= settings.ACTIVITY_LOG_BUFFER_SIZE
+
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            activities, self._buffer = self._buffer, []
+
+        if activities:
+            unwritten = self._write(activities)
+            if unwritten:
+                self._requeue(unwritten)
+
+    def _write(self, activities):
+        """Write a batch. Returns the activities a database error left unwritten."""
+        try:
+            with transaction.atomic():
+                Activity.objects.bulk_create(activities)
+            return []
+        except IntegrityError:
+            # One bad row (e.g. the user was deleted in the meantime) shouldn't
+            # take the rest of the batch down with it.
+            self._unsaved(activities)
+        except Exception:
+            logger.exception("Couldn't write %d activities, keeping them for the next flush", len(activities))
+            return self._unsaved(activities)
+
+        for index, activity in enumerate(activities):
+            try:
+                with transaction.atomic():
+                    activity.save()
+            except IntegrityError as e:
+                logger.warning("Dropping activity %s for user %s: %s", activity.type, activity.user_id, e)
+            except Exception:
+                logger.exception("Couldn't write activities, keeping %d for the next flush", len(activities) - index)
+                return self._unsaved(activities[index:])
+        return []
+
+    def _unsaved(self, activities):
+        # bulk_create sets primary keys before the transaction commits
+        for activity in activities:
+            activity.pk = None
+            activity._state.adding = True
+        return activities
+
+    def _requeue(self, activities):
+        with self._lock:
+            # Ahead of anything recorded since, to keep them in order
+            self._buffer[:0] = activities
+            overflow = len(self._buffer) - settings.ACTIVITY_LOG_MAX_PENDING
+            if overflow > 0:
+                del self._buffer[:overflow]
+        if overflow > 0:
+            logger.error("Activity buffer over ACTIVITY_LOG_MAX_PENDING, dropped the %d oldest", overflow)
+
+    def _ensure_flusher(self):
+        # Threads don't survive a fork, so check the pid as well.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.ACTIVITY_LOG_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing activities")
+            finally:
+                # This thread's connection would otherwise stay open forever.
+                connections.close_all()
+
+
+activity_recorder = ActivityRecorder()
+atexit.register(activity_recorder.flush)
+
+
+def record_activity(user, type, description):
+    activity_recorder.record(user, type, description)
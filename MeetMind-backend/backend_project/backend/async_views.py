@@ -0,0 +1,183 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import router
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .cache import acached_room_list, acached_topic_list
+from .conditional import aroom_list_validators, aroom_validators, atopic_list_validators, not_modified, set_validators
+from .export import atranscript, transcript_response
+from .models import Message, Room
+from .pagination import InvalidCursor, MessageCursorPagination
+from .partitions import ArchivedHistory
+from .rows import MESSAGE_VALUES
+from .sync import room_changes, topic_changes
+from .views import MessageExportView, MessageListView, RoomDetailView, RoomListView, TopicListView, UserActivityView
+from .views import activity_data, cached_list_response, changes_response, message_page_response, recent_activities
+from .views import room_detail_data, room_detail_queryset, room_list_from, room_list_values, topic_list_from, topic_list_values
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with a coroutine dispatch, for running under the ASGI server.
+
+    `async def` handlers await the async ORM on the event loop instead of
+    holding a thread for the whole request. Plain `def` handlers (the write
+    paths, with their transactions) still work and are run in a worker
+    thread. Authentication and permission checks run in a worker thread
+    too, since SimpleJWT's authenticator is sync.
+    """
+
+    # Mixed sync/async handlers are fine here; dispatch adapts them.
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncUserActivityView(AsyncAPIView, UserActivityView):
+    async def get(self, request):
+        return Response([activity_data(activity) async for activity in recent_activities(request.user)])
+
+
+class AsyncMessageListView(AsyncAPIView, MessageListView):
+    async def get(self, request, room_id):
+        room = await Room.objects.only('id').aget(id=room_id)
+        messages = Message.objects.filter(room=room).values(*MESSAGE_VALUES)
+
+        try:
+            page, previous_cursor, next_cursor = await MessageCursorPagination().apaginate(
+                messages, request.query_params, archive=ArchivedHistory(room.id)
+            )
+        except InvalidCursor:
+            return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return message_page_response(page, previous_cursor, next_cursor)
+
+
+class AsyncMessageExportView(AsyncAPIView, MessageExportView):
+    # Django would buffer a sync iterator whole under ASGI; this one streams
+    async def get(self, request, pk):
+        try:
+            room = await Room.objects.only('id', 'creator_id').aget(pk=pk)
+        except Room.DoesNotExist:
+            return Response({'detail': 'Room not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        encoder, error = self.get_encoder(request, room)
+        if error is not None:
+            return error
+        using = router.db_for_read(Message)
+        content = atranscript(encoder, room.id, using, settings.MESSAGE_EXPORT_CHUNK_SIZE)
+        return transcript_response(encoder, room.id, content)
+
+
+class AsyncRoomListView(AsyncAPIView, RoomListView):
+    async def get(self, request):
+        try:
+            topic_id = request.query_params.get('topic')
+            if topic_id and not topic_id.isdigit():
+                return Response({'detail': 'Invalid topic.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            since = request.query_params.get('since')
+            if since is not None:
+                return await sync_to_async(changes_response)(room_changes, topic_id, since)
+
+            async def build():
+                return room_list_from([row async for row in room_list_values(topic_id)], topic_id)
+
+            etag, last_modified = await aroom_list_validators(topic_id)
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            return cached_list_response(*await acached_room_list(topic_id, build))
+        except Exception as e:
+            import traceback
+            print(f"Error in AsyncRoomListView: {str(e)}")
+            print(traceback.format_exc())
+            return Response({
+                "error": "Failed to fetch rooms. Please try again later.",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncRoomDetailView(AsyncAPIView, RoomDetailView):
+    # put, delete and post (join/leave) are inherited and run in a thread.
+
+    async def get(self, request, pk):
+        try:
+            etag, last_modified = await aroom_validators(pk)
+            if etag:
+                response = not_modified(request, etag, last_modified)
+                if response is not None:
+                    return response
+
+            room = await room_detail_queryset().aget(pk=pk)
+            data = room_detail_data(room, [participant async for participant in room.participants.values('id')])
+            return set_validators(Response(data, status=status.HTTP_200_OK), etag, last_modified)
+        except Room.DoesNotExist:
+            print(f"Room with ID {pk} does not exist")
+            return Response({'detail': 'Room not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class AsyncTopicListView(AsyncAPIView, TopicListView):
+    async def get(self, request):
+        try:
+            since = request.query_params.get('since')
+            if since is not None:
+                return await sync_to_async(changes_response)(topic_changes, since)
+
+            async def build():
+                return topic_list_from([row async for row in topic_list_values()])
+
+            etag, last_modified = await atopic_list_validators()
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            return cached_list_response(*await acached_topic_list(build))
+        except Exception as e:
+            import traceback
+            print(f"Error in AsyncTopicListView: {str(e)}")
+            print(traceback.format_exc())
+            return Response({"error": "Failed to fetch topics. Please try again later."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+ASYNC_VERSIONS = {
+    UserActivityView: AsyncUserActivityView,
+    MessageListView: AsyncMessageListView,
+    MessageExportView: AsyncMessageExportView,
+    RoomListView: AsyncRoomListView,
+    RoomDetailView: AsyncRoomDetailView,
+    TopicListView: AsyncTopicListView,
+}
+
+
+def read_view(view_class):
+    """The async version of a read-heavy view, unless ASYNC_VIEWS is off."""
+    if settings.ASYNC_VIEWS:
+        return ASYNC_VERSIONS.get(view_class, view_class)
+    return view_class
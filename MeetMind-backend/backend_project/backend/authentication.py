@@ -0,0 +1,132 @@
+import copy
+import threading
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """
+    Short-lived per-process cache of authenticated users, with their profile
+    already attached.
+
+    Entries are keyed by user id and the token version (the password hash
+    claim, when token revocation is on), so a token issued before a password
+    change never matches a cached user. Saves to the user or profile drop
+    the entry in this process; other processes see the change once the TTL
+    runs out.
+    """
+
+    MAX_ENTRIES = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    # Token claims carry the id as a string, signals have the int.
+    def get(self, user_id, token_version):
+        with self._lock:
+            entry = self._entries.get(str(user_id))
+        if entry is None:
+            return None
+        expires, version, user = entry
+        if version != token_version or expires < time.monotonic():
+            return None
+        # Views are free to modify request.user, so every request gets its own copy.
+        return copy.deepcopy(user)
+
+    def set(self, user_id, token_version, user):
+        expires = time.monotonic() + settings.AUTH_USER_CACHE_TTL
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[str(user_id)] = (expires, token_version, copy.deepcopy(user))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the user together with their profile in one
+    query, and skips the query entirely while the user is in user_cache.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        token_version = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+        if settings.AUTH_USER_CACHE_TTL > 0:
+            user = user_cache.get(user_id, token_version)
+            if user is not None:
+                return user
+
+        try:
+            user = self.user_model.objects.select_related('profile').get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN and token_version != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        if settings.AUTH_USER_CACHE_TTL > 0:
+            user_cache.set(user_id, token_version, user)
+        return user
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    # Same validation the REST views run, so a token that works for
+    # /api/ also works for the websocket routes.
+    authentication = CachedJWTAuthentication()
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates websocket connections with the SimpleJWT access token.
+
+    Browsers can't set an Authorization header on a websocket, so the token
+    is passed as a query string parameter: ws://host/ws/rooms/1/?token=<access>
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        token = query.get('token', [None])[0]
+
+        if token:
+            scope['user'] = await get_user_for_token(token)
+        else:
+            scope['user'] = AnonymousUser()
+
+        return await super().__call__(scope, receive, send)
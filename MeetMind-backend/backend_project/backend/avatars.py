@@ -0,0 +1,75 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .authentication import user_cache
+from .models import Profile
+from .tasks import run_in_background
+
+# Square variants generated for every uploaded avatar, by name and edge in px.
+AVATAR_SIZES = {
+    'small': 64,
+    'medium': 128,
+    'large': 256,
+}
+DEFAULT_AVATAR_SIZE = 'medium'
+
+
+def render_variants(image_file):
+    """Decode an uploaded image once and return {size name: webp bytes}."""
+    with Image.open(image_file) as image:
+        # Let the JPEG decoder downscale while decoding instead of
+        # materialising the full-resolution bitmap.
+        largest = max(AVATAR_SIZES.values())
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+        variants = {}
+        for name, edge in AVATAR_SIZES.items():
+            resized = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, format='WEBP', quality=85, method=4)
+            variants[name] = buffer.getvalue()
+        return variants
+
+
+def process_avatar(profile_id, original_name):
+    profile = Profile.objects.filter(pk=profile_id, avatar=original_name).first()
+    if profile is None:
+        # The avatar was replaced or removed before we got to it.
+        return
+
+    with profile.avatar.open('rb') as image_file:
+        rendered = render_variants(image_file)
+
+    variants = {}
+    for name, content in rendered.items():
+        # Content-hashed, so the files can be cached forever by clients.
+        digest = hashlib.sha256(content).hexdigest()[:20]
+        path = f'avatars/{name}/{digest}.webp'
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+        variants[name] = path
+
+    Profile.objects.filter(pk=profile_id, avatar=original_name).update(avatar_variants=variants)
+    # update() doesn't send post_save
+    user_cache.invalidate(profile.user_id)
+
+
+def schedule_avatar_processing(profile):
+    run_in_background(process_avatar, profile.pk, profile.avatar.name)
+
+
+def avatar_urls(profile):
+    if profile is None:
+        return {}
+    return {name: default_storage.url(path) for name, path in profile.avatar_variants.items()}
+
+
+def avatar_url(profile, size=DEFAULT_AVATAR_SIZE):
+    # Only processed variants are handed out; the original upload can be
+    # several megabytes. Until processing finishes there is no avatar.
+    return avatar_urls(profile).get(size)
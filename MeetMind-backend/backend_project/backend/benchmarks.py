@@ -0,0 +1,587 @@
+"""
+Benchmark harness for the REST API.
+
+``manage.py seed_benchmark_data`` fills the database with a reproducible
+dataset and ``manage.py run_benchmarks`` replays every route in
+backend/urls.py against it in-process, reporting latency percentiles,
+throughput and queries per request as JSON. Writes are rolled back after
+each request so runs can be repeated against the same data.
+"""
+import asyncio
+import random
+import statistics
+import types
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, path
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .async_views import ASYNC_VERSIONS, AsyncAPIView
+from .models import Activity, Message, Profile, Room, Topic, User
+from .partitions import ensure_partitions
+from .renderers import ORJSONRenderer
+from .rows import MESSAGE_VALUES, ROOM_VALUES, TOPIC_VALUES, message_rows, room_rows, topic_rows
+from .serializers import MessageSerializer, RoomSerializer, TopicSerializer
+from .sync import encode_cursor as encode_sync_cursor
+
+PREFIX = 'bench'
+PASSWORD = 'benchmark-pass-123'
+ACTIVITY_TYPES = ['JOIN_ROOM', 'LEAVE_ROOM', 'EDIT_ROOM', 'DELETE_ROOM', 'UPDATE_PROFILE']
+WORDS = (
+    'algebra biology calculus chemistry data derivative django exam function graph history '
+    'homework integral java lecture matrix notes physics practice python question react '
+    'review statistics study theorem vector'
+).split()
+
+
+def sentence(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def clear_dataset():
+    Topic.objects.filter(name__startswith=f'{PREFIX} ').delete()
+    User.objects.filter(username__startswith=f'{PREFIX}_').delete()
+
+
+def seed_dataset(users, topics, rooms, participants, messages, activities, days, seed):
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+
+    user_rows = User.objects.bulk_create([
+        User(username=f'{PREFIX}_user_{i}', email=f'{PREFIX}_user_{i}@example.com', password=password)
+        for i in range(users)
+    ], batch_size=1000)
+    user_rows[0].is_staff = True
+    user_rows[0].save(update_fields=['is_staff'])
+
+    Profile.objects.bulk_create([
+        Profile(user=user, bio=sentence(rng), full_name=f'Benchmark User {i}')
+        for i, user in enumerate(user_rows) if i % 2 == 0
+    ], batch_size=1000)
+
+    topic_rows = Topic.objects.bulk_create([
+        Topic(name=f'{PREFIX} topic {i}', description=sentence(rng))
+        for i in range(topics)
+    ])
+
+    room_rows = Room.objects.bulk_create([
+        Room(
+            creator=rng.choice(user_rows),
+            topic=rng.choice(topic_rows),
+            name=f'{PREFIX} room {i}',
+            description=sentence(rng, 16)
+        )
+        for i in range(rooms)
+    ], batch_size=1000)
+
+    Membership = Room.participants.through
+    memberships = []
+    for room in room_rows:
+        members = rng.sample(user_rows, min(len(user_rows), rng.randint(0, participants * 2)))
+        memberships.extend(Membership(room_id=room.id, user_id=user.id) for user in members)
+    Membership.objects.bulk_create(memberships, batch_size=5000)
+
+    first_message_id = None
+    for start in range(0, messages, 5000):
+        batch = Message.objects.bulk_create([
+            Message(room=rng.choice(room_rows), author=rng.choice(user_rows), content=sentence(rng, rng.randint(3, 30)))
+            for _ in range(min(5000, messages - start))
+        ])
+        if first_message_id is None:
+            first_message_id = batch[0].id
+
+    if first_message_id is not None:
+        # created_at is auto_now_add, so spread the history over time in SQL,
+        # once every month it lands in has a partition.
+        ensure_partitions(timezone.now() - timedelta(days=days), timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', [(seed % 1000) / 1000])
+            cursor.execute(
+                "UPDATE backend_message SET created_at = now() - random() * %s * interval '1 day' WHERE id >= %s",
+                [days, first_message_id]
+            )
+
+    now = timezone.now()
+    Activity.objects.bulk_create([
+        Activity(
+            user=rng.choice(user_rows),
+            type=rng.choice(ACTIVITY_TYPES),
+            description=sentence(rng, 4),
+            timestamp=now - timedelta(days=rng.random() * days)
+        )
+        for _ in range(activities)
+    ], batch_size=5000)
+
+    call_command('rebuild_topic_room_counts', verbosity=0)
+    # The memberships went in with bulk_create, which the recommendation signals don't see
+    call_command('build_room_similarity', verbosity=0)
+
+    return {
+        'users': len(user_rows),
+        'topics': len(topic_rows),
+        'rooms': len(room_rows),
+        'participants': len(memberships),
+        'messages': messages,
+        'activities': activities,
+    }
+
+
+def url_names(patterns):
+    names = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names.extend(url_names(pattern.url_patterns))
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.append(pattern.name)
+    return names
+
+
+class BenchmarkContext:
+    """Bench users with their access tokens, plus the rooms and topics to hit."""
+
+    def __init__(self, seed, pool_size=50):
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        users = list(User.objects.filter(username__startswith=f'{PREFIX}_').order_by('id')[:pool_size])
+        if not users:
+            raise RuntimeError('No benchmark data found. Run manage.py seed_benchmark_data first.')
+
+        self.users = users
+        self.tokens = {user.id: str(RefreshToken.for_user(user).access_token) for user in users}
+        self.admin = User.objects.filter(username__startswith=f'{PREFIX}_', is_staff=True).first() or users[0]
+        self.tokens.setdefault(self.admin.id, str(RefreshToken.for_user(self.admin).access_token))
+        self.room_ids = list(Room.objects.filter(name__startswith=f'{PREFIX} ').values_list('id', flat=True))
+        self.topic_ids = list(Topic.objects.filter(name__startswith=f'{PREFIX} ').values_list('id', flat=True))
+        self.owned_rooms = dict(
+            Room.objects.filter(creator__in=users).values_list('creator_id', 'id')
+        )
+        self.counter = 0
+        # Delta sync from an hour ago
+        self.sync_cursor = encode_sync_cursor(timezone.now() - timedelta(hours=1))
+
+    def choice(self, values):
+        with self._lock:
+            return self.rng.choice(values)
+
+    def user(self):
+        return self.choice(self.users)
+
+    def unique(self):
+        with self._lock:
+            self.counter += 1
+            return self.counter
+
+    def room_owner(self):
+        user_id = self.choice(list(self.owned_rooms))
+        return next(user for user in self.users if user.id == user_id), self.owned_rooms[user_id]
+
+
+# One scenario per URL name in backend/urls.py: (label, build(ctx) -> (user, method, path, data))
+SCENARIOS = {
+    'login': [
+        ('POST /api/login/', lambda ctx: (None, 'post', '/api/login/', {'email': ctx.user().email, 'password': PASSWORD})),
+    ],
+    'signup': [
+        ('POST /api/signup/', lambda ctx: (None, 'post', '/api/signup/', {
+            'username': f'{PREFIX}_signup_{ctx.unique()}',
+            'email': f'{PREFIX}_signup_{ctx.unique()}@example.com',
+            'password': PASSWORD,
+        })),
+    ],
+    'create-room': [
+        ('POST /api/rooms/create/', lambda ctx: (ctx.user(), 'post', '/api/rooms/create/', {
+            'name': f'{PREFIX} new room', 'description': 'Benchmark room', 'topic': f'{PREFIX} topic 0',
+        })),
+    ],
+    'list-rooms': [
+        ('GET /api/rooms/', lambda ctx: (ctx.user(), 'get', '/api/rooms/', None)),
+        ('GET /api/rooms/?topic=', lambda ctx: (ctx.user(), 'get', '/api/rooms/', {'topic': ctx.choice(ctx.topic_ids)})),
+        ('GET /api/rooms/?since=', lambda ctx: (ctx.user(), 'get', '/api/rooms/', {'since': ctx.sync_cursor})),
+    ],
+    'room-detail': [
+        ('GET /api/rooms/<pk>/', lambda ctx: (ctx.user(), 'get', f'/api/rooms/{ctx.choice(ctx.room_ids)}/', None)),
+        ('PUT /api/rooms/<pk>/', lambda ctx: (lambda owner, room_id: (owner, 'put', f'/api/rooms/{room_id}/', {
+            'description': 'Edited by the benchmark',
+        }))(*ctx.room_owner())),
+        ('DELETE /api/rooms/<pk>/', lambda ctx: (lambda owner, room_id: (owner, 'delete', f'/api/rooms/{room_id}/', None))(*ctx.room_owner())),
+    ],
+    'join-room': [
+        ('POST /api/rooms/<pk>/join/', lambda ctx: (ctx.user(), 'post', f'/api/rooms/{ctx.choice(ctx.room_ids)}/join/', None)),
+    ],
+    'leave-room': [
+        ('POST /api/rooms/<pk>/leave/', lambda ctx: (ctx.user(), 'post', f'/api/rooms/{ctx.choice(ctx.room_ids)}/leave/', None)),
+    ],
+    'user-profile': [
+        ('GET /api/users/me/', lambda ctx: (ctx.user(), 'get', '/api/users/me/', None)),
+        ('PUT /api/users/me/', lambda ctx: (ctx.user(), 'put', '/api/users/me/', {'full_name': 'Benchmark User'})),
+    ],
+    'topic-list': [
+        ('GET /api/topics/', lambda ctx: (ctx.user(), 'get', '/api/topics/', None)),
+        ('GET /api/topics/?since=', lambda ctx: (ctx.user(), 'get', '/api/topics/', {'since': ctx.sync_cursor})),
+    ],
+    'message-list': [
+        ('GET /api/rooms/<id>/messages/', lambda ctx: (ctx.user(), 'get', f'/api/rooms/{ctx.choice(ctx.room_ids)}/messages/', None)),
+        ('POST /api/rooms/<id>/messages/', lambda ctx: (ctx.user(), 'post', f'/api/rooms/{ctx.choice(ctx.room_ids)}/messages/', {
+            'content': 'Benchmark message',
+        })),
+    ],
+    'message-export': [
+        ('GET /api/rooms/<pk>/messages/export/', lambda ctx: (ctx.admin, 'get', f'/api/rooms/{ctx.choice(ctx.room_ids)}/messages/export/', None)),
+        ('GET /api/rooms/<pk>/messages/export/?as=csv', lambda ctx: (
+            ctx.admin, 'get', f'/api/rooms/{ctx.choice(ctx.room_ids)}/messages/export/', {'as': 'csv'},
+        )),
+    ],
+    'similar-rooms': [
+        ('GET /api/rooms/<pk>/similar/', lambda ctx: (ctx.user(), 'get', f'/api/rooms/{ctx.choice(ctx.room_ids)}/similar/', None)),
+    ],
+    'recommended-rooms': [
+        ('GET /api/rooms/recommended/', lambda ctx: (ctx.user(), 'get', '/api/rooms/recommended/', None)),
+    ],
+    'recent-activities': [
+        ('GET /api/recent-activities/', lambda ctx: (ctx.user(), 'get', '/api/recent-activities/', None)),
+    ],
+    'topic-detail': [
+        ('GET /api/topics/<pk>/', lambda ctx: (ctx.user(), 'get', f'/api/topics/{ctx.choice(ctx.topic_ids)}/', None)),
+    ],
+    'cache-stats': [
+        ('GET /api/cache/stats/', lambda ctx: (ctx.admin, 'get', '/api/cache/stats/', None)),
+    ],
+    'metrics': [
+        ('GET /api/metrics/', lambda ctx: (ctx.admin, 'get', '/api/metrics/', None)),
+    ],
+    'dashboard': [
+        ('GET /api/dashboard/', lambda ctx: (ctx.user(), 'get', '/api/dashboard/', None)),
+    ],
+    'health': [
+        ('GET /api/health/', lambda ctx: (None, 'get', '/api/health/', None)),
+    ],
+    'room-presence': [
+        ('GET /api/rooms/<pk>/presence/', lambda ctx: (ctx.user(), 'get', f'/api/rooms/{ctx.choice(ctx.room_ids)}/presence/', None)),
+        ('POST /api/rooms/<pk>/presence/', lambda ctx: (ctx.user(), 'post', f'/api/rooms/{ctx.choice(ctx.room_ids)}/presence/', None)),
+    ],
+    'presence': [
+        ('GET /api/presence/', lambda ctx: (ctx.user(), 'get', '/api/presence/', {
+            'rooms': ','.join(str(room_id) for room_id in ctx.room_ids[:20]),
+        })),
+    ],
+    'search': [
+        ('GET /api/search/', lambda ctx: (ctx.user(), 'get', '/api/search/', {'q': ctx.choice(WORDS)})),
+        ('GET /api/search/?type=messages', lambda ctx: (ctx.user(), 'get', '/api/search/', {
+            'q': ctx.choice(WORDS), 'type': 'messages',
+        })),
+    ],
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def read_body(response):
+    # A streamed body is only produced as it's read, so reading it is part of the request
+    if not response.streaming:
+        return
+    if response.is_async:
+        async def drain():
+            async for _ in response.streaming_content:
+                pass
+        async_to_sync(drain)()
+    else:
+        for _ in response.streaming_content:
+            pass
+
+
+def perform_request(ctx, build):
+    user, method, path, data = build(ctx)
+    client = Client(HTTP_HOST='localhost')
+    headers = {}
+    if user is not None:
+        headers['HTTP_AUTHORIZATION'] = f'Bearer {ctx.tokens[user.id]}'
+
+    kwargs = dict(headers)
+    if data is not None:
+        kwargs['data'] = data
+        if method != 'get':
+            kwargs['content_type'] = 'application/json'
+
+    result = {}
+    try:
+        # Roll every request back so runs stay reproducible.
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                read_body(response)
+                result['elapsed'] = time.perf_counter() - start
+            result['queries'] = len(queries)
+            result['status'] = response.status_code
+            raise _Rollback()
+    except _Rollback:
+        pass
+    return result
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(ctx, build, requests, concurrency, warmup):
+    for _ in range(warmup):
+        perform_request(ctx, build)
+
+    def worker(count):
+        try:
+            return [perform_request(ctx, build) for _ in range(count)]
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        results = [perform_request(ctx, build) for _ in range(requests)]
+    else:
+        shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = [r for chunk in pool.map(worker, shares) for r in chunk]
+    wall = time.perf_counter() - start
+
+    summary = summarize(results, wall, concurrency)
+    summary['queries_per_request'] = round(statistics.fmean(r['queries'] for r in results), 2)
+    return summary
+
+
+def summarize(results, wall, concurrency):
+    latencies = sorted(r['elapsed'] * 1000 for r in results)
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'throughput_rps': round(len(results) / wall, 2) if wall else None,
+        'latency_ms': {
+            'mean': round(statistics.fmean(latencies), 3),
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p95': round(percentile(latencies, 0.95), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(latencies[-1], 3),
+        },
+        'status_codes': dict(Counter(str(r['status']) for r in results)),
+    }
+
+
+def run_benchmarks(requests, concurrency, warmup, seed, only=None, throttling=False):
+    # The rate limits would turn most login and message POSTs into 429s,
+    # so they're off unless the throttles themselves are being measured.
+    with override_settings(THROTTLING=throttling):
+        return _run_benchmarks(requests, concurrency, warmup, seed, only)
+
+
+def _run_benchmarks(requests, concurrency, warmup, seed, only):
+    from . import urls
+
+    ctx = BenchmarkContext(seed)
+    routes = url_names(urls.urlpatterns)
+    report = {
+        'dataset': {
+            'users': User.objects.filter(username__startswith=f'{PREFIX}_').count(),
+            'rooms': len(ctx.room_ids),
+            'topics': len(ctx.topic_ids),
+            'messages': Message.objects.filter(room_id__in=ctx.room_ids).count(),
+        },
+        'settings': {'requests': requests, 'concurrency': concurrency, 'warmup': warmup, 'seed': seed},
+        'missing_scenarios': [name for name in routes if name not in SCENARIOS],
+        'results': {},
+    }
+
+    for name in routes:
+        if only and name not in only:
+            continue
+        for label, build in SCENARIOS.get(name, []):
+            report['results'][label] = run_scenario(ctx, build, requests, concurrency, warmup)
+
+    return report
+
+
+# Read endpoints that have an async version in backend/async_views.py.
+CONCURRENCY_ROUTES = ['list-rooms', 'room-detail', 'message-list', 'topic-list', 'recent-activities']
+
+
+def urlconf(use_async):
+    """backend.urls with every view that has an async version swapped to it, or back to the sync one."""
+    from . import urls
+
+    sync_versions = {async_view: sync_view for sync_view, async_view in ASYNC_VERSIONS.items()}
+    patterns = []
+    for pattern in urls.urlpatterns:
+        view_class = pattern.callback.view_class
+        if use_async:
+            view_class = ASYNC_VERSIONS.get(view_class, view_class)
+        elif issubclass(view_class, AsyncAPIView):
+            view_class = sync_versions[view_class]
+        patterns.append(path(str(pattern.pattern), view_class.as_view(), pattern.default_args, name=pattern.name))
+    module = types.ModuleType(f"benchmark_urls_{'async' if use_async else 'sync'}")
+    module.urlpatterns = patterns
+    return module
+
+
+async def asgi_request(app, token, request_path, query):
+    query_string = '&'.join(f'{key}={value}' for key, value in (query or {}).items())
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': request_path,
+        'raw_path': request_path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    body_sent = False
+    disconnected = asyncio.Event()
+    result = {}
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django listens for a client disconnect while the view runs.
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    result['elapsed'] = time.perf_counter() - start
+    disconnected.set()
+    return result
+
+
+async def run_concurrency_scenario(app, ctx, build, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        user, method, request_path, data = build(ctx)
+        async with semaphore:
+            return await asgi_request(app, ctx.tokens[user.id], request_path, data)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    return summarize(results, time.perf_counter() - start, concurrency)
+
+
+def run_concurrency_benchmarks(requests, levels, seed, only=None):
+    """
+    Sync vs async versions of the read endpoints, each served by one
+    in-process ASGI app (one worker) at increasing client concurrency.
+    """
+    ctx = BenchmarkContext(seed)
+    app = ASGIHandler()
+    report = {
+        'settings': {'requests': requests, 'concurrency_levels': levels, 'seed': seed},
+        'results': {},
+    }
+
+    for mode in ('sync', 'async'):
+        with override_settings(ROOT_URLCONF=urlconf(mode == 'async')):
+            for name in CONCURRENCY_ROUTES:
+                if only and name not in only:
+                    continue
+                for label, build in SCENARIOS[name]:
+                    if build(ctx)[1] != 'get':
+                        continue
+                    runs = report['results'].setdefault(label, {}).setdefault(mode, {})
+                    for concurrency in levels:
+                        runs[str(concurrency)] = asyncio.run(
+                            run_concurrency_scenario(app, ctx, build, requests, concurrency)
+                        )
+        connections.close_all()
+
+    return report
+
+
+def serialization_cases():
+    """(label, queryset, serializer class, .values() fields, row builder) for the list endpoint payloads."""
+    rooms = Room.objects.with_participant_ids().filter(name__startswith=f'{PREFIX} ')
+    busiest = (
+        Room.objects.filter(name__startswith=f'{PREFIX} ').annotate(count=Count('messages'))
+        .order_by('-count').values_list('id', flat=True).first()
+    )
+    topic_id = Topic.objects.filter(name__startswith=f'{PREFIX} ').values_list('id', flat=True).first()
+    return [
+        ('GET /api/rooms/', rooms, RoomSerializer, ROOM_VALUES, room_rows),
+        ('GET /api/rooms/?topic=', rooms.filter(topic_id=topic_id), RoomSerializer, ROOM_VALUES, room_rows),
+        ('GET /api/topics/', Topic.objects.defer('search_vector'), TopicSerializer, TOPIC_VALUES, topic_rows),
+        (
+            'GET /api/rooms/<id>/messages/?limit=200',
+            Message.objects.filter(room_id=busiest).defer('search_vector').order_by('-created_at', '-id')[:200],
+            MessageSerializer, MESSAGE_VALUES, message_rows,
+        ),
+    ]
+
+
+def cpu_time(build, repeat):
+    """Median CPU seconds of this process per call; the database's own time isn't counted."""
+    times = []
+    for _ in range(repeat):
+        start = time.process_time()
+        build()
+        times.append(time.process_time() - start)
+    return statistics.median(times)
+
+
+def run_serialization_benchmarks(repeat, warmup):
+    """
+    CPU cost of building and rendering the list endpoint payloads: model
+    instances through the serializers and JSONRenderer (the old path)
+    against .values() rows and ORJSONRenderer (what the views do now).
+    """
+    if not Room.objects.filter(name__startswith=f'{PREFIX} ').exists():
+        raise RuntimeError('No benchmark data found. Run manage.py seed_benchmark_data first.')
+
+    report = {'settings': {'repeat': repeat, 'warmup': warmup}, 'results': {}}
+    for label, queryset, serializer_class, fields, build_rows in serialization_cases():
+        def serializer_path():
+            return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+        def rows_path():
+            return ORJSONRenderer().render(build_rows(queryset.values(*fields)))
+
+        expected = serializer_path()
+        for _ in range(warmup):
+            serializer_path()
+            rows_path()
+
+        serializer_cpu = cpu_time(serializer_path, repeat)
+        rows_cpu = cpu_time(rows_path, repeat)
+        report['results'][label] = {
+            'rows': len(queryset.all()),
+            'bytes': len(expected),
+            'identical': rows_path() == expected,
+            'serializer_cpu_ms': round(serializer_cpu * 1000, 3),
+            'values_orjson_cpu_ms': round(rows_cpu * 1000, 3),
+            'speedup': round(serializer_cpu / rows_cpu, 2) if rows_cpu else None,
+        }
+
+    return report
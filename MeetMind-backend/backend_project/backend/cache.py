@@ -0,0 +1,132 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .routers import use_primary
+
+
+# Each cached listing is stored under a key that embeds "generation"
+# numbers. Invalidating bumps a generation instead of deleting entries, so a
+# response built while a write was in flight can never be stored under the
+# new generation and served afterwards.
+ROOMS = 'rooms'
+TOPICS = 'topics'
+
+
+def room_scope(topic_id):
+    return f'rooms:{topic_id}' if topic_id else 'rooms:all'
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def as_dict(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+stats = CacheStats()
+
+
+# Bumped when the shape of the cached data changes, so a shared cache
+# doesn't hand entries written by the previous release to the new one.
+RESPONSE_KEY_PREFIX = 'api:response:v2:'
+
+
+def _generation_key(scope):
+    return f'api:gen:{scope}'
+
+
+def _new_generation():
+    # Time based, so a generation key that was evicted never comes back with
+    # a value an old entry was stored under.
+    return time.time_ns()
+
+
+def _generations(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [str(found[key]) for key in keys]
+
+
+async def _agenerations(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    found = await cache.aget_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, None)
+        found.update(missing)
+    return [str(found[key]) for key in keys]
+
+
+def invalidate(*scopes):
+    cache.set_many({_generation_key(scope): _new_generation() for scope in scopes}, None)
+
+
+def get_or_build(scopes, build):
+    """
+    Return the cached response data for `scopes`, building and caching it
+    with `build()` on a miss. Returns (data, hit).
+    """
+    key = RESPONSE_KEY_PREFIX + ':'.join(list(scopes) + _generations(scopes))
+    data = cache.get(key)
+    if data is not None:
+        stats.hit()
+        return data, True
+
+    stats.miss()
+    # Built from the primary: a lagging replica would otherwise be cached
+    # for everyone until the next change.
+    with use_primary():
+        data = build()
+    cache.set(key, data, settings.API_CACHE_TIMEOUT)
+    return data, False
+
+
+async def aget_or_build(scopes, build):
+    """Async get_or_build(), for the async views. `build` is a coroutine function."""
+    key = RESPONSE_KEY_PREFIX + ':'.join(list(scopes) + await _agenerations(scopes))
+    data = await cache.aget(key)
+    if data is not None:
+        stats.hit()
+        return data, True
+
+    stats.miss()
+    with use_primary():
+        data = await build()
+    await cache.aset(key, data, settings.API_CACHE_TIMEOUT)
+    return data, False
+
+
+def cached_room_list(topic_id, build):
+    # Every room list also depends on the global ROOMS generation, which is
+    # bumped when we can't tell which topics a change touched.
+    return get_or_build([ROOMS, room_scope(topic_id)], build)
+
+
+def cached_topic_list(build):
+    return get_or_build([TOPICS], build)
+
+
+async def acached_room_list(topic_id, build):
+    return await aget_or_build([ROOMS, room_scope(topic_id)], build)
+
+
+async def acached_topic_list(build):
+    return await aget_or_build([TOPICS], build)
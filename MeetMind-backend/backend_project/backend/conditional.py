@@ -0,0 +1,145 @@
+"""
+ETag / Last-Modified support for the room, topic and profile responses.
+
+The validators come from small aggregate queries (max `updated`, row
+count), so a client holding a current copy gets a 304 without the rows
+being loaded or serialized. Room.updated is bumped by every room edit,
+join and leave, Topic.updated by renames and room count changes, and
+signals.touch_user_rooms covers rooms a deleted user was part of.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Room, Topic
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def latest(*timestamps):
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response if the client's copy is still current, otherwise None."""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    if etag:
+        response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    # Let browsers keep the body but check back with us before reusing it.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def _room(row, pk):
+    if row is None:
+        return None, None
+    updated, topic_updated = row
+    return make_etag('room', pk, updated.isoformat(), topic_updated.isoformat()), latest(updated, topic_updated)
+
+
+def room_validators(pk):
+    """(etag, last_modified) for one room; (None, None) if it doesn't exist."""
+    return _room(Room.objects.filter(pk=pk).values_list('updated', 'topic__updated').first(), pk)
+
+
+async def aroom_validators(pk):
+    return _room(await Room.objects.filter(pk=pk).values_list('updated', 'topic__updated').afirst(), pk)
+
+
+def _room_list_query(topic_id):
+    rooms = Room.objects.order_by()
+    if topic_id:
+        rooms = rooms.filter(topic_id=topic_id)
+    return rooms
+
+
+def _room_list(totals, topic_id):
+    last_modified = latest(totals['updated'], totals['topic_updated'])
+    etag = make_etag(
+        'rooms', topic_id or 'all', totals['count'],
+        last_modified.isoformat() if last_modified else None,
+    )
+    return etag, last_modified
+
+
+ROOM_LIST_TOTALS = {'count': Count('id'), 'updated': Max('updated'), 'topic_updated': Max('topic__updated')}
+
+
+def room_list_validators(topic_id):
+    # Count catches deletions, which don't move the max timestamp.
+    return _room_list(_room_list_query(topic_id).aggregate(**ROOM_LIST_TOTALS), topic_id)
+
+
+async def aroom_list_validators(topic_id):
+    return _room_list(await _room_list_query(topic_id).aaggregate(**ROOM_LIST_TOTALS), topic_id)
+
+
+# Extra .values() fields for working the list validators out from the rows
+# themselves (room_list_validators_for / topic_list_validators_for).
+ROOM_LIST_VALIDATOR_VALUES = ('updated', 'topic__updated')
+TOPIC_LIST_VALIDATOR_VALUES = ('updated',)
+
+
+def room_list_validators_for(values, topic_id):
+    """
+    The room_list_validators() of the state `values` (the list's .values()
+    rows) were read at, without another query.
+
+    The room and topic lists are cached with these and always served with
+    them. Between a write's commit and its invalidation the cache still
+    serves the list from before the write. With validators fresh from the
+    database that older list would get the newer ETag, and the client would
+    keep it (and get 304s for it) until the data changed again.
+    """
+    return _room_list({
+        'count': len(values),
+        'updated': latest(*(row['updated'] for row in values)),
+        'topic_updated': latest(*(row['topic__updated'] for row in values)),
+    }, topic_id)
+
+
+TOPIC_LIST_TOTALS = {'count': Count('id'), 'updated': Max('updated')}
+
+
+def _topic_list(totals):
+    last_modified = totals['updated']
+    return make_etag('topics', totals['count'], last_modified.isoformat() if last_modified else None), last_modified
+
+
+def topic_list_validators():
+    return _topic_list(Topic.objects.order_by().aggregate(**TOPIC_LIST_TOTALS))
+
+
+async def atopic_list_validators():
+    return _topic_list(await Topic.objects.order_by().aaggregate(**TOPIC_LIST_TOTALS))
+
+
+def topic_list_validators_for(values):
+    """topic_list_validators() of the topic list `values`, as room_list_validators_for()."""
+    return _topic_list({'count': len(values), 'updated': latest(*(row['updated'] for row in values))})
+
+
+def content_etag(data):
+    # For responses already built from data in memory (the authenticated
+    # user and profile), hashing them is cheaper than any query.
+    return make_etag('content', json.dumps(data, sort_keys=True, default=str))
@@ -0,0 +1,92 @@
+import logging
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+
+from .models import Room
+from .presence import presence
+
+logger = logging.getLogger(__name__)
+
+def room_group_name(room_id):
+    return f'room_{room_id}'
+
+
+def broadcast_room_message(room_id, message_data):
+    """Push a serialized message to every socket connected to the room."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    try:
+        async_to_sync(channel_layer.group_send)(
+            room_group_name(room_id),
+            {
+                'type': 'room.message',
+                'message': message_data,
+            }
+        )
+    except Exception:
+        # The message is saved either way; sockets that miss it pick it up
+        # with the next ?after= poll, so a layer outage mustn't fail the POST.
+        logger.exception('Could not broadcast a message to room %s', room_id)
+
+
+class RoomConsumer(AsyncJsonWebsocketConsumer):
+    """
+    One websocket per open study room. Clients only listen here; new
+    messages are still created through MessageListView.post, which
+    broadcasts them to the room group.
+
+    An open socket counts as presence in the room: connecting and every
+    ping are heartbeats (see backend/presence.py), answered with the
+    room's online count.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        self.room_id = self.scope['url_route']['kwargs']['room_id']
+        self.group_name = room_group_name(self.room_id)
+
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        if not await self.room_exists():
+            await self.close(code=4404)
+            return
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        presence.socket_opened(self.room_id, user.id)
+        self.present = True
+        await self.send_json({'type': 'presence', 'online': await self.online_count()})
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, 'present', False):
+            # The user may still have the room open in another tab
+            presence.socket_closed(self.room_id, self.scope['user'].id)
+
+    async def receive_json(self, content, **kwargs):
+        if content.get('type') == 'ping':
+            presence.heartbeat(self.room_id, self.scope['user'].id)
+            await self.send_json({'type': 'pong', 'online': await self.online_count()})
+
+    async def online_count(self):
+        # Reads the other workers' snapshots from the cache
+        counts = await sync_to_async(presence.online_counts)([self.room_id])
+        return counts[self.room_id]
+
+    async def room_message(self, event):
+        await self.send_json({
+            'type': 'message',
+            'message': event['message'],
+        })
+
+    @database_sync_to_async
+    def room_exists(self):
+        return Room.objects.filter(id=self.room_id).exists()
@@ -0,0 +1,127 @@
+"""
+Streaming export of a room's whole message history (MessageExportView).
+
+The transcript is read MESSAGE_EXPORT_CHUNK_SIZE rows at a time. It
+starts with the room's archived months and continues with the live
+partitions, read through a server-side cursor. Each chunk is encoded,
+gzipped if the client accepts it, and sent before the next one is read,
+so memory stays flat however long the history is. Behind pgbouncer
+(DB_PGBOUNCER=True) server-side cursors are off and psycopg fetches the
+live rows in one go.
+
+Under ASGI the body has to be an async iterator, or Django reads all of
+it into a list before sending anything. AsyncMessageExportView streams
+atranscript() for that reason.
+"""
+import csv
+import io
+import re
+import zlib
+
+import orjson
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .models import Message
+from .partitions import ArchivedHistory
+from .rows import MESSAGE_VALUES, message_rows
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+CSV_FIELDS = ['id', 'author', 'content', 'created_at']
+
+
+def accepts_gzip(request):
+    return bool(ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')))
+
+
+class TranscriptEncoder:
+    """Turns chunks of message .values() rows into NDJSON or CSV bytes, gzipped on the fly."""
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv; charset=utf-8',
+    }
+
+    def __init__(self, file_format, compress):
+        self.file_format = file_format
+        self.content_type = self.content_types[file_format]
+        # 16 + MAX_WBITS writes a gzip header and trailer around the deflate stream
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def start(self):
+        if self.file_format == 'csv':
+            return self.compress(self.csv_lines([CSV_FIELDS]))
+        return b''
+
+    def encode(self, rows):
+        rows = message_rows(rows)
+        if self.file_format == 'csv':
+            return self.compress(self.csv_lines([[row[field] for field in CSV_FIELDS] for row in rows]))
+        return self.compress(b''.join(orjson.dumps(row) + b'\n' for row in rows))
+
+    def finish(self):
+        return self.compressor.flush() if self.compressor else b''
+
+    def csv_lines(self, lines):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(lines)
+        return buffer.getvalue().encode()
+
+    def compress(self, data):
+        return self.compressor.compress(data) if self.compressor else data
+
+
+def live_messages(room_id, using):
+    return Message.objects.using(using).filter(room_id=room_id).values(*MESSAGE_VALUES).order_by('created_at', 'id')
+
+
+def transcript_parts(encoder, room_id, using, chunk_size):
+    archive = ArchivedHistory(room_id)
+    yield encoder.start()
+    # Archived months are all older than the live partitions
+    for month in archive.months().using(using).iterator(chunk_size=1):
+        yield encoder.encode(archive.unpack(month))
+
+    chunk = []
+    for row in live_messages(room_id, using).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield encoder.encode(chunk)
+            chunk = []
+    yield encoder.encode(chunk)
+    yield encoder.finish()
+
+
+def transcript(encoder, room_id, using, chunk_size):
+    # The compressor often holds a whole chunk back; don't send empty pieces
+    return filter(None, transcript_parts(encoder, room_id, using, chunk_size))
+
+
+async def atranscript_parts(encoder, room_id, using, chunk_size):
+    archive = ArchivedHistory(room_id)
+    yield encoder.start()
+    async for month in archive.months().using(using).aiterator(chunk_size=1):
+        yield encoder.encode(archive.unpack(month))
+
+    chunk = []
+    async for row in live_messages(room_id, using).aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield encoder.encode(chunk)
+            chunk = []
+    yield encoder.encode(chunk)
+    yield encoder.finish()
+
+
+async def atranscript(encoder, room_id, using, chunk_size):
+    async for part in atranscript_parts(encoder, room_id, using, chunk_size):
+        if part:
+            yield part
+
+
+def transcript_response(encoder, room_id, content):
+    response = StreamingHttpResponse(content, content_type=encoder.content_type)
+    response['Content-Disposition'] = f'attachment; filename="room-{room_id}-messages.{encoder.file_format}"'
+    if encoder.compressor:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
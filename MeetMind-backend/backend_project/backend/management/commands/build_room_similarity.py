@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.recommendations import build_similarity
+
+
+class Command(BaseCommand):
+    help = 'Recompute every room\'s most similar rooms (shared participants and topic) for the recommendation endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None,
+                            help='Neighbours kept per room (default ROOM_SIMILARITY_TOP_K).')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rooms per block of the matrix product (default ROOM_SIMILARITY_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rooms, written = build_similarity(options['top_k'], options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {written} neighbours for {rooms} rooms in {elapsed:.1f}s'
+        ))
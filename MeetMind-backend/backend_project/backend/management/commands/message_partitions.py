@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from backend.partitions import (
+    DetachDeferred, add_months, archive_partition, ensure_partitions, month_start, partition_tables,
+)
+
+
+class Command(BaseCommand):
+    help = 'Create the upcoming monthly partitions of backend_message and, with --archive, archive old months.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help='Months of partitions to create ahead of now (default MESSAGE_PARTITION_MONTHS_AHEAD).')
+        parser.add_argument('--archive', action='store_true',
+                            help='Move months older than --keep-months into MessageArchive.')
+        parser.add_argument('--keep-months', type=int, default=None,
+                            help='Months of history to keep in partitions, counting this one (default MESSAGE_HOT_MONTHS).')
+
+    def handle(self, *args, **options):
+        months_ahead = options['months_ahead']
+        if months_ahead is None:
+            months_ahead = settings.MESSAGE_PARTITION_MONTHS_AHEAD
+
+        now = timezone.now()
+        current = month_start(now)
+        created = ensure_partitions(now, add_months(current, months_ahead))
+        for name in created:
+            self.stdout.write(f'Created {name}')
+
+        archived = []
+        deferred = []
+        if options['archive']:
+            keep_months = options['keep_months']
+            if keep_months is None:
+                keep_months = settings.MESSAGE_HOT_MONTHS
+            if keep_months < 1:
+                raise CommandError('--keep-months must be at least 1; the current month is still being written.')
+
+            cutoff = add_months(current, 1 - keep_months)
+            with connection.cursor() as cursor:
+                months = sorted(month for month in partition_tables(cursor) if month < cutoff)
+            for month in months:
+                try:
+                    count = archive_partition(month)
+                except DetachDeferred:
+                    deferred.append(month)
+                    self.stdout.write(self.style.WARNING(f'Deferred {month:%Y-%m}: partition busy, left for the next run'))
+                    continue
+                archived.append(month)
+                self.stdout.write(f'Archived {month:%Y-%m}: {count} messages')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(created)} partitions, archived {len(archived)}, deferred {len(deferred)}.'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from backend.avatars import process_avatar
+from backend.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized avatar variants for profiles that are missing them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocess every avatar, not just missing ones.')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if not options['all']:
+            profiles = profiles.filter(avatar_variants={})
+
+        processed = failed = 0
+        for profile_id, avatar in profiles.values_list('id', 'avatar').iterator():
+            try:
+                process_avatar(profile_id, avatar)
+                processed += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Profile {profile_id}: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} avatars ({failed} failed).'))
@@ -0,0 +1,100 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from backend.models import Activity
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete activity log rows older than ACTIVITY_RETENTION_DAYS, and all but the newest '
+        'ACTIVITY_MAX_PER_USER for each user, in small batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Keep this many days of activity (default ACTIVITY_RETENTION_DAYS, 0 keeps everything).')
+        parser.add_argument('--per-user', type=int, default=None,
+                            help='Keep this many activities per user (default ACTIVITY_MAX_PER_USER, 0 keeps everything).')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows deleted per statement (default ACTIVITY_PRUNE_BATCH_SIZE).')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches, to go easy on a busy database.')
+
+    def handle(self, *args, **options):
+        days = settings.ACTIVITY_RETENTION_DAYS if options['days'] is None else options['days']
+        per_user = settings.ACTIVITY_MAX_PER_USER if options['per_user'] is None else options['per_user']
+        self.batch_size = max(1, options['batch_size'] or settings.ACTIVITY_PRUNE_BATCH_SIZE)
+        self.pause = options['sleep']
+
+        # Every batch is its own short transaction, so the table is never
+        # locked for long and an interrupted run loses nothing: running the
+        # command again carries on from where it stopped.
+        total = 0
+        started = time.monotonic()
+        if days > 0:
+            total += self.report(f'Older than {days} days', self.prune_by_age, timezone.now() - timedelta(days=days))
+        if per_user > 0:
+            total += self.report(f'Over {per_user} per user', self.prune_per_user, per_user)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {total} activities in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s).'
+        ))
+
+    def report(self, label, prune, limit):
+        started = time.monotonic()
+        deleted, batches = prune(limit)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{label}: deleted {deleted} rows in {batches} batches, '
+            f'{elapsed:.1f}s ({deleted / elapsed if elapsed else 0:.0f} rows/s)'
+        )
+        return deleted
+
+    def delete_batch(self, ids):
+        deleted, _ = Activity.objects.filter(id__in=ids).delete()
+        if self.pause and len(ids) == self.batch_size:
+            time.sleep(self.pause)
+        return deleted
+
+    def prune_by_age(self, cutoff):
+        # The newest id past the cutoff bounds the walk, so the batches below
+        # are range scans on the primary key and never read recent rows.
+        boundary = Activity.objects.filter(timestamp__lt=cutoff).aggregate(last=Max('id'))['last']
+        deleted = batches = 0
+        last_id = 0
+        while boundary is not None:
+            ids = list(
+                Activity.objects.filter(id__gt=last_id, id__lte=boundary, timestamp__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                break
+            deleted += self.delete_batch(ids)
+            batches += 1
+            last_id = ids[-1]
+        return deleted, batches
+
+    def prune_per_user(self, keep):
+        users = list(
+            Activity.objects.order_by().values('user_id').annotate(count=Count('id'))
+            .filter(count__gt=keep).values_list('user_id', flat=True)
+        )
+        deleted = batches = 0
+        for user_id in users:
+            while True:
+                # Walks activity_user_type_idx past the rows being kept
+                ids = list(
+                    Activity.objects.filter(user_id=user_id).order_by('-timestamp', '-id')
+                    .values_list('id', flat=True)[keep:keep + self.batch_size]
+                )
+                if not ids:
+                    break
+                deleted += self.delete_batch(ids)
+                batches += 1
+        return deleted, batches
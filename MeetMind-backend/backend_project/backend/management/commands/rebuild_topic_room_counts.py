@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from backend import cache
+from backend.models import Room, Topic
+
+
+class Command(BaseCommand):
+    help = 'Recompute Topic.room_count from the rooms table.'
+
+    def handle(self, *args, **options):
+        room_counts = (
+            Room.objects.filter(topic=OuterRef('pk'))
+            .order_by()
+            .values('topic')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        actual = Coalesce(Subquery(room_counts), 0)
+        # Only the counts that drifted: bumping `updated` on the others would
+        # change every topic list ETag and make clients refetch for nothing.
+        updated = (
+            Topic.objects.alias(actual=actual)
+            .exclude(room_count=F('actual'))
+            .update(room_count=actual, updated=timezone.now())
+        )
+        if updated:
+            # The generation lives in the shared cache, so this reaches every worker
+            cache.invalidate(cache.TOPICS)
+        self.stdout.write(self.style.SUCCESS(f'Fixed room counts for {updated} of {Topic.objects.count()} topics.'))
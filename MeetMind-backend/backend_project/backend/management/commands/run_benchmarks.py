@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from backend.benchmarks import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API route against the seeded dataset and print a JSON report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', nargs='*', help='URL names to run (default: all).')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout.')
+        parser.add_argument('--throttling', action='store_true', help='Keep the rate limits on (off by default).')
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            only=options['only'],
+            throttling=options['throttling'],
+        )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Wrote benchmark report to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if report['missing_scenarios']:
+            self.stderr.write(f"No benchmark scenario for: {', '.join(report['missing_scenarios'])}")
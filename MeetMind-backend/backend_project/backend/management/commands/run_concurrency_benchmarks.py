@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from backend.benchmarks import run_concurrency_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare the sync and async read views at increasing concurrency through one ASGI worker.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario and concurrency level.')
+        parser.add_argument('--levels', type=int, nargs='*', default=[1, 10, 50], help='Concurrent clients to test.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', nargs='*', help='URL names to run (default: all async read routes).')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        report = run_concurrency_benchmarks(
+            requests=options['requests'],
+            levels=options['levels'],
+            seed=options['seed'],
+            only=options['only'],
+        )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Wrote benchmark report to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from backend.benchmarks import run_serialization_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare the CPU cost of serializers + JSONRenderer with .values() rows + orjson for the list endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per payload and path.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', help='Write the report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        report = run_serialization_benchmarks(repeat=options['repeat'], warmup=options['warmup'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Wrote benchmark report to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        different = [label for label, result in report['results'].items() if not result['identical']]
+        if different:
+            self.stderr.write(f"Output differs from the serializers for: {', '.join(different)}")
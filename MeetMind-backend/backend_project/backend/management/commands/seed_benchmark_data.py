@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.benchmarks import clear_dataset, seed_dataset
+
+
+class Command(BaseCommand):
+    help = 'Seed a reproducible benchmark dataset (users, topics, rooms, participants, messages, activities).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--topics', type=int, default=20)
+        parser.add_argument('--rooms', type=int, default=500)
+        parser.add_argument('--participants', type=int, default=10, help='Average participants per room.')
+        parser.add_argument('--messages', type=int, default=50000)
+        parser.add_argument('--activities', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=90, help='Spread messages and activities over this many days.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help='Delete an existing benchmark dataset first.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['clear']:
+                clear_dataset()
+            counts = seed_dataset(
+                users=options['users'],
+                topics=options['topics'],
+                rooms=options['rooms'],
+                participants=options['participants'],
+                messages=options['messages'],
+                activities=options['activities'],
+                days=options['days'],
+                seed=options['seed'],
+            )
+        self.stdout.write(json.dumps(counts, indent=2))
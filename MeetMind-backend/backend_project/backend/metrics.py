@@ -0,0 +1,222 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db import connections
+
+from . import cache
+
+
+# Upper bounds of the histogram buckets, Prometheus style (le="...").
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Counters other modules bump with registry.increment(): name -> help text
+COUNTERS = {
+    'meetmind_throttle_checks_total': 'Rate limit checks, by throttle scope and whether the request was allowed.',
+}
+
+# psycopg_pool's get_stats() keys we export: (name, type, help)
+POOL_STATS = {
+    'pool_max': ('meetmind_db_pool_max_size', 'gauge', 'Largest the connection pool may grow.'),
+    'pool_size': ('meetmind_db_pool_size', 'gauge', 'Connections currently managed by the pool.'),
+    'pool_available': ('meetmind_db_pool_available', 'gauge', 'Idle connections ready in the pool.'),
+    'requests_waiting': ('meetmind_db_pool_requests_waiting', 'gauge', 'Requests waiting for a connection.'),
+    'requests_num': ('meetmind_db_pool_requests_total', 'counter', 'Connections handed out by the pool.'),
+    'requests_queued': ('meetmind_db_pool_requests_queued_total', 'counter', 'Requests that had to wait for a connection.'),
+    'requests_wait_ms': ('meetmind_db_pool_requests_wait_ms_total', 'counter', 'Time spent waiting for a connection.'),
+    'requests_errors': ('meetmind_db_pool_requests_errors_total', 'counter', 'Requests that timed out waiting for a connection.'),
+    'connections_num': ('meetmind_db_pool_connections_total', 'counter', 'Connections the pool opened to the server.'),
+    'connections_ms': ('meetmind_db_pool_connections_ms_total', 'counter', 'Time spent opening connections.'),
+    'connections_lost': ('meetmind_db_pool_connections_lost_total', 'counter', 'Connections found broken and replaced.'),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_time = 0.0
+        self.responses = {}
+
+
+class MetricsRegistry:
+    """
+    Per-process request metrics keyed by resolved URL name and method.
+
+    Each worker process keeps its own numbers; Prometheus should scrape
+    every worker (or sum across them) to get the full picture.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._connections = {}
+        self._counters = {}
+
+    def increment(self, name, **labels):
+        """Add one to the counter `name` (declared in COUNTERS) for these labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def observe_connection(self, alias):
+        with self._lock:
+            self._connections[alias] = self._connections.get(alias, 0) + 1
+
+    def observe_request(self, view, method, status_code, duration, query_count, query_time):
+        with self._lock:
+            stats = self._endpoints.get((view, method))
+            if stats is None:
+                stats = self._endpoints[(view, method)] = EndpointStats()
+            stats.latency.observe(duration)
+            stats.queries.observe(query_count)
+            stats.db_time += query_time
+            stats.responses[status_code] = stats.responses.get(status_code, 0) + 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+
+            lines.append('# HELP meetmind_http_requests_total Requests handled, by URL name, method and status.')
+            lines.append('# TYPE meetmind_http_requests_total counter')
+            for (view, method), stats in endpoints:
+                for status_code, count in sorted(stats.responses.items()):
+                    lines.append(
+                        f'meetmind_http_requests_total{{view="{view}",method="{method}",status="{status_code}"}} {count}'
+                    )
+
+            lines.append('# HELP meetmind_http_request_duration_seconds Request latency.')
+            lines.append('# TYPE meetmind_http_request_duration_seconds histogram')
+            for (view, method), stats in endpoints:
+                lines.extend(_histogram_lines(
+                    'meetmind_http_request_duration_seconds', f'view="{view}",method="{method}"', stats.latency
+                ))
+
+            lines.append('# HELP meetmind_db_queries_per_request Database queries run per request.')
+            lines.append('# TYPE meetmind_db_queries_per_request histogram')
+            for (view, method), stats in endpoints:
+                lines.extend(_histogram_lines(
+                    'meetmind_db_queries_per_request', f'view="{view}",method="{method}"', stats.queries
+                ))
+
+            lines.append('# HELP meetmind_db_query_seconds_total Time spent in database queries.')
+            lines.append('# TYPE meetmind_db_query_seconds_total counter')
+            for (view, method), stats in endpoints:
+                lines.append(
+                    f'meetmind_db_query_seconds_total{{view="{view}",method="{method}"}} {stats.db_time:.6f}'
+                )
+
+            lines.append('# HELP meetmind_db_connections_total Database connections opened, or taken from the pool.')
+            lines.append('# TYPE meetmind_db_connections_total counter')
+            for alias, count in sorted(self._connections.items()):
+                lines.append(f'meetmind_db_connections_total{{database="{alias}"}} {count}')
+
+            for name, help_text in COUNTERS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (counter, labels), count in sorted(self._counters.items()):
+                    if counter == name:
+                        label_text = ','.join(f'{label}="{value}"' for label, value in labels)
+                        lines.append(f'{name}{{{label_text}}} {count}')
+
+        pools = pool_stats()
+        if pools:
+            for key, (name, kind, help_text) in POOL_STATS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for alias, stats in sorted(pools.items()):
+                    # Stats that are still zero are left out by get_stats()
+                    lines.append(f'{name}{{database="{alias}"}} {stats.get(key, 0)}')
+
+        cache_stats = cache.stats.as_dict()
+        lines.append('# HELP meetmind_response_cache_hits_total List responses served from the cache.')
+        lines.append('# TYPE meetmind_response_cache_hits_total counter')
+        lines.append(f"meetmind_response_cache_hits_total {cache_stats['hits']}")
+        lines.append('# HELP meetmind_response_cache_misses_total List responses rebuilt on a cache miss.')
+        lines.append('# TYPE meetmind_response_cache_misses_total counter')
+        lines.append(f"meetmind_response_cache_misses_total {cache_stats['misses']}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+def pool_stats():
+    """psycopg_pool statistics for each database using DB_POOL, by alias."""
+    stats = {}
+    for alias in connections:
+        # Only the psycopg 3 backend has a pool, and only with OPTIONS['pool']
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+registry = MetricsRegistry()
+
+# Recorder for the request being handled. A context variable rather than a
+# per-request execute_wrapper, because async views run their queries in a
+# worker thread with its own connection; sync_to_async carries the context
+# over, so queries are counted wherever they run.
+current_recorder = ContextVar('query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires again on reconnect, for the same wrapper.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def count_connection(sender, connection, **kwargs):
+    registry.observe_connection(connection.alias)
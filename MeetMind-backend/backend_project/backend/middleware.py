@@ -0,0 +1,134 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .metrics import QueryRecorder, current_recorder, registry
+from .routers import Routing, current_routing, pin_key
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and database time for every request,
+    labelled with the resolved URL name (list-rooms, message-list, ...).
+    Exposed in Prometheus format by MetricsView.
+
+    Works in both sync and async mode, so it doesn't force async views
+    back onto a thread under the ASGI server.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.observe(request, response, time.perf_counter() - start, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.observe(request, response, time.perf_counter() - start, recorder)
+        return response
+
+    def observe(self, request, response, duration, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unresolved'
+        registry.observe_request(view, request.method, response.status_code, duration, recorder.count, recorder.time)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sends the reads of GET requests to REPLICA_READ_VIEWS to a replica
+    (see backend/routers.py), unless the user wrote something in the last
+    REPLICA_PIN_SECONDS. Successful writes pin the user to the primary.
+
+    Removed from the stack when no replicas are configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        routing = Routing()
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.pin_writer(request, response, routing)
+        return response
+
+    async def __acall__(self, request):
+        routing = Routing()
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        await sync_to_async(self.pin_writer)(request, response, routing)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = current_routing.get()
+        if routing is None:
+            return None
+        # Views that take POSTs without writing to the database opt out
+        routing.pin = getattr(getattr(view_func, 'cls', None), 'pins_primary', True)
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if request.resolver_match.url_name not in settings.REPLICA_READ_VIEWS:
+            return None
+        # Authentication only happens in the view, so read the user id from
+        # the token here. An invalid token just gets a 401 from the view.
+        user_id = self.token_user_id(request)
+        routing.replica = user_id is None or not cache.get(pin_key(user_id))
+        return None
+
+    def token_user_id(self, request):
+        header = request.headers.get('Authorization', '').split()
+        if len(header) != 2 or header[0] not in jwt_settings.AUTH_HEADER_TYPES:
+            return None
+        try:
+            return AccessToken(header[1]).get(jwt_settings.USER_ID_CLAIM)
+        except TokenError:
+            return None
+
+    def pin_writer(self, request, response, routing):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400 or not routing.pin:
+            return
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            cache.set(pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 19:48
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('backend', '0012_profile_full_name_user_full_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(fields=['room', 'created_at', 'id'], name='message_room_created_idx'),
+        ),
+    ]
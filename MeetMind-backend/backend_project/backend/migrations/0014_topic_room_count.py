@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 19:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_room_counts(apps, schema_editor):
+    Topic = apps.get_model('backend', 'Topic')
+    Room = apps.get_model('backend', 'Room')
+    room_counts = (
+        Room.objects.filter(topic=OuterRef('pk'))
+        .order_by()
+        .values('topic')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Topic.objects.update(room_count=Coalesce(Subquery(room_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_message_room_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='room_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_room_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 19:52
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Built concurrently so deploys don't lock the tables being indexed.
+    atomic = False
+
+    dependencies = [
+        ('backend', '0014_topic_room_count'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='activity',
+            index=models.Index(fields=['user', '-timestamp'], include=('type', 'description'), name='activity_user_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='room',
+            index=models.Index(fields=['-updated', '-created'], name='room_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='room',
+            index=models.Index(fields=['topic', '-updated', '-created'], name='room_topic_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='topic',
+            index=models.Index(fields=['name'], name='topic_name_idx'),
+        ),
+    ]
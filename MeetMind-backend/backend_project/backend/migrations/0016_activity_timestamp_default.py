@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 19:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0015_index_pack'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activity',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 19:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The GIN indexes are built concurrently, which can't run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ('backend', '0016_activity_timestamp_default'),
+    ]
+
+    operations = [
+        # Adding a stored generated column rewrites the whole table under an
+        # ACCESS EXCLUSIVE lock, so message reads and writes wait for every
+        # row's tsvector to be computed. Apply it in a maintenance window (see
+        # the README). Rooms and topics are small; the indexes below are built
+        # concurrently and don't block.
+        migrations.AddField(
+            model_name='message',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('content', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='room',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='room_search_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='topic',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='topic_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0017_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 21:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0018_profile_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
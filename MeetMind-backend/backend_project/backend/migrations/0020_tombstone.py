@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 21:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0019_topic_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('room', 'Room'), ('topic', 'Topic')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('topic_id', models.BigIntegerField(blank=True, null=True)),
+                ('moved', models.BooleanField(default=False)),
+                ('removed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'removed_at'], name='tombstone_recent_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 22:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0020_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('payload', models.BinaryField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_archives', to='backend.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'month'), name='message_archive_room_month_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,151 @@
+# Generated by Django 5.2 on 2026-10-18 22:10
+
+import re
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+# Months created ahead of now; after this, `manage.py message_partitions` keeps them coming.
+MONTHS_AHEAD = 3
+INDEX_DEFINITION = re.compile(r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .+)$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def month_start(value):
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def index_definitions(cursor, table):
+    cursor.execute(
+        'SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'WHERE i.indrelid = %s::regclass AND NOT i.indisprimary',
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def foreign_keys(cursor, table):
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def copyable_columns(cursor, table):
+    cursor.execute(
+        "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 "
+        "AND NOT attisdropped AND attgenerated = '' ORDER BY attnum",
+        [table]
+    )
+    return ', '.join(name for (name,) in cursor.fetchall())
+
+
+def create_partition(cursor, month):
+    # Same as backend.partitions.create_partition, as of this migration
+    name = f'backend_message_p{month.year:04d}_{month.month:02d}'
+    suffix = name[len('backend_message_'):]
+    indexes = index_definitions(cursor, 'backend_message')
+    cursor.execute(f'CREATE TABLE {name} (LIKE backend_message INCLUDING DEFAULTS INCLUDING GENERATED)')
+    cursor.execute(f'ALTER TABLE {name} ADD PRIMARY KEY (id, created_at)')
+    for index_name, definition in indexes:
+        create, using = INDEX_DEFINITION.match(definition).groups()
+        cursor.execute(f'{create} {index_name[:62 - len(suffix)]}_{suffix} ON {name} {using}')
+    cursor.execute(
+        f'ALTER TABLE backend_message ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+        [month, add_months(month, 1)]
+    )
+
+
+def partition_messages(apps, schema_editor):
+    # Runs in the migration's transaction: the old table stays locked
+    # (ACCESS EXCLUSIVE, from the rename on) until every row has been copied
+    # and the transaction commits, so message reads and writes wait for the
+    # whole copy. Apply it in a maintenance window (see the README). If it
+    # fails, everything rolls back to the unpartitioned table.
+    with schema_editor.connection.cursor() as cursor:
+        # A foreign key into a partitioned table would have to include created_at.
+        cursor.execute("SELECT count(*) FROM pg_constraint WHERE confrelid = 'backend_message'::regclass")
+        if cursor.fetchone()[0]:
+            raise RuntimeError('backend_message is referenced by a foreign key and cannot be partitioned.')
+
+        indexes = index_definitions(cursor, 'backend_message')
+        constraints = foreign_keys(cursor, 'backend_message')
+        cursor.execute('SELECT min(created_at), coalesce(max(id), 0) FROM backend_message')
+        oldest, last_id = cursor.fetchone()
+        cursor.execute("SELECT pg_get_serial_sequence('backend_message', 'id')")
+        (sequence,) = cursor.fetchone()
+
+        cursor.execute('ALTER TABLE backend_message RENAME TO backend_message_old')
+        cursor.execute('ALTER TABLE backend_message_old RENAME CONSTRAINT backend_message_pkey TO backend_message_old_pkey')
+        for index_name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {index_name} RENAME TO {index_name[:59]}_old')
+        cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO backend_message_old_id_seq')
+
+        # Identity columns aren't allowed on partitioned tables in Postgres 16,
+        # so ids come from a plain sequence carrying on from the old one.
+        cursor.execute(f'CREATE SEQUENCE backend_message_id_seq AS bigint START WITH {last_id + 1}')
+        cursor.execute(
+            'CREATE TABLE backend_message (LIKE backend_message_old INCLUDING DEFAULTS INCLUDING GENERATED) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute("ALTER TABLE backend_message ALTER COLUMN id SET DEFAULT nextval('backend_message_id_seq')")
+        cursor.execute('ALTER SEQUENCE backend_message_id_seq OWNED BY backend_message.id')
+        # The partition key has to be part of the primary key.
+        cursor.execute('ALTER TABLE backend_message ADD CONSTRAINT backend_message_pkey PRIMARY KEY (id, created_at)')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for constraint_name, definition in constraints:
+            cursor.execute(f'ALTER TABLE backend_message ADD CONSTRAINT {constraint_name} {definition}')
+
+        now = month_start(datetime.now(timezone.utc))
+        month = month_start(oldest) if oldest else now
+        while month <= add_months(now, MONTHS_AHEAD):
+            create_partition(cursor, month)
+            month = add_months(month, 1)
+
+        columns = copyable_columns(cursor, 'backend_message_old')
+        cursor.execute(f'INSERT INTO backend_message ({columns}) SELECT {columns} FROM backend_message_old')
+        cursor.execute('DROP TABLE backend_message_old')
+
+
+def unpartition_messages(apps, schema_editor):
+    # Archived months (MessageArchive) are not copied back.
+    with schema_editor.connection.cursor() as cursor:
+        indexes = index_definitions(cursor, 'backend_message')
+        constraints = foreign_keys(cursor, 'backend_message')
+
+        cursor.execute('ALTER TABLE backend_message RENAME TO backend_message_partitioned')
+        cursor.execute('CREATE TABLE backend_message (LIKE backend_message_partitioned INCLUDING GENERATED)')
+        columns = copyable_columns(cursor, 'backend_message_partitioned')
+        cursor.execute(f'INSERT INTO backend_message ({columns}) SELECT {columns} FROM backend_message_partitioned')
+        # Takes the partitions, their indexes and the id sequence with it
+        cursor.execute('DROP TABLE backend_message_partitioned')
+
+        cursor.execute('ALTER TABLE backend_message ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('backend_message', 'id'), coalesce(max(id), 0) + 1, false) "
+            "FROM backend_message"
+        )
+        cursor.execute('ALTER TABLE backend_message ADD CONSTRAINT backend_message_pkey PRIMARY KEY (id)')
+        for index_name, definition in indexes:
+            create, using = INDEX_DEFINITION.match(definition).groups()
+            cursor.execute(f'{create} {index_name} ON backend_message {using}')
+        for constraint_name, definition in constraints:
+            cursor.execute(f'ALTER TABLE backend_message ADD CONSTRAINT {constraint_name} {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0021_message_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 22:30
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Built concurrently so deploys don't lock the activity log.
+    atomic = False
+
+    dependencies = [
+        ('backend', '0022_partition_messages'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='activity',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='activity_timestamp_brin'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0023_activity_timestamp_brin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('room', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similar_rooms', to='backend.room')),
+                ('similar_room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', '-score', 'similar_room'], name='room_similarity_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'similar_room'), name='room_similarity_pair_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 23:40
+
+import re
+
+from django.db import migrations
+
+INDEX_DEFINITION = re.compile(r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .+)$')
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('backend_message')")
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def create_default_partition(apps, schema_editor):
+    # Catches messages for months without a partition, so posting keeps
+    # working if `manage.py message_partitions` stops running for a while.
+    # Same as backend.partitions.create_table, as of this migration.
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return
+        cursor.execute(
+            'SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+            "WHERE i.indrelid = 'backend_message'::regclass AND NOT i.indisprimary"
+        )
+        indexes = cursor.fetchall()
+        cursor.execute('CREATE TABLE backend_message_default (LIKE backend_message INCLUDING DEFAULTS INCLUDING GENERATED)')
+        cursor.execute('ALTER TABLE backend_message_default ADD PRIMARY KEY (id, created_at)')
+        for index_name, definition in indexes:
+            create, using = INDEX_DEFINITION.match(definition).groups()
+            cursor.execute(f'{create} {index_name[:55]}_default ON backend_message_default {using}')
+        cursor.execute('ALTER TABLE backend_message ATTACH PARTITION backend_message_default DEFAULT')
+
+
+def drop_default_partition(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return
+        cursor.execute('SELECT count(*) FROM backend_message_default')
+        if cursor.fetchone()[0]:
+            raise RuntimeError(
+                'backend_message_default still holds messages; run `manage.py message_partitions` to move them first.'
+            )
+        cursor.execute('DROP TABLE backend_message_default')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0024_room_similarity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_partition, drop_default_partition),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 23:55
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Built concurrently so deploys don't lock the activity log. The new
+    # index is in place before the old one goes, so reads never lose it.
+    atomic = False
+
+    dependencies = [
+        ('backend', '0025_message_default_partition'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='activity',
+            index=models.Index(fields=['user', '-timestamp'], include=('type',), name='activity_user_type_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='activity',
+            name='activity_user_recent_idx',
+        ),
+    ]
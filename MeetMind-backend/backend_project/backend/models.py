@@ -1,6 +1,12 @@
 from django.db import models
+from django.db.models import F, OuterRef
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.expressions import ArraySubquery
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.conf import settings
+from django.utils import timezone
 
 
 from django.contrib.auth import get_user_model
@@ -31,10 +37,51 @@ class User(AbstractUser):
 class Topic(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(null=True, blank=True)
+    # Denormalized number of rooms in this topic. Kept up to date by the room
+    # views; `manage.py rebuild_topic_room_counts` recomputes it from scratch.
+    room_count = models.PositiveIntegerField(default=0)
+    # Used for the ETag / Last-Modified validators on room and topic responses
+    updated = models.DateTimeField(auto_now=True)
+    # Full-text search document, maintained by Postgres (see SearchView)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector('description', weight='B', config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # get_or_create(name=...) in the room views
+            models.Index(fields=['name'], name='topic_name_idx'),
+            GinIndex(fields=['search_vector'], name='topic_search_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def adjust_room_count(cls, topic_id, delta):
+        # Done in SQL so concurrent room changes can't overwrite each other.
+        # Clamped at zero so a count that drifted can't go negative.
+        cls.objects.filter(pk=topic_id).update(
+            room_count=Greatest(F('room_count') + delta, 0), updated=timezone.now()
+        )
+
+
+class RoomQuerySet(models.QuerySet):
+    def with_participant_ids(self):
+        # Join the topic and collect participant ids in the same query so
+        # listing rooms doesn't cost one extra query per room. A subquery
+        # rather than a join with GROUP BY, which would drop Meta.ordering
+        # and keep the list from being read off room_recent_idx.
+        participant_ids = Room.participants.through.objects.filter(room_id=OuterRef('pk')).order_by('user_id')
+        return self.select_related('topic').defer('search_vector', 'topic__search_vector').annotate(
+            participant_ids=ArraySubquery(participant_ids.values('user_id'))
+        )
+
 
 # Room model
 class Room(models.Model):
@@ -45,9 +92,26 @@ class Room(models.Model):
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='participants', blank=True)
     updated = models.DateTimeField(auto_now=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Full-text search document, maintained by Postgres (see SearchView)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector('description', weight='B', config='english')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = RoomQuerySet.as_manager()
 
     class Meta:
         ordering = ['-updated', '-created']
+        indexes = [
+            # Room lists in the default ordering, with and without a topic filter
+            models.Index(fields=['-updated', '-created'], name='room_recent_idx'),
+            models.Index(fields=['topic', '-updated', '-created'], name='room_topic_recent_idx'),
+            GinIndex(fields=['search_vector'], name='room_search_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -59,6 +123,9 @@ class Profile(models.Model):
     bio = models.TextField(null=True, blank=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
     full_name = models.CharField(max_length=255, null=True, blank=True)
+    # Resized copies of the avatar, {size name: storage path}. Filled in by
+    # backend/avatars.py after upload; the API only serves these.
+    avatar_variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return self.user.username
@@ -70,18 +137,114 @@ class Message(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Full-text search document, maintained by Postgres (see SearchView)
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config='english'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a room's history (MessageListView)
+            models.Index(fields=['room', 'created_at', 'id'], name='message_room_created_idx'),
+            GinIndex(fields=['search_vector'], name='message_search_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author} - {self.content}"
 
 
+# One room's messages for one month, moved out of backend_message once the
+# month's partition is archived (see backend/partitions.py).
+class MessageArchive(models.Model):
+    room = models.ForeignKey(Room, related_name='message_archives', on_delete=models.CASCADE)
+    month = models.DateField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    # zlib-compressed JSON: [[id, author_id, created_at, content], ...] oldest first
+    payload = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'month'], name='message_archive_room_month_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id} - {self.month} ({self.message_count} messages)"
+
+
+# One of a room's top-k most similar rooms, by shared participants and
+# topic. Built by `manage.py build_room_similarity` and kept up to date as
+# people join and leave (see backend/recommendations.py).
+class RoomSimilarity(models.Model):
+    # Covered by the indexes below
+    room = models.ForeignKey(Room, related_name='similar_rooms', on_delete=models.CASCADE, db_index=False)
+    similar_room = models.ForeignKey(Room, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'similar_room'], name='room_similarity_pair_uniq'),
+        ]
+        indexes = [
+            # A room's neighbours, best first (RoomSimilarView, RecommendedRoomsView)
+            models.Index(fields=['room', '-score', 'similar_room'], name='room_similarity_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id} ~ {self.similar_room_id} ({self.score:.3f})"
+
+
 # Activity model for storing recent activities of users
 class Activity(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
     type = models.CharField(max_length=255)
     description = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the activity happens, not when the buffered write reaches the
+    # database (see backend/activity.py).
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # UserActivityView: a user's latest activities, in index order.
+            # The description is unbounded, so it stays in the heap; the
+            # handful of rows shown are fetched from there.
+            models.Index(
+                fields=['user', '-timestamp'],
+                include=['type'],
+                name='activity_user_type_idx',
+            ),
+            # prune_activities: finding the rows past the retention period.
+            # Timestamps grow with the table, so a BRIN index stays tiny.
+            BrinIndex(fields=['timestamp'], name='activity_timestamp_brin'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.type} - {self.timestamp}"
 
+
+
+# Tombstone for a deleted room or topic, so delta sync clients
+# (RoomListView / TopicListView with ?since=) can drop it from their copy.
+class Tombstone(models.Model):
+    ROOM = 'room'
+    TOPIC = 'topic'
+    KIND_CHOICES = [(ROOM, 'Room'), (TOPIC, 'Topic')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # For rooms: the topic whose room list it left
+    topic_id = models.BigIntegerField(null=True, blank=True)
+    # The room still exists but moved to another topic
+    moved = models.BooleanField(default=False)
+    removed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'removed_at'], name='tombstone_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} - {self.removed_at}"
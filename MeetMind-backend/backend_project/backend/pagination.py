@@ -0,0 +1,130 @@
+import base64
+import binascii
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    value = f'{created_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, pk = value.rsplit('|', 1)
+        created_at = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor()
+
+    if created_at is None:
+        raise InvalidCursor()
+    return created_at, pk
+
+
+class MessageCursorPagination:
+    """
+    Keyset pagination over (created_at, id) for a room's message history.
+
+    Without a cursor the newest page is returned. ``before`` walks back into
+    older history and ``after`` fetches anything newer than what the client
+    already has. Every page is a range scan on the (room, created_at, id)
+    index, so the cost doesn't grow with the size of the history.
+
+    Given an ``archive`` (partitions.ArchivedHistory), pages carry on into
+    the room's archived months once the live history runs out.
+
+    Rows are dicts: the queryset has to be a .values() queryset with at
+    least ``id`` and ``created_at`` (rows.MESSAGE_VALUES).
+    """
+    page_size = 50
+    max_page_size = 200
+
+    def get_page_size(self, params):
+        try:
+            size = int(params.get('limit', self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_page_queryset(self, queryset, params):
+        """Returns (queryset for the page, limit, after cursor)."""
+        before = params.get('before')
+        after = params.get('after')
+        if before and after:
+            raise InvalidCursor()
+
+        limit = self.get_page_size(params)
+
+        if after:
+            created_at, pk = decode_cursor(after)
+            queryset = (
+                queryset.filter(created_at__gte=created_at)
+                .exclude(created_at=created_at, id__lte=pk)
+                .order_by('created_at', 'id')[:limit]
+            )
+        else:
+            if before:
+                created_at, pk = decode_cursor(before)
+                queryset = queryset.filter(created_at__lte=created_at).filter(
+                    Q(created_at__lt=created_at) | Q(id__lt=pk)
+                )
+            queryset = queryset.order_by('-created_at', '-id')[:limit + 1]
+        return queryset, limit, after
+
+    def build_page(self, rows, limit, after):
+        if after:
+            has_older = True
+        else:
+            has_older = len(rows) > limit
+            rows = rows[:limit]
+            rows.reverse()
+
+        previous_cursor = None
+        next_cursor = after
+        if rows:
+            if has_older:
+                previous_cursor = encode_cursor(rows[0]['created_at'], rows[0]['id'])
+            # Always hand back the newest position so clients can keep
+            # asking for anything newer than what they've got.
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+        return rows, previous_cursor, next_cursor
+
+    def add_archived(self, rows, params, limit, after, archive):
+        if after:
+            position = decode_cursor(after)
+            # Archived messages are all older than the live ones, so they
+            # only come into it for a cursor from the archived months.
+            if archive.covers(position[0]):
+                rows = (archive.newer(position, limit) + rows)[:limit]
+        elif len(rows) <= limit:
+            if rows:
+                position = (rows[-1]['created_at'], rows[-1]['id'])
+            elif params.get('before'):
+                position = decode_cursor(params['before'])
+            else:
+                position = None
+            rows = rows + archive.older(position, limit + 1 - len(rows))
+        return rows
+
+    def paginate(self, queryset, params, archive=None):
+        queryset, limit, after = self.get_page_queryset(queryset, params)
+        rows = list(queryset)
+        if archive is not None:
+            rows = self.add_archived(rows, params, limit, after, archive)
+        return self.build_page(rows, limit, after)
+
+    async def apaginate(self, queryset, params, archive=None):
+        queryset, limit, after = self.get_page_queryset(queryset, params)
+        rows = [row async for row in queryset]
+        if archive is not None:
+            rows = await sync_to_async(self.add_archived)(rows, params, limit, after, archive)
+        return self.build_page(rows, limit, after)
@@ -0,0 +1,318 @@
+"""
+Monthly partitions of backend_message, and the archive of old months.
+
+Migration 0022 turns backend_message into a table partitioned by range on
+created_at. Each partition holds one UTC calendar month and is named
+backend_message_pYYYY_MM; its indexes are named after the parent's
+(message_room_created_idx_p2026_10, ...) so query plans stay readable.
+
+`manage.py message_partitions` (run daily from cron, and after every
+migrate) creates the months ahead. If it stops running for longer than
+that, new messages land in backend_message_default (migration 0025)
+instead of failing, and the next run moves them into their months' new
+partitions. With --archive it detaches the months
+older than MESSAGE_HOT_MONTHS and moves them into MessageArchive: one row
+per room and month, holding that month's messages as zlib-compressed JSON.
+MessageListView reads through to the archive once a room's partitioned
+history runs out (ArchivedHistory). Archived messages are not searchable.
+"""
+import json
+import re
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from itertools import groupby
+
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import MessageArchive
+
+PARENT = 'backend_message'
+PARTITION_NAME = re.compile(r'^backend_message_p(\d{4})_(\d{2})$')
+INDEX_DEFINITION = re.compile(r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .+)$')
+DEFAULT_PARTITION = f'{PARENT}_default'
+ARCHIVE_BATCH_SIZE = 100
+DETACH_LOCK_TIMEOUT = '5s'
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{PARENT}_p{month.year:04d}_{month.month:02d}'
+
+
+def is_partitioned(cursor):
+    cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [PARENT])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def _by_month(names):
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)] = name
+    return partitions
+
+
+def attached_partitions(cursor):
+    """{month start: partition name} for the partitions of backend_message."""
+    cursor.execute(
+        'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+        'WHERE i.inhparent = %s::regclass',
+        [PARENT]
+    )
+    return _by_month(name for (name,) in cursor.fetchall())
+
+
+def partition_tables(cursor):
+    """Like attached_partitions, but also counting any left detached by a failed archive run."""
+    cursor.execute("SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE %s", [f'{PARENT}_p%'])
+    return _by_month(name for (name,) in cursor.fetchall())
+
+
+def copyable_columns(cursor, table):
+    """The columns of `table` an INSERT can write (all but the generated ones), comma-separated."""
+    cursor.execute(
+        "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 "
+        "AND NOT attisdropped AND attgenerated = '' ORDER BY attnum",
+        [table]
+    )
+    return ', '.join(name for (name,) in cursor.fetchall())
+
+
+def create_table(cursor, name):
+    """A table shaped like backend_message, with its indexes, ready to attach as a partition."""
+    cursor.execute(
+        'SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'WHERE i.indrelid = %s::regclass AND NOT i.indisprimary',
+        [PARENT]
+    )
+    indexes = cursor.fetchall()
+
+    # Built standalone and then attached, so the indexes get our names
+    # instead of the ones Postgres would generate.
+    cursor.execute(f'CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING GENERATED)')
+    cursor.execute(f'ALTER TABLE {name} ADD PRIMARY KEY (id, created_at)')
+    suffix = name[len(PARENT) + 1:]
+    for index_name, definition in indexes:
+        create, using = INDEX_DEFINITION.match(definition).groups()
+        cursor.execute(f'{create} {index_name[:62 - len(suffix)]}_{suffix} ON {name} {using}')
+
+
+def has_default_partition(cursor):
+    cursor.execute('SELECT to_regclass(%s)', [DEFAULT_PARTITION])
+    return cursor.fetchone()[0] is not None
+
+
+def create_partition(cursor, month):
+    """Create and attach the partition for `month`. False if it already exists."""
+    name = partition_name(month)
+    # Serialize with cron and post_migrate runs doing the same
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('backend_message partitions'))")
+    cursor.execute('SELECT to_regclass(%s)', [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    create_table(cursor, name)
+    bounds = [month, add_months(month, 1)]
+    if has_default_partition(cursor):
+        # The month's messages that went to the default partition while it
+        # had none. Attaching fails while any are left there.
+        columns = copyable_columns(cursor, PARENT)
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s '
+            f'RETURNING {columns}) INSERT INTO {name} ({columns}) SELECT {columns} FROM moved',
+            bounds
+        )
+    cursor.execute(f'ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', bounds)
+    return True
+
+
+def ensure_partitions(start, end):
+    """
+    Make sure every month from `start` to `end` has a partition, and every
+    month with messages in the default partition. Returns the names created.
+    """
+    with connection.cursor() as cursor:
+        if has_default_partition(cursor):
+            cursor.execute(f'SELECT min(created_at), max(created_at) FROM {DEFAULT_PARTITION}')
+            oldest, newest = cursor.fetchone()
+            if oldest is not None:
+                start, end = min(start, oldest), max(end, newest)
+
+    created = []
+    month = month_start(start)
+    while month <= end:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if create_partition(cursor, month):
+                created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def hot_horizon():
+    """
+    Start of the oldest partition. Anything older has been archived.
+
+    Looked up each time: a copy cached per process would still point at a
+    month for a while after another process archived it.
+    """
+    with connection.cursor() as cursor:
+        partitions = attached_partitions(cursor)
+    return min(partitions) if partitions else None
+
+
+class DetachDeferred(Exception):
+    """The month's partition was busy and is still attached; the next run archives it."""
+
+
+def is_lock_timeout(error):
+    # psycopg 3 calls it sqlstate, psycopg2 pgcode
+    cause = error.__cause__
+    return LOCK_NOT_AVAILABLE in (getattr(cause, 'sqlstate', None), getattr(cause, 'pgcode', None))
+
+
+def pack(rows):
+    return zlib.compress(json.dumps(
+        [[pk, author_id, created_at.isoformat(), content] for pk, author_id, created_at, content in rows],
+        separators=(',', ':'),
+    ).encode())
+
+
+def archive_partition(month):
+    """
+    Move the messages of `month` into MessageArchive, then detach and drop
+    its partition. Returns the number of messages archived. Raises
+    DetachDeferred, with the month left as it was, if the partition stays
+    locked for DETACH_LOCK_TIMEOUT.
+
+    The archive rows are committed before the partition goes, so readers
+    find the month's messages in one place or the other throughout. A run
+    that failed part way can simply be repeated: the month's archive rows
+    are rebuilt from the partition, attached or already detached.
+    """
+    name = partition_name(month)
+
+    archived = 0
+    with transaction.atomic():
+        MessageArchive.objects.filter(month=month.date()).delete()
+        rows = connection.chunked_cursor()
+        rows.execute(f'SELECT room_id, id, author_id, created_at, content FROM {name} ORDER BY room_id, created_at, id')
+        batch = []
+        for room_id, messages in groupby(rows, key=lambda row: row[0]):
+            messages = [message[1:] for message in messages]
+            batch.append(MessageArchive(
+                room_id=room_id,
+                month=month.date(),
+                first_created_at=messages[0][2],
+                last_created_at=messages[-1][2],
+                message_count=len(messages),
+                payload=pack(messages),
+            ))
+            archived += len(messages)
+            if len(batch) >= ARCHIVE_BATCH_SIZE:
+                MessageArchive.objects.bulk_create(batch)
+                batch = []
+        MessageArchive.objects.bulk_create(batch)
+        rows.close()
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(%s)', [name])
+        row = cursor.fetchone()
+        if row is not None and row[0]:
+            # Left half done by an interrupted CONCURRENTLY
+            cursor.execute(f'ALTER TABLE {PARENT} DETACH PARTITION {name} FINALIZE')
+        elif row is not None and has_default_partition(cursor):
+            # CONCURRENTLY isn't allowed next to a default partition. A plain
+            # detach is only a catalog change, but it needs the table to
+            # itself: rather than hold message traffic up behind a long
+            # query, give up and leave it for the next run.
+            try:
+                with transaction.atomic():
+                    cursor.execute(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'")
+                    cursor.execute(f'ALTER TABLE {PARENT} DETACH PARTITION {name}')
+            except OperationalError as error:
+                if not is_lock_timeout(error):
+                    raise
+                # The month stays in its partition, so readers mustn't also
+                # find it in the archive.
+                MessageArchive.objects.filter(month=month.date()).delete()
+                raise DetachDeferred(name) from error
+        elif row is not None:
+            # Keeps reads and writes of the other months going while the
+            # partition is detached. It can't run in a transaction.
+            cursor.execute(f'ALTER TABLE {PARENT} DETACH PARTITION {name} CONCURRENTLY')
+        cursor.execute(f'DROP TABLE {name}')
+    return archived
+
+
+class ArchivedHistory:
+    """
+    A room's archived messages, as dicts like the message .values() rows
+    (rows.MESSAGE_VALUES), for MessageCursorPagination to continue into once
+    the partitions run out. Positions are (created_at, id) pairs, like the
+    pagination cursors.
+    """
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+
+    def covers(self, created_at):
+        # The current month is never archived, which spares most polls the lookup
+        if created_at >= month_start(timezone.now()):
+            return False
+        horizon = hot_horizon()
+        return horizon is not None and created_at < horizon
+
+    def months(self):
+        """The room's MessageArchive rows, oldest first; unpack() gives each one's messages."""
+        return MessageArchive.objects.filter(room_id=self.room_id).order_by('month')
+
+    def unpack(self, archive):
+        return [
+            {'id': pk, 'author_id': author_id, 'content': content, 'created_at': parse_datetime(created_at)}
+            for pk, author_id, created_at, content in json.loads(zlib.decompress(archive.payload))
+        ]
+
+    def older(self, position, count):
+        """Up to `count` messages before `position` (None for the newest), newest first."""
+        archives = MessageArchive.objects.filter(room_id=self.room_id).order_by('-month')
+        if position is not None:
+            archives = archives.filter(first_created_at__lte=position[0])
+
+        messages = []
+        for archive in archives.iterator(chunk_size=4):
+            unpacked = self.unpack(archive)
+            unpacked.reverse()
+            if position is not None:
+                unpacked = [message for message in unpacked if (message['created_at'], message['id']) < position]
+            messages.extend(unpacked[:count - len(messages)])
+            if len(messages) >= count:
+                break
+        return messages
+
+    def newer(self, position, count):
+        """Up to `count` messages after `position`, oldest first."""
+        archives = MessageArchive.objects.filter(
+            room_id=self.room_id, last_created_at__gte=position[0]
+        ).order_by('month')
+
+        messages = []
+        for archive in archives.iterator(chunk_size=4):
+            unpacked = [message for message in self.unpack(archive) if (message['created_at'], message['id']) > position]
+            messages.extend(unpacked[:count - len(messages)])
+            if len(messages) >= count:
+                break
+        return messages
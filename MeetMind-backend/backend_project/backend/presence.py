@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+INSTANCES_KEY = 'presence:instances'
+
+
+def snapshot_key(instance_id):
+    return f'presence:snapshot:{instance_id}'
+
+
+class PresenceTracker:
+    """
+    Who is in which room right now, from client heartbeats.
+
+    Unlike Room.participants (membership, kept in Postgres), presence lives
+    in memory: each heartbeat just moves the user's expiry PRESENCE_TTL
+    seconds ahead, and users whose heartbeats stop drop out on their own.
+    Nothing here touches the database.
+
+    Every PRESENCE_SNAPSHOT_INTERVAL seconds a background thread writes this
+    process's rooms to the Django cache, so with a shared cache the counts
+    cover every worker; a worker's own rooms are always read live.
+    """
+
+    def __init__(self):
+        self._rooms = {}
+        # (room_id, user_id): websockets open in this process
+        self._sockets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._instance_id = None
+
+    def heartbeat(self, room_id, user_id):
+        expires = time.monotonic() + settings.PRESENCE_TTL
+        with self._lock:
+            self._rooms.setdefault(room_id, {})[user_id] = expires
+        self._ensure_snapshotter()
+
+    def leave(self, room_id, user_id):
+        with self._lock:
+            users = self._rooms.get(room_id)
+            if users is not None:
+                users.pop(user_id, None)
+                if not users:
+                    del self._rooms[room_id]
+
+    def socket_opened(self, room_id, user_id):
+        with self._lock:
+            self._sockets[room_id, user_id] = self._sockets.get((room_id, user_id), 0) + 1
+        self.heartbeat(room_id, user_id)
+
+    def socket_closed(self, room_id, user_id):
+        """Leaves the room once the user's last socket to it here has closed."""
+        with self._lock:
+            remaining = self._sockets.pop((room_id, user_id), 0) - 1
+            if remaining > 0:
+                self._sockets[room_id, user_id] = remaining
+                return
+        self.leave(room_id, user_id)
+
+    def _expire(self, room_id, now):
+        users = self._rooms.get(room_id)
+        if users is None:
+            return
+        for user_id in [user_id for user_id, expires in users.items() if expires <= now]:
+            del users[user_id]
+        if not users:
+            del self._rooms[room_id]
+
+    def local_rooms(self, room_ids=None):
+        """
+        {room_id: set of user ids} seen by this process, dropping expired
+        entries. Only the given rooms if `room_ids` is passed, so a read
+        doesn't cost more with every other room that has people online.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if room_ids is None:
+                room_ids = list(self._rooms)
+            for room_id in room_ids:
+                self._expire(room_id, now)
+            return {room_id: set(self._rooms[room_id]) for room_id in room_ids if room_id in self._rooms}
+
+    def online_users(self, room_ids):
+        """{room_id: set of user ids online} for the given rooms, across workers."""
+        online = {room_id: set() for room_id in room_ids}
+        cache = caches['presence']
+        instances = [instance for instance in cache.get(INSTANCES_KEY, []) if instance != self._instance_id]
+        snapshots = cache.get_many([snapshot_key(instance) for instance in instances])
+        for rooms in [*snapshots.values(), self.local_rooms(online)]:
+            for room_id in online:
+                online[room_id].update(rooms.get(room_id, ()))
+        return online
+
+    def online_counts(self, room_ids):
+        return {room_id: len(users) for room_id, users in self.online_users(room_ids).items()}
+
+    def snapshot(self):
+        rooms = self.local_rooms()
+        cache = caches['presence']
+        # Outlives one missed snapshot, then expires with a dead worker
+        cache.set(snapshot_key(self._instance_id), rooms, settings.PRESENCE_TTL + settings.PRESENCE_SNAPSHOT_INTERVAL)
+        instances = cache.get(INSTANCES_KEY, [])
+        live = cache.get_many([snapshot_key(instance) for instance in instances])
+        if self._instance_id not in instances or len(live) < len(instances):
+            # Concurrent registrations can drop an id; the next round adds it back.
+            instances = [instance for instance in instances if snapshot_key(instance) in live]
+            if self._instance_id not in instances:
+                instances.append(self._instance_id)
+            cache.set(INSTANCES_KEY, instances, None)
+
+    def _ensure_snapshotter(self):
+        # Threads don't survive a fork, so check the pid as well.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._instance_id = uuid.uuid4().hex
+            self._thread = threading.Thread(target=self._run, name='presence-snapshot', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception('Error writing presence snapshot')
+            time.sleep(settings.PRESENCE_SNAPSHOT_INTERVAL)
+
+
+presence = PresenceTracker()
@@ -0,0 +1,250 @@
+"""
+Item-to-item room recommendations.
+
+Two rooms are similar when the same people take part in both, and a bit
+more so when they're in the same topic:
+
+    score(a, b) = cosine(participants of a, participants of b)
+                  + ROOM_SIMILARITY_TOPIC_WEIGHT * (same topic)
+
+Rooms with no participants in common only come into it through the topic,
+and then only the ROOM_SIMILARITY_TOPIC_CANDIDATES rooms of the topic with
+the most participants, which keeps the matrices sparse. Each room keeps its
+ROOM_SIMILARITY_TOP_K best neighbours in RoomSimilarity, so serving them is
+a lookup on the (room, -score) index.
+
+build_similarity() recomputes every room with sparse matrix products
+(`manage.py build_room_similarity`, nightly from cron). Each block of rooms
+is written in its own short transaction, so reads and update_room() carry
+on while it runs. In between,
+update_room() runs in the background whenever someone joins or leaves a
+room. It recomputes that room's neighbours and its score in the lists of
+the rooms it shares participants with. Lists trimmed that way can end up
+short of rooms the next full build would add back, and when a join or
+leave changes which rooms are a topic's candidates, the other rooms of the
+topic only see that at the next full build.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from scipy import sparse
+
+from .models import Room, RoomSimilarity
+from .rows import ROOM_VALUES, room_rows
+
+Membership = Room.participants.through
+
+
+def load_rooms():
+    """Room ids (ascending), topic ids and participant counts, as arrays."""
+    rows = Room.objects.order_by('id').annotate(members=Count('participants')).values_list('id', 'topic_id', 'members')
+    rooms = np.array(list(rows), dtype=np.int64).reshape(-1, 3)
+    return rooms[:, 0], rooms[:, 1], rooms[:, 2]
+
+
+def group_rank(groups):
+    """Position of each element within its run of equal values in a sorted array."""
+    return np.arange(len(groups)) - np.searchsorted(groups, groups)
+
+
+def topic_candidates(topic_index, topic_count, members, count):
+    """Topic x room matrix with a 1 for each topic's `count` rooms with the most participants."""
+    # By topic, then most participants first, then lowest id (rooms come in id order)
+    order = np.lexsort((-members, topic_index))
+    keep = order[group_rank(topic_index[order]) < count]
+    return sparse.csr_matrix(
+        (np.ones(len(keep)), (topic_index[keep], keep)),
+        shape=(topic_count, len(topic_index)),
+    )
+
+
+def top_k(rows, cols, scores, k):
+    """The k best-scored (row, col, score) entries for each row, ties going to the lower col."""
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    keep = group_rank(rows) < k
+    return rows[keep], cols[keep], scores[keep]
+
+
+def build_similarity(top_k_size=None, batch_size=None):
+    """Recompute every room's neighbours. Returns (rooms, neighbour rows written)."""
+    k = top_k_size or settings.ROOM_SIMILARITY_TOP_K
+    batch_size = batch_size or settings.ROOM_SIMILARITY_BATCH_SIZE
+    weight = settings.ROOM_SIMILARITY_TOPIC_WEIGHT
+
+    room_ids, room_topics, members = load_rooms()
+    n = len(room_ids)
+    pairs = np.array(list(Membership.objects.values_list('room_id', 'user_id')), dtype=np.int64).reshape(-1, 2)
+    users, user_index = np.unique(pairs[:, 1], return_inverse=True)
+
+    # Rooms x users, each row scaled to unit length: products of rows are cosines
+    participation = sparse.csr_matrix(
+        (np.ones(len(pairs)), (np.searchsorted(room_ids, pairs[:, 0]), user_index)),
+        shape=(n, len(users)),
+    )
+    lengths = np.sqrt(np.asarray(participation.sum(axis=1)).ravel())
+    lengths[lengths == 0] = 1
+    normalized = (sparse.diags(1 / lengths) @ participation).tocsr()
+    normalized_t = normalized.T.tocsr()
+
+    topics, topic_index = np.unique(room_topics, return_inverse=True)
+    in_topic = sparse.csr_matrix(
+        (np.ones(n), (np.arange(n), topic_index)),
+        shape=(n, len(topics)),
+    )
+    candidates = topic_candidates(topic_index, len(topics), members, settings.ROOM_SIMILARITY_TOPIC_CANDIDATES)
+
+    written = 0
+    # A block of rooms at a time keeps the products' size bounded
+    for start in range(0, n, batch_size):
+        block = slice(start, start + batch_size)
+        shared = (normalized[block] @ normalized_t).tocoo()
+        topic_mates = (in_topic[block] @ candidates).tocoo()
+
+        rows = np.concatenate([shared.row, topic_mates.row]).astype(np.int64)
+        cols = np.concatenate([shared.col, topic_mates.col]).astype(np.int64)
+        cosines = np.concatenate([shared.data, np.zeros(len(topic_mates.data))])
+        # Rooms that share participants and are topic candidates appear in both
+        keys, positions = np.unique(rows * n + cols, return_inverse=True)
+        cosines = np.bincount(positions, weights=cosines, minlength=len(keys))
+        rows, cols = keys // n, keys % n
+        values = cosines + weight * (topic_index[rows + start] == topic_index[cols])
+
+        mask = (rows + start != cols) & (values > 0)
+        rows, cols, values = top_k(rows[mask], cols[mask], values[mask], k)
+        replace_neighbours(room_ids[block].tolist(), room_ids[rows + start].tolist(), room_ids[cols].tolist(), values.tolist())
+        written += len(rows)
+    return n, written
+
+
+def replace_neighbours(room_ids, rows, similar_room_ids, scores):
+    """
+    Make (rows, similar_room_ids, scores) the stored neighbours of
+    `room_ids`, in one short transaction. Rows whose score hasn't changed
+    aren't rewritten, so a nightly build doesn't leave a table's worth of
+    dead tuples behind or hold locks on more than a block of rooms.
+    """
+    table, rooms = RoomSimilarity._meta.db_table, Room._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'''
+            DELETE FROM {table} old WHERE old.room_id = ANY(%s) AND NOT EXISTS (
+                SELECT 1 FROM unnest(%s::bigint[], %s::bigint[]) AS new (room_id, similar_room_id)
+                WHERE new.room_id = old.room_id AND new.similar_room_id = old.similar_room_id
+            )
+        ''', [room_ids, rows, similar_room_ids])
+        cursor.execute(f'''
+            INSERT INTO {table} (room_id, similar_room_id, score)
+            SELECT new.* FROM unnest(%s::bigint[], %s::bigint[], %s::double precision[])
+                AS new (room_id, similar_room_id, score)
+            -- Leaves out rooms deleted since the build loaded them
+            JOIN {rooms} room ON room.id = new.room_id
+            JOIN {rooms} similar_room ON similar_room.id = new.similar_room_id
+            ON CONFLICT (room_id, similar_room_id) DO UPDATE SET score = EXCLUDED.score
+            WHERE {table}.score IS DISTINCT FROM EXCLUDED.score
+        ''', [rows, similar_room_ids, scores])
+
+
+def room_scores(room_id, topic_id):
+    """
+    ({room id: score} for every room `room_id` could be similar to,
+    set of the ones among them that share participants with it).
+    """
+    table = Membership._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            SELECT other.room_id, COUNT(*), room.topic_id,
+                   (SELECT COUNT(*) FROM {table} WHERE room_id = other.room_id)
+            FROM {table} mine
+            JOIN {table} other ON other.user_id = mine.user_id AND other.room_id <> mine.room_id
+            JOIN {Room._meta.db_table} room ON room.id = other.room_id
+            WHERE mine.room_id = %s
+            GROUP BY other.room_id, room.topic_id
+        ''', [room_id])
+        shared = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+
+    members = Membership.objects.filter(room_id=room_id).count()
+    weight = settings.ROOM_SIMILARITY_TOPIC_WEIGHT
+    # The same candidates as topic_candidates(): the room itself counts
+    # towards the limit when it's one of them
+    candidates = (
+        Room.objects.filter(topic_id=topic_id).annotate(members=Count('participants'))
+        .order_by('-members', 'id').values_list('id', flat=True)[:settings.ROOM_SIMILARITY_TOPIC_CANDIDATES]
+    )
+
+    scores = dict.fromkeys((candidate for candidate in candidates if candidate != room_id), weight)
+    if len(shared):
+        cosines = shared[:, 1] / np.sqrt(members * shared[:, 3]) + weight * (shared[:, 2] == topic_id)
+        scores.update(zip(shared[:, 0].astype(np.int64).tolist(), cosines.tolist()))
+    return scores, set(shared[:, 0].astype(np.int64).tolist())
+
+
+def trim(room_ids, k):
+    """Drop everything past the k best neighbours of each room."""
+    table = RoomSimilarity._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            DELETE FROM {table} WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, row_number() OVER (PARTITION BY room_id ORDER BY score DESC, similar_room_id) AS position
+                    FROM {table} WHERE room_id = ANY(%s)
+                ) ranked WHERE position > %s
+            )
+        ''', [sorted(room_ids), k])
+
+
+def update_room(room_id):
+    """After someone joins or leaves: the room's neighbours, and its place in theirs."""
+    room = Room.objects.filter(pk=room_id).values('topic_id').first()
+    if room is None:
+        # Deleted; its rows went with it
+        return
+
+    k = settings.ROOM_SIMILARITY_TOP_K
+    scores, shared = room_scores(room_id, room['topic_id'])
+    best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    with transaction.atomic():
+        RoomSimilarity.objects.filter(room_id=room_id).delete()
+        RoomSimilarity.objects.bulk_create([
+            RoomSimilarity(room_id=room_id, similar_room_id=similar_room_id, score=score)
+            for similar_room_id, score in best
+        ])
+
+        # Scores are symmetric, so the other rooms' score for this one is
+        # the same. Rooms left with only the topic in common keep that part.
+        listed = RoomSimilarity.objects.filter(similar_room_id=room_id).exclude(room_id__in=shared)
+        listed.filter(room__topic_id=room['topic_id']).update(score=settings.ROOM_SIMILARITY_TOPIC_WEIGHT)
+        listed.exclude(room__topic_id=room['topic_id']).delete()
+        RoomSimilarity.objects.bulk_create(
+            [
+                RoomSimilarity(room_id=other_id, similar_room_id=room_id, score=scores[other_id])
+                for other_id in sorted(shared)
+            ],
+            update_conflicts=True,
+            unique_fields=['room', 'similar_room'],
+            update_fields=['score'],
+        )
+        trim(shared, k)
+
+
+def scored_rooms(scores):
+    """Room list rows plus 'score' for [(room id, score)], in that order."""
+    rooms = Room.objects.with_participant_ids().filter(id__in=[room_id for room_id, score in scores])
+    rows = {row['id']: row for row in room_rows(rooms.values(*ROOM_VALUES))}
+    return [{**rows[room_id], 'score': round(score, 4)} for room_id, score in scores if room_id in rows]
+
+
+def similar_rooms(room_id, limit):
+    neighbours = RoomSimilarity.objects.filter(room_id=room_id).order_by('-score', 'similar_room_id')
+    return scored_rooms(list(neighbours.values_list('similar_room_id', 'score')[:limit]))
+
+
+def recommended_rooms(user_id, limit):
+    """Rooms most similar to the ones the user is in, summed over those rooms."""
+    joined = Membership.objects.filter(user_id=user_id).values('room_id')
+    scores = (
+        RoomSimilarity.objects.filter(room_id__in=joined).exclude(similar_room_id__in=joined)
+        .values('similar_room_id').annotate(total=Sum('score')).order_by('-total', 'similar_room_id')
+    )
+    return scored_rooms(list(scores.values_list('similar_room_id', 'total')[:limit]))
@@ -0,0 +1,66 @@
+"""
+Read replica routing.
+
+ReplicaRoutingMiddleware marks GET requests to the views in
+REPLICA_READ_VIEWS, and ReplicaRouter sends the reads those requests make to
+one of REPLICA_DATABASES. Everything else, including every write, uses
+`default`.
+
+A user who has just written something is pinned to the primary for
+REPLICA_PIN_SECONDS, so their next reads can't come from a replica that
+hasn't caught up yet. Pins are kept in the default cache, which the worker
+processes share (a file or database cache; locmem is refused with more
+than one worker), so a write on one worker pins reads on the others.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# The current request's routing, or None outside a request. A mutable
+# object rather than a plain flag so the middleware can decide after the
+# context has been copied into a worker thread.
+current_routing = ContextVar('db_routing', default=None)
+# Set around work that must see the latest data even in a replica request
+force_primary = ContextVar('db_force_primary', default=False)
+
+
+class Routing:
+    def __init__(self):
+        self.replica = False
+        # Whether a successful non-GET should pin the user to the primary
+        self.pin = True
+
+
+@contextmanager
+def use_primary():
+    token = force_primary.set(True)
+    try:
+        yield
+    finally:
+        force_primary.reset(token)
+
+
+def pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or not routing.replica or force_primary.get():
+            return None
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
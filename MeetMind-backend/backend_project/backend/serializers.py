@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from .models import Room
 from .models import Topic
 from .models import Message
+from .models import Profile
+from .avatars import avatar_url, avatar_urls, schedule_avatar_processing
 
 
 User = get_user_model()
@@ -16,12 +18,32 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'avatar', 'bio', 'full_name']
 
+    PROFILE_FIELDS = ('avatar', 'bio', 'full_name')
+
+    def update(self, instance, validated_data):
+        profile_data = {field: validated_data.pop(field) for field in self.PROFILE_FIELDS if field in validated_data}
+        instance = super().update(instance, validated_data)
+
+        if profile_data:
+            profile, created = Profile.objects.get_or_create(user=instance)
+            for attr, value in profile_data.items():
+                setattr(profile, attr, value)
+            if 'avatar' in profile_data:
+                # Old variants belong to the previous image
+                profile.avatar_variants = {}
+            profile.save()
+            if profile_data.get('avatar'):
+                schedule_avatar_processing(profile)
+            instance.profile = profile
+        return instance
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        if hasattr(instance, 'profile'):
-            data['avatar'] = instance.profile.avatar.url if instance.profile.avatar else None
-            data['bio'] = instance.profile.bio
-            data['full_name'] = instance.profile.full_name if instance.profile.full_name else ''
+        profile = instance.profile if hasattr(instance, 'profile') else None
+        data['avatar'] = avatar_url(profile)
+        data['avatar_variants'] = avatar_urls(profile)
+        data['bio'] = profile.bio if profile else None
+        data['full_name'] = profile.full_name if profile and profile.full_name else ''
         return data
 
 class RoomSerializer(serializers.ModelSerializer):
@@ -34,18 +56,17 @@ class RoomSerializer(serializers.ModelSerializer):
         fields = ['id', 'creator', 'topic', 'name', 'description', 'created', 'updated', 'participants']
 
     def get_participants(self, obj):
+        # Listing querysets annotate the ids up front (Room.objects.with_participant_ids)
+        if hasattr(obj, 'participant_ids'):
+            return [{'id': participant_id} for participant_id in obj.participant_ids]
         return list(obj.participants.values('id'))
 
 
 class TopicSerializer(serializers.ModelSerializer):
-    room_count = serializers.SerializerMethodField()
-
     class Meta:
         model = Topic
         fields = ['id', 'name', 'room_count']
-
-    def get_room_count(self, obj):
-        return obj.rooms.count()
+        read_only_fields = ['room_count']
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -53,3 +74,7 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = ['id', 'author', 'content', 'created_at']
 
+
+class MessageSearchSerializer(MessageSerializer):
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ['room']
@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import DEFERRED, Q
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache, partitions, recommendations
+from .authentication import user_cache
+from .metrics import count_connection, install_query_recorder
+from .models import Profile, Room, Tombstone, Topic
+from .sync import record_tombstone
+from .tasks import run_in_background
+
+
+def invalidate_on_commit(*scopes):
+    # Bumping the generation before the write commits would let a concurrent
+    # request cache the old rows under the new generation.
+    transaction.on_commit(lambda: cache.invalidate(*scopes))
+
+
+connection_created.connect(install_query_recorder)
+connection_created.connect(count_connection)
+
+
+def loaded_value(instance, attname):
+    # Reading a field left out with .only()/.defer() would cost a query per
+    # instance, so those are remembered as DEFERRED and looked up on save.
+    return instance.__dict__.get(attname, DEFERRED)
+
+
+def remember_deferred(instance, attname, remembered):
+    """Fill in the stored value of a field that wasn't loaded, before saving over it."""
+    if getattr(instance, remembered) is not DEFERRED:
+        return
+    if attname in instance.__dict__:
+        # Assigned since loading: read what it's replacing
+        value = type(instance)._base_manager.filter(pk=instance.pk).values_list(attname, flat=True).first()
+    else:
+        # Not being saved either; loading it now gives the stored value
+        value = getattr(instance, attname)
+    setattr(instance, remembered, value)
+
+
+@receiver(post_init, sender=Room)
+def remember_room_topic(sender, instance, **kwargs):
+    # Lets us invalidate the old topic's room list when a room moves.
+    instance._loaded_topic_id = loaded_value(instance, 'topic_id')
+
+
+@receiver(pre_save, sender=Room)
+def room_saving(sender, instance, **kwargs):
+    remember_deferred(instance, 'topic_id', '_loaded_topic_id')
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, created, **kwargs):
+    scopes = {cache.room_scope(None), cache.room_scope(instance.topic_id)}
+    if created or instance._loaded_topic_id != instance.topic_id:
+        scopes.add(cache.room_scope(instance._loaded_topic_id))
+        scopes.add(cache.TOPICS)
+    if not created and instance._loaded_topic_id != instance.topic_id:
+        # Gone from the old topic's room list, as far as delta sync goes
+        record_tombstone(Tombstone.ROOM, instance.pk, instance._loaded_topic_id, moved=True)
+    instance._loaded_topic_id = instance.topic_id
+    invalidate_on_commit(*scopes)
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    record_tombstone(Tombstone.ROOM, instance.pk, instance.topic_id)
+    invalidate_on_commit(cache.room_scope(None), cache.room_scope(instance.topic_id), cache.TOPICS)
+
+
+@receiver(post_init, sender=Topic)
+def remember_topic_name(sender, instance, **kwargs):
+    instance._loaded_name = loaded_value(instance, 'name')
+
+
+@receiver(pre_save, sender=Topic)
+def topic_saving(sender, instance, **kwargs):
+    remember_deferred(instance, 'name', '_loaded_name')
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def topic_changed(sender, instance, **kwargs):
+    # Room rows include the topic name.
+    invalidate_on_commit(cache.TOPICS, cache.room_scope(None), cache.room_scope(instance.pk))
+
+
+@receiver(post_save, sender=Topic)
+def topic_renamed(sender, instance, created, **kwargs):
+    if not created and instance._loaded_name != instance.name:
+        # Rooms show the topic name, so delta sync has to send them again.
+        Room.objects.filter(topic=instance).update(updated=timezone.now())
+    instance._loaded_name = instance.name
+
+
+@receiver(post_delete, sender=Topic)
+def topic_deleted(sender, instance, **kwargs):
+    record_tombstone(Tombstone.TOPIC, instance.pk)
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # instance is a user; we don't know which rooms' topics were touched
+        invalidate_on_commit(cache.ROOMS)
+        # After a clear pk_set is None; the nightly rebuild catches up
+        room_ids = pk_set or ()
+    else:
+        invalidate_on_commit(cache.room_scope(None), cache.room_scope(instance.topic_id))
+        # pk_set is empty when nobody was actually added or removed
+        room_ids = [instance.pk] if pk_set or action == 'post_clear' else ()
+
+    for room_id in room_ids:
+        run_in_background(recommendations.update_room, room_id)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def touch_user_rooms(sender, instance, **kwargs):
+    # Deleting the user changes these rooms in SQL only (see below), which
+    # wouldn't move Room.updated for the ETag / Last-Modified validators.
+    Room.objects.filter(Q(creator=instance) | Q(participants=instance)).update(updated=timezone.now())
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    # Deleting a user nulls Room.creator and drops participant rows in SQL,
+    # without any Room signals.
+    invalidate_on_commit(cache.ROOMS)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
+
+
+@receiver(post_migrate)
+def ensure_message_partitions(sender, **kwargs):
+    # Every deploy tops up the months ahead, in case the cron job hasn't run.
+    if sender.name != 'backend':
+        return
+    with connection.cursor() as cursor:
+        if not partitions.is_partitioned(cursor):
+            return
+    now = timezone.now()
+    partitions.ensure_partitions(now, partitions.add_months(partitions.month_start(now), settings.MESSAGE_PARTITION_MONTHS_AHEAD))
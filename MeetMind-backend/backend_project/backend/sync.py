@@ -0,0 +1,99 @@
+"""
+Delta sync for the room and topic lists (``?since=<cursor>``).
+
+A sync returns the rows created or updated after the cursor, the ids of
+rows deleted since then (from Tombstone), and a new cursor. Clients apply
+``deleted`` and then upsert ``results`` into their local copy. When
+``reset`` is true (first sync, or a cursor older than the tombstones we
+keep), ``results`` is the full list and the local copy should be replaced.
+
+Cursors trail the sync time by SYNC_CURSOR_LAG seconds so rows written
+by a transaction that commits just after we read are picked up next time.
+A few rows may be sent twice; upserting them again is harmless.
+"""
+import base64
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Room, Tombstone, Topic
+from .pagination import InvalidCursor
+from .routers import use_primary
+from .rows import ROOM_VALUES, TOPIC_VALUES, room_rows, topic_rows
+
+
+def encode_cursor(timestamp):
+    return base64.urlsafe_b64encode(timestamp.isoformat().encode()).decode()
+
+
+def decode_cursor(cursor):
+    # '0' (or an empty cursor) asks for everything
+    if cursor in ('', '0'):
+        return None
+    try:
+        timestamp = parse_datetime(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor()
+    if timestamp is None:
+        raise InvalidCursor()
+    return timestamp
+
+
+def record_tombstone(kind, object_id, topic_id=None, moved=False):
+    now = timezone.now()
+    Tombstone.objects.create(kind=kind, object_id=object_id, topic_id=topic_id, moved=moved, removed_at=now)
+    # Clients with older cursors get a full reset instead, so older tombstones are never read.
+    Tombstone.objects.filter(removed_at__lt=now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)).delete()
+
+
+def _changes(since, rows, tombstones, fields, build_rows):
+    # A replica that is behind by more than SYNC_CURSOR_LAG would make
+    # clients skip rows for good, so syncs always read the primary.
+    with use_primary():
+        return _read_changes(since, rows, tombstones, fields, build_rows)
+
+
+def _read_changes(since, rows, tombstones, fields, build_rows):
+    started = timezone.now()
+    cutoff = decode_cursor(since)
+    reset = cutoff is None or cutoff < started - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+    deleted = set()
+    if not reset:
+        rows = rows.filter(updated__gt=cutoff)
+        deleted = set(tombstones.filter(removed_at__gt=cutoff).values_list('object_id', flat=True))
+
+    results = build_rows(rows.order_by('updated', 'id').values(*fields))
+    # A room that left a topic and came back is still there
+    deleted -= {row['id'] for row in results}
+
+    return {
+        'results': results,
+        'deleted': sorted(deleted),
+        'cursor': encode_cursor(started - timedelta(seconds=settings.SYNC_CURSOR_LAG)),
+        'reset': reset,
+    }
+
+
+def room_changes(topic_id, since):
+    rooms = Room.objects.with_participant_ids()
+    tombstones = Tombstone.objects.filter(kind=Tombstone.ROOM)
+    if topic_id:
+        rooms = rooms.filter(topic_id=topic_id)
+        tombstones = tombstones.filter(topic_id=topic_id)
+    else:
+        tombstones = tombstones.filter(moved=False)
+    return _changes(since, rooms, tombstones, ROOM_VALUES, room_rows)
+
+
+def topic_changes(since):
+    return _changes(
+        since,
+        Topic.objects.all(),
+        Tombstone.objects.filter(kind=Tombstone.TOPIC),
+        TOPIC_VALUES,
+        topic_rows,
+    )
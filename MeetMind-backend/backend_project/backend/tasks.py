@@ -0,0 +1,31 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='background-task')
+
+
+def _run(fn, args):
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception('Background task %s failed', fn.__name__)
+    finally:
+        # Worker threads get their own connections; don't leave them open.
+        connections.close_all()
+
+
+def run_in_background(fn, *args):
+    """
+    Run fn(*args) on a worker thread once the current transaction commits,
+    so the request doesn't wait for it. With BACKGROUND_TASKS_EAGER the task
+    runs inline instead (handy in tests and one-off scripts).
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        transaction.on_commit(lambda: fn(*args))
+    else:
+        transaction.on_commit(lambda: _executor.submit(_run, fn, args))
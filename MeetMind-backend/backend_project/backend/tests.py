@@ -1,3 +1,1645 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import runpy
+import tempfile
+import time
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.postgres.search import SearchQuery
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import cache as response_cache
+from .activity import ActivityRecorder
+from .async_views import AsyncRoomDetailView, AsyncRoomListView, AsyncTopicListView, AsyncUserActivityView
+from .avatars import AVATAR_SIZES, avatar_url, avatar_urls, process_avatar
+from .authentication import CachedJWTAuthentication, JWTAuthMiddleware, UserCache, user_cache
+from .conditional import room_list_validators, topic_list_validators
+from .partitions import ArchivedHistory, add_months, archive_partition, ensure_partitions, month_start, partition_name
+from .management.commands.prune_activities import Command as PruneActivitiesCommand
+from .metrics import LATENCY_BUCKETS, MetricsRegistry
+from .presence import PresenceTracker
+from .models import User, Profile, Topic, Room, RoomSimilarity, Message, MessageArchive, Activity, Tombstone
+from .recommendations import build_similarity, update_room
+from .renderers import ORJSONRenderer
+from .routing import websocket_urlpatterns
+from .rows import MESSAGE_VALUES, ROOM_VALUES, TOPIC_VALUES, message_rows, room_rows, topic_rows
+from .serializers import MessageSerializer, RoomSerializer, TopicSerializer
+from .sync import encode_cursor as sync_cursor
+from .tasks import _run as run_task
+from .views import RoomDetailView, RoomListView, TopicListView, UserActivityView
+
+
+def setUpModule():
+    # The default cache is shared on disk; don't serve lists from an earlier run
+    cache.clear()
+
+
+def load_settings(**env):
+    """The project settings as they'd be read with `env` set (None unsets a variable)."""
+    with mock.patch.dict(os.environ):
+        for name, value in env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        return runpy.run_path(import_module('backend_project.settings').__file__)
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        Profile.objects.create(user=self.user, full_name='Lama')
+        self.authentication = CachedJWTAuthentication()
+
+    def authenticate(self, token=None):
+        token = token or AccessToken.for_user(self.user)
+        return self.authentication.get_user(self.authentication.get_validated_token(str(token)))
+
+    def test_cached_user_needs_no_queries(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user.profile.full_name, 'Lama')
+
+    def test_saving_user_or_profile_drops_the_entry(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'L'
+            self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().first_name, 'L')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.filter(user=self.user).get().save()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_changed_token_version_misses(self):
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            old_token = AccessToken.for_user(self.user)
+            self.authenticate(old_token)
+            # A password change another process made; no signal reaches this one
+            self.user.set_password('another-pass-456')
+            User.objects.filter(pk=self.user.pk).update(password=self.user.password)
+
+            with self.assertNumQueries(1):
+                self.authenticate(AccessToken.for_user(self.user))
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(old_token)
+
+    def test_inactive_user_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.assertIsNone(user_cache.get(self.user.pk, None))
+
+    def test_entries_are_evicted_past_max_entries(self):
+        cache = UserCache()
+        cache.MAX_ENTRIES = 2
+        cache.set(1, None, self.user)
+        cache.set(2, None, self.user)
+        self.assertIsNotNone(cache.get(1, None))
+        cache.set(3, None, self.user)
+        self.assertEqual([cache.get(user_id, None) is not None for user_id in (1, 2, 3)], [False, False, True])
+
+    def test_entries_expire(self):
+        with self.settings(AUTH_USER_CACHE_TTL=30):
+            user_cache.set(self.user.pk, None, self.user)
+            with mock.patch('backend.authentication.time.monotonic', return_value=time.monotonic() + 31):
+                self.assertIsNone(user_cache.get(self.user.pk, None))
+
+
+class RoomListQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(name='Python')
+        self.members = [
+            User.objects.create_user(username=f'member{i}', email=f'member{i}@example.com', password='secret-pass-123')
+            for i in range(3)
+        ]
+
+    def create_rooms(self, count):
+        for i in range(count):
+            room = Room.objects.create(creator=self.user, topic=self.topic, name=f'Room {i}')
+            room.participants.add(*self.members[:i % 4])
+
+    def test_room_list_query_count_does_not_grow_with_rooms(self):
+        # One aggregate for the ETag / Last-Modified validators, one for the rooms
+        self.create_rooms(2)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/rooms/')
+        self.assertEqual(len(response.json()), 2)
+
+        self.create_rooms(30)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/rooms/', {'topic': self.topic.id})
+        self.assertEqual(len(response.json()), 32)
+
+    def test_room_list_includes_participants_and_topic_name(self):
+        self.create_rooms(4)
+        rooms = {room['name']: room for room in self.client.get('/api/rooms/').json()}
+
+        self.assertEqual(rooms['Room 0']['participants'], [])
+        self.assertEqual(len(rooms['Room 3']['participants']), 3)
+        self.assertEqual(rooms['Room 3']['topic'], 'Python')
+
+    def test_room_list_is_most_recently_updated_first(self):
+        self.create_rooms(4)
+        Room.objects.get(name='Room 1').save()
+        names = [room['name'] for room in self.client.get('/api/rooms/').json()]
+        self.assertEqual(names, ['Room 1', 'Room 3', 'Room 2', 'Room 0'])
+
+    def test_empty_room_list(self):
+        response = self.client.get('/api/rooms/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+
+class TopicRoomCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def room_count(self, name):
+        return Topic.objects.get(name=name).room_count
+
+    def create_room(self, topic):
+        response = self.client.post('/api/rooms/create/', {'name': 'Study', 'description': 'Notes', 'topic': topic}, format='json')
+        return response.json()['id']
+
+    def test_count_follows_rooms(self):
+        room_id = self.create_room('Python')
+        self.create_room('Python')
+        self.assertEqual(self.room_count('Python'), 2)
+
+        self.client.put(f'/api/rooms/{room_id}/', {'topic': 'Art'}, format='json')
+        self.assertEqual((self.room_count('Python'), self.room_count('Art')), (1, 1))
+
+        self.assertEqual(self.client.delete(f'/api/rooms/{room_id}/').status_code, 204)
+        self.assertEqual(self.room_count('Art'), 0)
+
+    def test_rebuild_fixes_only_the_counts_that_drifted(self):
+        self.create_room('Python')
+        self.create_room('Art')
+        Topic.objects.filter(name='Python').update(room_count=5)
+        art_updated = Topic.objects.get(name='Art').updated
+        python_updated = Topic.objects.get(name='Python').updated
+
+        # Another worker's cache, sharing the same store
+        other_worker = caches.create_connection('default')
+        with mock.patch.object(response_cache, 'cache', other_worker):
+            response_cache.get_or_build([response_cache.TOPICS], lambda: 'stale')
+
+        out = io.StringIO()
+        call_command('rebuild_topic_room_counts', stdout=out)
+        self.assertIn('Fixed room counts for 1 of 2 topics.', out.getvalue())
+        self.assertEqual((self.room_count('Python'), self.room_count('Art')), (1, 1))
+        self.assertGreater(Topic.objects.get(name='Python').updated, python_updated)
+        self.assertEqual(Topic.objects.get(name='Art').updated, art_updated)
+        with mock.patch.object(response_cache, 'cache', other_worker):
+            self.assertEqual(response_cache.get_or_build([response_cache.TOPICS], lambda: 'fresh'), ('fresh', False))
+
+        # Nothing left to fix: nothing is touched and the cached list stays
+        call_command('rebuild_topic_room_counts', stdout=out)
+        self.assertIn('Fixed room counts for 0 of 2 topics.', out.getvalue())
+        with mock.patch.object(response_cache, 'cache', other_worker):
+            self.assertEqual(response_cache.get_or_build([response_cache.TOPICS], lambda: 'rebuilt'), ('fresh', True))
+
+    def test_count_never_goes_negative(self):
+        topic = Topic.objects.create(name='Python')
+        Topic.adjust_room_count(topic.id, -1)
+        self.assertEqual(self.room_count('Python'), 0)
+
+    def test_concurrent_delete_counts_once(self):
+        self.create_room('Python')
+        room_id = self.create_room('Python')
+        url = f'/api/rooms/{room_id}/'
+        delete = Room.delete
+        raced = []
+
+        def delete_after_other_request(room, *args, **kwargs):
+            # The other request loaded the room too and gets its delete in first
+            if not raced:
+                raced.append(room)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+            return delete(room, *args, **kwargs)
+
+        with mock.patch.object(Room, 'delete', autospec=True, side_effect=delete_after_other_request):
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.room_count('Python'), 1)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.client = APIClient()
+        # Loaded the way CachedJWTAuthentication loads it
+        self.client.force_authenticate(User.objects.select_related('profile').get(pk=self.user.pk))
+        self.topic = Topic.objects.create(name='Python')
+
+    def create_rooms(self, count):
+        for i in range(count):
+            room = Room.objects.create(creator=self.user, topic=self.topic, name=f'Room {i}')
+            room.participants.add(self.user)
+            Activity.objects.create(user=self.user, type='JOIN_ROOM', description=f'Joined room: Room {i}')
+
+    def test_query_budget_does_not_grow_with_data(self):
+        # Rooms, topics and activities: one query each
+        self.create_rooms(2)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/dashboard/')
+        self.assertEqual(len(response.json()['rooms']), 2)
+
+        cache.clear()
+        self.create_rooms(30)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/dashboard/')
+        self.assertEqual(len(response.json()['rooms']), 20)
+
+    def test_dashboard_contents(self):
+        self.create_rooms(21)
+        data = self.client.get('/api/dashboard/').json()
+
+        self.assertEqual(data['profile']['username'], 'lama')
+        self.assertTrue(data['more_rooms'])
+        self.assertEqual(data['rooms'][0]['participants'], [{'id': self.user.id}])
+        self.assertEqual(data['topics'], [{'id': self.topic.id, 'name': 'Python', 'room_count': 0}])
+        self.assertEqual(len(data['activities']), 5)
+
+
+class CachedListValidatorTests(TestCase):
+    """
+    A cached list goes out with the ETag it was built at, even when the
+    data changed behind the cache's back (e.g. in another process).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(name='Python')
+        self.room = Room.objects.create(creator=self.user, topic=self.topic, name='Study')
+
+    def assertConsistent(self, path, change, scope, current_etag):
+        first = self.client.get(path)
+        # No signals, so this process's cache doesn't hear about it
+        change()
+        stale = self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale['X-Cache'], 'HIT')
+        self.assertEqual((stale.content, stale['ETag']), (first.content, first['ETag']))
+
+        response_cache.invalidate(scope)
+        fresh = self.client.get(path)
+        self.assertNotEqual(fresh.content, first.content)
+        self.assertEqual(fresh['ETag'], current_etag())
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=fresh['ETag']).status_code, 304)
+
+    def test_room_list(self):
+        self.assertConsistent(
+            '/api/rooms/',
+            lambda: Room.objects.filter(pk=self.room.pk).update(name='Renamed', updated=timezone.now()),
+            response_cache.ROOMS,
+            lambda: room_list_validators(None)[0],
+        )
+
+    def test_topic_list(self):
+        self.assertConsistent(
+            '/api/topics/',
+            lambda: Topic.objects.filter(pk=self.topic.pk).update(name='Renamed', updated=timezone.now()),
+            response_cache.TOPICS,
+            lambda: topic_list_validators()[0],
+        )
+
+
+class AsyncViewTests(TestCase):
+    """The async views answer exactly as the sync ones they replace."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        topic = Topic.objects.create(name='Python', room_count=1)
+        cls.room = Room.objects.create(creator=cls.user, topic=topic, name='Study', description='Notes')
+        cls.room.participants.add(cls.user)
+        Activity.objects.create(user=cls.user, type='room_created', description='Created Study')
+
+    def responses(self, sync_view, async_view, path, **kwargs):
+        factory = APIRequestFactory()
+        results = []
+        for view in (sync_view, async_view):
+            cache.clear()
+            request = factory.get(path)
+            force_authenticate(request, self.user)
+            handler = view.as_view()
+            response = async_to_sync(handler)(request, **kwargs) if view is async_view else handler(request, **kwargs)
+            results.append((response.status_code, response.data))
+        return results
+
+    def assertSameResponses(self, sync_view, async_view, path, **kwargs):
+        sync_response, async_response = self.responses(sync_view, async_view, path, **kwargs)
+        self.assertEqual(sync_response, async_response)
+        return sync_response
+
+    def test_room_list(self):
+        status_code, data = self.assertSameResponses(RoomListView, AsyncRoomListView, '/api/rooms/')
+        self.assertEqual((status_code, [room['name'] for room in data]), (200, ['Study']))
+        self.assertSameResponses(RoomListView, AsyncRoomListView, f'/api/rooms/?topic={self.room.topic_id}')
+        self.assertSameResponses(RoomListView, AsyncRoomListView, '/api/rooms/?since=garbage')
+
+    def test_non_numeric_topic_is_a_bad_request(self):
+        for path in ('/api/rooms/?topic=python', '/api/rooms/?topic=1.5&since=0', '/api/rooms/?topic=-1'):
+            status_code, data = self.assertSameResponses(RoomListView, AsyncRoomListView, path)
+            self.assertEqual((status_code, data), (400, {'detail': 'Invalid topic.'}))
+
+    def test_topic_list(self):
+        self.assertSameResponses(TopicListView, AsyncTopicListView, '/api/topics/')
+        self.assertSameResponses(TopicListView, AsyncTopicListView, '/api/topics/?since=garbage')
+
+    def test_room_detail(self):
+        status_code, data = self.assertSameResponses(RoomDetailView, AsyncRoomDetailView, '/', pk=self.room.pk)
+        self.assertEqual((status_code, data['participants']), (200, [{'id': self.user.id}]))
+        self.assertSameResponses(RoomDetailView, AsyncRoomDetailView, '/', pk=0)
+
+    def test_recent_activity(self):
+        self.assertSameResponses(UserActivityView, AsyncUserActivityView, '/')
+
+
+class SharedResponseCacheTests(SimpleTestCase):
+    def test_invalidation_reaches_other_workers(self):
+        # Separate cache instances, as each worker process has its own
+        worker, other_worker = caches.create_connection('default'), caches.create_connection('default')
+        scopes = ['tests', 'tests:shared']
+        with mock.patch.object(response_cache, 'cache', worker):
+            self.assertEqual(response_cache.get_or_build(scopes, lambda: 'old'), ('old', False))
+            self.assertEqual(response_cache.get_or_build(scopes, lambda: 'new'), ('old', True))
+        with mock.patch.object(response_cache, 'cache', other_worker):
+            response_cache.invalidate('tests:shared')
+        with mock.patch.object(response_cache, 'cache', worker):
+            self.assertEqual(response_cache.get_or_build(scopes, lambda: 'new'), ('new', False))
+
+    def test_cache_is_shared_unless_single_worker(self):
+        self.assertNotIn('locmem', load_settings(CACHE_BACKEND=None)['CACHES']['default']['BACKEND'])
+        self.assertIn('db', load_settings(CACHE_BACKEND='db')['CACHES']['default']['BACKEND'])
+        self.assertIn('locmem', load_settings(CACHE_BACKEND='locmem', WEB_CONCURRENCY=None)['CACHES']['default']['BACKEND'])
+        with self.assertRaises(ImproperlyConfigured):
+            load_settings(CACHE_BACKEND='locmem', WEB_CONCURRENCY='4')
+
+
+class DatabaseConnectionTests(TestCase):
+    def test_pgbouncer_turns_off_server_side_cursors(self):
+        database = load_settings(DB_PGBOUNCER='True')['DATABASES']['default']
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        database = load_settings(DB_PGBOUNCER=None)['DATABASES']['default']
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_pool_replaces_persistent_connections(self):
+        database = load_settings(DB_POOL='True', DB_CONN_MAX_AGE='600', DB_POOL_MAX_SIZE='20')['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 20)
+        database = load_settings(DB_POOL=None, DB_CONN_MAX_AGE='None')['DATABASES']['default']
+        self.assertIsNone(database['CONN_MAX_AGE'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    def test_health_reports_pool_stats(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {'pool_size': 4, 'pool_available': 3}
+        with mock.patch.object(type(connections['default']), 'pool', new_callable=mock.PropertyMock, return_value=pool):
+            response = APIClient().get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertEqual(response.json()['status'], 'ok')
+        # requests_waiting is left out by get_stats() while it's zero
+        self.assertEqual(response.json()['pools']['default'], {'size': 4, 'available': 3, 'waiting': 0})
+
+    def test_health_without_a_pool(self):
+        response = APIClient().get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('pools', response.json())
+        self.assertGreaterEqual(response.json()['database_ms'], 0)
+
+    def test_health_fails_when_the_database_is_down(self):
+        with mock.patch('backend.views.connection.cursor', side_effect=OperationalError('connection refused')):
+            response = APIClient().get('/api/health/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'error', 'database': 'unavailable'})
+
+
+def image_upload(name='avatar.jpg', size=(400, 300), color='teal'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class BackgroundTaskTests(SimpleTestCase):
+    def test_failure_is_logged_with_its_traceback(self):
+        def resize(path):
+            raise OSError(f'{path} is gone')
+
+        with mock.patch('backend.tasks.connections') as task_connections, self.assertLogs('backend.tasks') as logs:
+            run_task(resize, ('avatars/a.jpg',))
+        self.assertEqual(logs.records[0].getMessage(), 'Background task resize failed')
+        self.assertIn('avatars/a.jpg is gone', logs.output[0])
+        task_connections.close_all.assert_called_once_with()
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class AvatarTests(TestCase):
+    def setUp(self):
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/users/me/', {'avatar': image}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_upload_is_resized_in_the_background(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.put('/api/users/me/', {'avatar': image_upload()}, format='multipart')
+        # Processing waits for the request's transaction to commit
+        self.assertIsNone(response.json()['avatar'])
+        self.assertEqual(Profile.objects.get(user=self.user).avatar_variants, {})
+        for callback in callbacks:
+            callback()
+
+        variants = Profile.objects.get(user=self.user).avatar_variants
+        self.assertEqual(set(variants), {'small', 'medium', 'large'})
+        for name, edge in AVATAR_SIZES.items():
+            with default_storage.open(variants[name]) as stored:
+                content = stored.read()
+            self.assertEqual(variants[name], f'avatars/{name}/{hashlib.sha256(content).hexdigest()[:20]}.webp')
+            with Image.open(io.BytesIO(content)) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (edge, edge)))
+
+        # As the next request would load them
+        self.client.force_authenticate(User.objects.select_related('profile').get(pk=self.user.pk))
+        self.assertEqual(self.client.get('/api/users/me/').json()['avatar'], default_storage.url(variants['medium']))
+
+    def test_same_image_reuses_the_stored_variants(self):
+        self.upload(image_upload())
+        first = Profile.objects.get(user=self.user).avatar_variants
+        self.upload(image_upload(name='again.jpg'))
+        self.assertEqual(Profile.objects.get(user=self.user).avatar_variants, first)
+
+        self.upload(image_upload(color='orange'))
+        self.assertNotEqual(Profile.objects.get(user=self.user).avatar_variants['small'], first['small'])
+
+    def test_no_avatar_until_processed(self):
+        self.assertIsNone(avatar_url(None))
+        profile = Profile.objects.create(user=self.user, avatar=image_upload())
+        self.assertIsNone(avatar_url(profile))
+        self.assertEqual(avatar_urls(profile), {})
+
+        process_avatar(profile.id, profile.avatar.name)
+        profile.refresh_from_db()
+        self.assertEqual(avatar_url(profile), default_storage.url(profile.avatar_variants['medium']))
+        self.assertEqual(avatar_url(profile, 'large'), default_storage.url(profile.avatar_variants['large']))
+        self.assertIsNone(avatar_url(profile, 'huge'))
+
+    def test_replaced_avatar_is_not_processed(self):
+        profile = Profile.objects.create(user=self.user, avatar=image_upload())
+        old_name = profile.avatar.name
+        profile.avatar = image_upload(name='new.jpg', color='orange')
+        profile.save()
+        process_avatar(profile.id, old_name)
+        self.assertEqual(Profile.objects.get(pk=profile.pk).avatar_variants, {})
+
+    def test_command_fills_in_missing_variants(self):
+        profile = Profile.objects.create(user=self.user, avatar=image_upload())
+        other = User.objects.create_user(username='sami', email='sami@example.com', password='secret-pass-123')
+        Profile.objects.create(user=other)
+
+        output = io.StringIO()
+        call_command('process_avatars', stdout=output)
+        self.assertIn('Processed 1 avatars (0 failed).', output.getvalue())
+        self.assertEqual(set(Profile.objects.get(pk=profile.pk).avatar_variants), set(AVATAR_SIZES))
+
+        output = io.StringIO()
+        call_command('process_avatars', stdout=output)
+        self.assertIn('Processed 0 avatars (0 failed).', output.getvalue())
+
+
+class DeferredLoadTests(TestCase):
+    """The signals that remember loaded values mustn't undo .only()/.defer()."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        cls.topic = Topic.objects.create(name='Python')
+        cls.other_topic = Topic.objects.create(name='Art')
+        cls.room = Room.objects.create(creator=cls.user, topic=cls.topic, name='Study')
+
+    def test_deferred_room_load_is_one_query(self):
+        with self.assertNumQueries(1):
+            Room.objects.only('id').get(pk=self.room.pk)
+        with self.assertNumQueries(1):
+            list(Room.objects.defer('topic').iterator())
+
+    def test_deferred_topic_load_is_one_query(self):
+        with self.assertNumQueries(1):
+            Topic.objects.defer('name').get(pk=self.topic.pk)
+
+    def test_renaming_a_deferred_topic_still_touches_its_rooms(self):
+        before = Room.objects.get(pk=self.room.pk).updated
+        topic = Topic.objects.only('id').get(pk=self.topic.pk)
+        topic.name = 'Python 3'
+        topic.save()
+        self.assertGreater(Room.objects.get(pk=self.room.pk).updated, before)
+
+    def test_moving_a_deferred_room_still_records_the_old_topic(self):
+        room = Room.objects.only('id', 'name').get(pk=self.room.pk)
+        room.topic_id = self.other_topic.id
+        room.save()
+
+        tombstone = Tombstone.objects.get(kind=Tombstone.ROOM, object_id=room.pk)
+        self.assertEqual((tombstone.topic_id, tombstone.moved), (self.topic.id, True))
+
+
+@override_settings(SYNC_CURSOR_LAG=0)
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.python = Topic.objects.create(name='Python')
+        self.art = Topic.objects.create(name='Art')
+        self.room = Room.objects.create(creator=self.user, topic=self.python, name='Study')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, url='/api/rooms/', since='0', **params):
+        response = self.client.get(url, {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_round_trip(self):
+        first = self.sync()
+        self.assertTrue(first['reset'])
+        self.assertEqual([row['id'] for row in first['results']], [self.room.id])
+
+        unchanged = self.sync(since=first['cursor'])
+        self.assertEqual((unchanged['reset'], unchanged['results'], unchanged['deleted']), (False, [], []))
+
+        self.room.name = 'Study group'
+        self.room.save()
+        created = Room.objects.create(creator=self.user, topic=self.art, name='Sketching')
+        changes = self.sync(since=unchanged['cursor'])
+        self.assertFalse(changes['reset'])
+        self.assertEqual([row['id'] for row in changes['results']], [self.room.id, created.id])
+        self.assertEqual(changes['results'][0]['name'], 'Study group')
+
+    def test_deleted_room_is_tombstoned(self):
+        cursor = self.sync()['cursor']
+        room_id = self.room.id
+        self.room.delete()
+
+        for params in ({}, {'topic': self.python.id}):
+            changes = self.sync(since=cursor, **params)
+            self.assertEqual((changes['results'], changes['deleted']), ([], [room_id]))
+
+    def test_room_moved_out_of_filtered_topic_is_tombstoned(self):
+        python_cursor = self.sync(topic=self.python.id)['cursor']
+        art_cursor = self.sync(topic=self.art.id)['cursor']
+        cursor = self.sync()['cursor']
+        self.room.topic = self.art
+        self.room.save()
+
+        changes = self.sync(since=python_cursor, topic=self.python.id)
+        self.assertEqual((changes['results'], changes['deleted']), ([], [self.room.id]))
+        changes = self.sync(since=art_cursor, topic=self.art.id)
+        self.assertEqual(([row['id'] for row in changes['results']], changes['deleted']), ([self.room.id], []))
+        # Still there for an unfiltered list, just changed
+        changes = self.sync(since=cursor)
+        self.assertEqual(([row['id'] for row in changes['results']], changes['deleted']), ([self.room.id], []))
+
+    def test_late_commit_is_picked_up_within_the_lag(self):
+        # A row stamped just before the sync read, by a transaction that committed after it
+        def late_commit():
+            Room.objects.filter(pk=self.room.pk).update(name='Late', updated=timezone.now() - timedelta(seconds=2))
+
+        cursor = self.sync()['cursor']
+        late_commit()
+        self.assertEqual(self.sync(since=cursor)['results'], [])
+
+        with self.settings(SYNC_CURSOR_LAG=5):
+            cursor = self.sync()['cursor']
+            late_commit()
+            self.assertEqual([row['name'] for row in self.sync(since=cursor)['results']], ['Late'])
+
+    def test_expired_or_invalid_cursor(self):
+        expired = sync_cursor(timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS + 1))
+        self.assertTrue(self.sync(since=expired)['reset'])
+        self.assertEqual(self.client.get('/api/rooms/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_deleted_topic_is_tombstoned(self):
+        cursor = self.sync('/api/topics/')['cursor']
+        topic_id = self.art.id
+        self.art.delete()
+        changes = self.sync('/api/topics/', since=cursor)
+        self.assertEqual((changes['results'], changes['deleted']), ([], [topic_id]))
+
+
+class IndexUsageTests(TestCase):
+    """
+    The tables are tiny in tests, so sequential scans and sorts are switched
+    off for each EXPLAIN. The plan then has to come from an index that
+    matches both the filter and the ordering.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        cls.topic = Topic.objects.create(name='Python')
+        cls.room = Room.objects.create(creator=cls.user, topic=cls.topic, name='Study')
+        Message.objects.create(room=cls.room, author=cls.user, content='hello')
+        Activity.objects.create(user=cls.user, type='JOIN_ROOM', description='Joined room: Study')
+
+    def explain(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+        return queryset.explain()
+
+    def test_message_history_uses_room_created_index(self):
+        plan = self.explain(Message.objects.filter(room=self.room).order_by('-created_at', '-id')[:50])
+        self.assertIn('message_room_created_idx', plan)
+
+    def test_recent_activities_use_user_index(self):
+        plan = self.explain(
+            Activity.objects.filter(user=self.user).order_by('-timestamp')
+            .values('type', 'description', 'timestamp')[:5]
+        )
+        self.assertIn('activity_user_type_idx', plan)
+
+    def test_room_list_uses_recent_index(self):
+        plan = self.explain(Room.objects.with_participant_ids().values(*ROOM_VALUES)[:20])
+        self.assertIn('room_recent_idx', plan)
+
+    def test_room_list_by_topic_uses_topic_recent_index(self):
+        plan = self.explain(Room.objects.with_participant_ids().filter(topic=self.topic).values(*ROOM_VALUES)[:20])
+        self.assertIn('room_topic_recent_idx', plan)
+
+    def test_topic_lookup_by_name_uses_name_index(self):
+        plan = self.explain(Topic.objects.filter(name='Python'))
+        self.assertIn('topic_name_idx', plan)
+
+    def test_search_uses_gin_indexes(self):
+        query = SearchQuery('hello', config='english')
+        self.assertIn('room_search_idx', self.explain(Room.objects.filter(search_vector=query).order_by()))
+        self.assertIn('topic_search_idx', self.explain(Topic.objects.filter(search_vector=query)))
+        self.assertIn('message_search_idx', self.explain(Message.objects.filter(search_vector=query)))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        cls.topic = Topic.objects.create(name='Programming')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def room(self, name, description=''):
+        return Room.objects.create(creator=self.user, topic=self.topic, name=name, description=description)
+
+    def search(self, q, **params):
+        return self.client.get('/api/search/', {'q': q, **params})
+
+    def names(self, q, **params):
+        response = self.search(q, **params)
+        self.assertEqual(response.status_code, 200)
+        return [room['name'] for room in response.json()['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.room('Weekend hiking', 'We talk about python on the trail')
+        self.room('Python study group', 'Weekly sessions')
+        self.room('Cooking', 'Recipes')
+        self.assertEqual(self.names('python'), ['Python study group', 'Weekend hiking'])
+        # Stemmed: "studying" finds "study"
+        self.assertEqual(self.names('studying'), ['Python study group'])
+
+    def test_websearch_syntax(self):
+        self.room('Machine learning', 'Models and data')
+        self.room('Learning the machine shop', 'Lathes')
+        self.room('Rust systems', 'Learning rust')
+        self.assertEqual(self.names('"machine learning"'), ['Machine learning'])
+        self.assertEqual(sorted(self.names('learning -rust')), ['Learning the machine shop', 'Machine learning'])
+        self.assertEqual(sorted(self.names('lathes or rust')), ['Learning the machine shop', 'Rust systems'])
+        # Unbalanced quotes and stray operators aren't errors
+        self.assertEqual(self.search('"machine -').status_code, 200)
+
+    def test_pages(self):
+        for i in range(5):
+            self.room(f'Python {i}')
+        first = self.search('python', page_size=2).json()
+        self.assertEqual((first['page'], first['next_page'], len(first['results'])), (1, 2, 2))
+        last = self.search('python', page_size=2, page=3).json()
+        self.assertEqual((last['next_page'], len(last['results'])), (None, 1))
+        # Ties on rank keep a stable newest-first order, so pages don't overlap
+        pages = [name for page in (1, 2, 3) for name in self.names('python', page_size=2, page=page)]
+        self.assertEqual(pages, [f'Python {i}' for i in range(4, -1, -1)])
+
+    def test_page_bounds(self):
+        room = self.room('Python')
+        Message.objects.bulk_create([Message(room=room, author=self.user, content=f'python tip {i}') for i in range(60)])
+        response = self.search('python', type='messages', page_size=500).json()
+        self.assertEqual((len(response['results']), response['next_page']), (50, 2))
+        self.assertEqual(len(self.search('python', type='messages', page_size=0).json()['results']), 1)
+        self.assertEqual(self.search('python', type='messages', page=0).json()['page'], 1)
+        self.assertEqual(self.search('python', type='messages', page=99).json()['results'], [])
+        self.assertEqual(self.search('python', page='two').status_code, 400)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.search('  ').status_code, 400)
+        self.assertEqual(self.search('python', type='users').status_code, 400)
+
+
+class SerializationTests(TestCase):
+    """The list views' plain-dict rows and orjson renderer give the serializers' exact bytes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        cls.topic = Topic.objects.create(name='Python \u2029 é')
+        Topic.objects.create(name='Empty')
+        room = Room.objects.create(creator=cls.user, topic=cls.topic, name='Study "group"', description='<script>\n</script>')
+        room.participants.add(cls.user)
+        Room.objects.create(creator=None, topic=cls.topic, name='No description')
+        Message.objects.create(room=room, author=cls.user, content='hello \U0001f600 \\ \x1f \u2028')
+
+    def assertSameBytes(self, serializer_class, queryset, build_rows, fields):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        self.assertEqual(ORJSONRenderer().render(build_rows(queryset.values(*fields))), expected)
+
+    def test_rows_render_like_the_serializers(self):
+        self.assertSameBytes(RoomSerializer, Room.objects.with_participant_ids(), room_rows, ROOM_VALUES)
+        self.assertSameBytes(TopicSerializer, Topic.objects.order_by('id'), topic_rows, TOPIC_VALUES)
+        self.assertSameBytes(MessageSerializer, Message.objects.all(), message_rows, MESSAGE_VALUES)
+
+    def test_renderer_falls_back_for_indented_json(self):
+        data = topic_rows(Topic.objects.order_by('id').values(*TOPIC_VALUES))
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='secret-pass-123')
+            for i in range(4)
+        ]
+        python, art = Topic.objects.create(name='Python'), Topic.objects.create(name='Art')
+        cls.rooms = [
+            Room.objects.create(creator=cls.users[0], topic=topic, name=f'Room {i}')
+            for i, topic in enumerate([python, python, art, art])
+        ]
+        cls.rooms[0].participants.add(*cls.users[:3])
+        cls.rooms[1].participants.add(*cls.users[1:3])
+        cls.rooms[2].participants.add(cls.users[2])
+
+    def neighbours(self):
+        return {
+            (row.room_id, row.similar_room_id): round(row.score, 6)
+            for row in RoomSimilarity.objects.all()
+        }
+
+    def test_incremental_update_matches_full_build(self):
+        build_similarity()
+        self.rooms[3].participants.add(self.users[1], self.users[3])
+        self.rooms[0].participants.remove(self.users[2])
+        for room in self.rooms:
+            update_room(room.id)
+        updated = self.neighbours()
+
+        build_similarity()
+        self.assertEqual(updated, self.neighbours())
+        # Same topic, no one in common
+        self.assertEqual(updated[(self.rooms[2].id, self.rooms[3].id)], 0.2)
+
+    @override_settings(ROOM_SIMILARITY_TOPIC_CANDIDATES=3)
+    def test_room_among_its_topic_candidates(self):
+        python = self.rooms[0].topic
+        for i in range(4):
+            room = Room.objects.create(creator=self.users[0], topic=python, name=f'Extra {i}')
+            room.participants.add(self.users[3])
+        # Rooms 0 and 1 and one of the extras are the topic's candidates
+        room = self.rooms[1]
+
+        def own_list():
+            return [
+                (row.similar_room_id, round(row.score, 6))
+                for row in RoomSimilarity.objects.filter(room=room).order_by('-score', 'similar_room_id')
+            ]
+
+        build_similarity()
+        built = own_list()
+        update_room(room.id)
+        self.assertEqual(own_list(), built)
+
+        room.participants.add(self.users[0])
+        update_room(room.id)
+        updated = own_list()
+        build_similarity()
+        self.assertEqual(updated, own_list())
+
+    def test_rebuild_leaves_unchanged_rows_alone(self):
+        build_similarity()
+        ids = set(RoomSimilarity.objects.values_list('id', flat=True))
+        build_similarity()
+        self.assertEqual(set(RoomSimilarity.objects.values_list('id', flat=True)), ids)
+
+    def test_recommendations_leave_out_joined_rooms(self):
+        build_similarity()
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.get('/api/rooms/recommended/')
+        self.assertEqual([room['name'] for room in response.json()], ['Room 1', 'Room 2'])
+
+        client.force_authenticate(self.users[3])
+        self.assertEqual(client.get('/api/rooms/recommended/').json(), [])
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=True, ACTIVITY_LOG_BUFFER_SIZE=100, ACTIVITY_LOG_FLUSH_INTERVAL=60)
+class ActivityRecorderTests(TransactionTestCase):
+    """The flusher thread has its own connection, so the rows have to be committed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.recorder = ActivityRecorder()
+
+    def record(self, count):
+        for i in range(count):
+            self.recorder.record(self.user, 'JOIN_ROOM', f'Joined room: Room {i}')
+
+    def assertWrittenSoon(self, count):
+        deadline = time.monotonic() + 5
+        while Activity.objects.count() < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(Activity.objects.count(), count)
+
+    @override_settings(ACTIVITY_LOG_BUFFER_SIZE=3)
+    def test_full_buffer_is_flushed_right_away(self):
+        self.record(2)
+        time.sleep(0.2)
+        self.assertEqual(Activity.objects.count(), 0)
+        self.record(1)
+        self.assertWrittenSoon(3)
+
+    @override_settings(ACTIVITY_LOG_FLUSH_INTERVAL=0.2)
+    def test_buffer_is_flushed_on_the_interval(self):
+        self.record(1)
+        self.assertWrittenSoon(1)
+
+    def test_flush_writes_what_is_pending(self):
+        # What atexit runs on shutdown
+        self.record(2)
+        self.assertEqual(Activity.objects.count(), 0)
+        self.recorder.flush()
+        self.assertEqual(list(Activity.objects.values_list('description', flat=True).order_by('id')),
+                         ['Joined room: Room 0', 'Joined room: Room 1'])
+
+    @override_settings(ACTIVITY_LOG_BUFFERED=False)
+    def test_unbuffered_writes_synchronously(self):
+        self.record(1)
+        self.assertEqual(Activity.objects.count(), 1)
+        self.assertEqual(self.recorder._buffer, [])
+
+    @override_settings(ACTIVITY_LOG_MAX_PENDING=3)
+    def test_batch_is_kept_when_the_database_is_unavailable(self):
+        failover = mock.patch.object(Activity.objects, 'bulk_create', side_effect=OperationalError('failover'))
+        self.record(2)
+        with failover, self.assertLogs('backend.activity', 'ERROR'):
+            self.recorder.flush()
+        self.assertEqual(Activity.objects.count(), 0)
+
+        # Back in front of newer ones; past the cap the oldest go
+        self.record(2)
+        with failover, self.assertLogs('backend.activity', 'ERROR') as logs:
+            self.recorder.flush()
+        self.assertIn('dropped the 1 oldest', logs.output[-1])
+        self.recorder.flush()
+        self.assertEqual(list(Activity.objects.values_list('description', flat=True).order_by('id')),
+                         ['Joined room: Room 1', 'Joined room: Room 0', 'Joined room: Room 1'])
+
+    def test_bad_rows_are_dropped_alone(self):
+        self.record(1)
+        self.recorder._buffer.append(Activity(user_id=None, type='JOIN_ROOM', description='No user'))
+        with self.assertLogs('backend.activity', 'WARNING'):
+            self.recorder.flush()
+        self.assertEqual(Activity.objects.count(), 1)
+        self.assertEqual(self.recorder._buffer, [])
+
+    @override_settings(ACTIVITY_LOG_BUFFERED=False)
+    def test_deleting_the_account_logs_nothing(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.delete('/api/users/me/').status_code, 204)
+        self.assertFalse(Activity.objects.exists())
+
+
+class MessagePaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.room = Room.objects.create(creator=self.user, topic=Topic.objects.create(name='Python'), name='Study')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/rooms/{self.room.id}/messages/'
+
+    def add_messages(self, *offsets):
+        # Seconds before now; equal offsets tie on created_at
+        now = timezone.now()
+        ids = []
+        for offset in offsets:
+            message = Message.objects.create(room=self.room, author=self.user, content=f'message {len(ids)}')
+            Message.objects.filter(pk=message.pk).update(created_at=now - timedelta(seconds=offset))
+            ids.append(message.pk)
+        return ids
+
+    def walk_back(self, limit):
+        pages = []
+        params = {'limit': limit}
+        while True:
+            body = self.client.get(self.url, params).json()
+            pages.append([row['id'] for row in body['results']])
+            if body['previous'] is None:
+                return pages
+            params = {'limit': limit, 'before': body['previous']}
+
+    def test_before_walks_back_through_ties(self):
+        ids = self.add_messages(50, 40, 40, 40, 30, 20, 20)
+        pages = self.walk_back(limit=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([pk for page in reversed(pages) for pk in page], ids)
+
+    def test_after_returns_only_newer_messages(self):
+        ids = self.add_messages(30, 20, 20)
+        body = self.client.get(self.url).json()
+        self.assertEqual([row['id'] for row in body['results']], ids)
+        self.assertIsNone(body['previous'])
+
+        response = self.client.get(self.url, {'after': body['next']})
+        self.assertEqual(response.json()['results'], [])
+        self.assertEqual(response.json()['next'], body['next'])
+
+        [newer] = self.add_messages(20)
+        response = self.client.get(self.url, {'after': body['next']})
+        self.assertEqual([row['id'] for row in response.json()['results']], [newer])
+        self.assertNotEqual(response.json()['next'], body['next'])
+
+    def test_page_size_is_capped(self):
+        Message.objects.bulk_create(
+            [Message(room=self.room, author=self.user, content=f'message {i}') for i in range(205)]
+        )
+        self.assertEqual(len(self.client.get(self.url, {'limit': 1000}).json()['results']), 200)
+        self.assertEqual(len(self.client.get(self.url, {'limit': 0}).json()['results']), 1)
+        self.assertEqual(len(self.client.get(self.url, {'limit': 'lots'}).json()['results']), 50)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.add_messages(10)
+        tampered = [
+            'not a cursor',
+            base64.urlsafe_b64encode(b'yesterday|1').decode(),
+            base64.urlsafe_b64encode(b'2026-01-01T00:00:00+00:00|one').decode(),
+            base64.urlsafe_b64encode(b'2026-01-01T00:00:00+00:00').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe|1').decode(),
+        ]
+        for cursor in tampered:
+            for param in ('before', 'after'):
+                response = self.client.get(self.url, {param: cursor})
+                self.assertEqual(response.status_code, 400, (param, cursor))
+                self.assertEqual(response.json(), {'detail': 'Invalid cursor.'})
+
+        cursor = self.client.get(self.url).json()['next']
+        self.assertEqual(self.client.get(self.url, {'before': cursor, 'after': cursor}).status_code, 400)
+
+
+class PruneActivitiesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.other = User.objects.create_user(username='sami', email='sami@example.com', password='secret-pass-123')
+
+    def add_activities(self, user, *days_ago):
+        now = timezone.now()
+        return [
+            Activity.objects.create(user=user, type='JOIN_ROOM', description='Joined room: Study', timestamp=now - timedelta(days=days)).id
+            for days in days_ago
+        ]
+
+    def prune(self, *args):
+        output = io.StringIO()
+        call_command('prune_activities', '--batch-size', '1', *args, stdout=output)
+        return output.getvalue()
+
+    def remaining(self, user):
+        return set(Activity.objects.filter(user=user).values_list('id', flat=True))
+
+    def test_age_cutoff(self):
+        recent = self.add_activities(self.user, 100, 91, 89, 0)[2:]
+        output = self.prune('--days', '90', '--per-user', '0')
+        self.assertEqual(self.remaining(self.user), set(recent))
+        self.assertIn('Older than 90 days: deleted 2 rows in 2 batches', output)
+        self.assertIn('Deleted 2 activities in', output)
+
+    def test_per_user_cap_keeps_newest(self):
+        ids = self.add_activities(self.user, 5, 1, 4, 2, 3)
+        others = self.add_activities(self.other, 9, 8)
+        output = self.prune('--days', '0', '--per-user', '3')
+        self.assertEqual(self.remaining(self.user), {ids[1], ids[3], ids[4]})
+        self.assertEqual(self.remaining(self.other), set(others))
+        self.assertIn('Over 3 per user: deleted 2 rows in 2 batches', output)
+
+    def test_interrupted_run_resumes_and_rerun_deletes_nothing(self):
+        self.add_activities(self.user, 100, 95, 91, 3, 2, 1, 0)
+        delete_batch = PruneActivitiesCommand.delete_batch
+        calls = []
+
+        def interrupt_second_batch(command, ids):
+            calls.append(ids)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return delete_batch(command, ids)
+
+        with mock.patch.object(PruneActivitiesCommand, 'delete_batch', autospec=True, side_effect=interrupt_second_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                self.prune('--days', '90', '--per-user', '2')
+        self.assertEqual(Activity.objects.count(), 6)
+
+        self.assertIn('Deleted 4 activities in', self.prune('--days', '90', '--per-user', '2'))
+        self.assertEqual(Activity.objects.count(), 2)
+        self.assertIn('Deleted 0 activities in', self.prune('--days', '90', '--per-user', '2'))
+        self.assertEqual(Activity.objects.count(), 2)
+
+
+def read_stream(response):
+    if not response.is_async:
+        return b''.join(response.streaming_content)
+
+    async def read():
+        return b''.join([part async for part in response.streaming_content])
+    return async_to_sync(read)()
+
+
+def parse_ndjson(body):
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+@override_settings(MESSAGE_EXPORT_CHUNK_SIZE=2)
+class MessageExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        cls.room = Room.objects.create(creator=cls.user, topic=Topic.objects.create(name='Python'), name='Study')
+        cls.messages = [
+            Message.objects.create(room=cls.room, author=cls.user, content=content)
+            for content in ('first', 'second, with a comma', 'third "quoted"', 'fourth\non two lines', 'fifth')
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/rooms/{self.room.id}/messages/export/'
+
+    def expected_rows(self):
+        return MessageSerializer(self.messages, many=True).data
+
+    def test_ndjson(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="room-{self.room.id}-messages.ndjson"')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(parse_ndjson(read_stream(response)), self.expected_rows())
+
+    def test_csv(self):
+        response = self.client.get(self.url, {'as': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(read_stream(response).decode())))
+        self.assertEqual(
+            rows,
+            [{field: str(row[field]) for field in ('id', 'author', 'content', 'created_at')} for row in self.expected_rows()],
+        )
+
+    def test_gzip_round_trip(self):
+        for file_format in ('ndjson', 'csv'):
+            plain = read_stream(self.client.get(self.url, {'as': file_format}))
+            response = self.client.get(self.url, {'as': file_format}, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(read_stream(response)), plain)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_only_creator_and_staff_can_export(self):
+        other = User.objects.create_user(username='sami', email='sami@example.com', password='secret-pass-123')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        other.is_staff = True
+        other.save()
+        self.assertEqual(len(parse_ndjson(read_stream(self.client.get(self.url)))), len(self.messages))
+
+    def test_bad_format_and_missing_room(self):
+        self.assertEqual(self.client.get(self.url, {'as': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/rooms/{self.room.id + 1000}/messages/export/').status_code, 404)
+
+
+def count_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {table}')
+        return cursor.fetchone()[0]
+
+
+class MessagePartitionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.room = Room.objects.create(creator=self.user, topic=Topic.objects.create(name='Python'), name='Study')
+
+    def test_month_without_partition_goes_to_default_until_created(self):
+        # Past the months created ahead, as if cron had stopped
+        month = add_months(month_start(timezone.now()), 24)
+        message = Message.objects.create(room=self.room, author=self.user, content='from the future')
+        Message.objects.filter(pk=message.pk).update(created_at=month + timedelta(days=3))
+        self.assertEqual(count_rows('backend_message_default'), 1)
+
+        created = ensure_partitions(timezone.now(), timezone.now())
+        self.assertIn(partition_name(month), created)
+        self.assertEqual(count_rows('backend_message_default'), 0)
+        self.assertEqual(count_rows(partition_name(month)), 1)
+        self.assertTrue(Message.objects.filter(pk=message.pk).exists())
+
+
+class MessageArchiveTests(TransactionTestCase):
+    """archive_partition() commits the archive before detaching, so no test transaction."""
+
+    def test_archived_month_is_read_from_the_archive_right_away(self):
+        user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        room = Room.objects.create(creator=user, topic=Topic.objects.create(name='Python'), name='Study')
+        month = add_months(month_start(timezone.now()), -14)
+        ensure_partitions(month, month)
+        message = Message.objects.create(room=room, author=user, content='old news')
+        Message.objects.filter(pk=message.pk).update(created_at=month + timedelta(days=3))
+
+        history = ArchivedHistory(room.id)
+        self.assertFalse(history.covers(month + timedelta(days=3)))
+        self.assertEqual(archive_partition(month), 1)
+        self.assertTrue(history.covers(month + timedelta(days=3)))
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(f'/api/rooms/{room.id}/messages/')
+        self.assertEqual([row['content'] for row in response.json()['results']], ['old news'])
+
+    def test_pages_cross_the_archive_boundary(self):
+        user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        room = Room.objects.create(creator=user, topic=Topic.objects.create(name='Python'), name='Study')
+        month = add_months(month_start(timezone.now()), -14)
+        ensure_partitions(month, month)
+        ids = []
+        for day in (3, 5, 5, 9):
+            message = Message.objects.create(room=room, author=user, content=f'archived {day}')
+            Message.objects.filter(pk=message.pk).update(created_at=month + timedelta(days=day))
+            ids.append(message.pk)
+        archive_partition(month)
+        ids += [Message.objects.create(room=room, author=user, content=f'live {i}').pk for i in range(3)]
+
+        client = APIClient()
+        client.force_authenticate(user)
+        url = f'/api/rooms/{room.id}/messages/'
+        pages = []
+        params = {'limit': 2}
+        while True:
+            body = client.get(url, params).json()
+            pages.append([row['id'] for row in body['results']])
+            if body['previous'] is None:
+                break
+            params = {'limit': 2, 'before': body['previous']}
+        self.assertEqual([pk for page in reversed(pages) for pk in page], ids)
+
+        # A client that last saw an archived message catches up through the live ones
+        self.assertEqual(pages[-1], ids[:1])
+        cursor = body['next']
+        seen = []
+        while True:
+            body = client.get(url, {'limit': 2, 'after': cursor}).json()
+            if not body['results']:
+                break
+            seen += [row['id'] for row in body['results']]
+            cursor = body['next']
+        self.assertEqual(seen, ids[1:])
+
+    def test_busy_partition_is_deferred_to_the_next_run(self):
+        user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        room = Room.objects.create(creator=user, topic=Topic.objects.create(name='Python'), name='Study')
+        month = add_months(month_start(timezone.now()), -14)
+        ensure_partitions(month, month)
+        message = Message.objects.create(room=room, author=user, content='old news')
+        Message.objects.filter(pk=message.pk).update(created_at=month + timedelta(days=3))
+
+        # A long query elsewhere holds the message table
+        reader = connection.copy()
+        reader.set_autocommit(False)
+        reader.cursor().execute('SELECT 1 FROM backend_message LIMIT 1')
+        output = io.StringIO()
+        try:
+            with mock.patch('backend.partitions.DETACH_LOCK_TIMEOUT', '100ms'):
+                call_command('message_partitions', '--archive', '--keep-months', '14', stdout=output)
+        finally:
+            reader.rollback()
+            reader.close()
+
+        self.assertIn(f'Deferred {month:%Y-%m}: partition busy', output.getvalue())
+        self.assertEqual(count_rows(partition_name(month)), 1)
+        self.assertFalse(MessageArchive.objects.filter(month=month.date()).exists())
+        self.assertFalse(ArchivedHistory(room.id).covers(month + timedelta(days=3)))
+
+        output = io.StringIO()
+        call_command('message_partitions', '--archive', '--keep-months', '14', stdout=output)
+        self.assertIn(f'Archived {month:%Y-%m}: 1 messages', output.getvalue())
+        self.assertTrue(ArchivedHistory(room.id).covers(month + timedelta(days=3)))
+
+    @override_settings(MESSAGE_EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_archived_months_first(self):
+        user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        room = Room.objects.create(creator=user, topic=Topic.objects.create(name='Python'), name='Study')
+        months = [add_months(month_start(timezone.now()), -15), add_months(month_start(timezone.now()), -14)]
+        ensure_partitions(months[0], months[1])
+        ids = []
+        for month in months:
+            for day in (3, 9):
+                message = Message.objects.create(room=room, author=user, content=f'archived {day}')
+                Message.objects.filter(pk=message.pk).update(created_at=month + timedelta(days=day))
+                ids.append(message.pk)
+            archive_partition(month)
+        ids += [Message.objects.create(room=room, author=user, content=f'live {i}').pk for i in range(3)]
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(f'/api/rooms/{room.id}/messages/export/', HTTP_ACCEPT_ENCODING='gzip')
+        rows = parse_ndjson(gzip.decompress(read_stream(response)))
+        self.assertEqual([row['id'] for row in rows], ids)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Adds a 'replica' alias that mirrors the test database, so the data is
+    the same and only the queries each connection ran tell them apart. It
+    only exists once the class is set up, hence '__all__' below.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings['replica'] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        overridden = override_settings(REPLICA_DATABASES=['replica'], REPLICA_PIN_SECONDS=0.5)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.room = Room.objects.create(creator=self.user, topic=Topic.objects.create(name='Python'), name='Study')
+        # The middleware reads the user from the token, so no force_authenticate
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def queries_by_alias(self, method, url, data=None):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400)
+        return len(primary.captured_queries), len(replica.captured_queries)
+
+    def test_listed_views_read_from_the_replica(self):
+        primary, replica = self.queries_by_alias('get', f'/api/rooms/{self.room.id}/messages/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        # Not a listed view
+        self.assertEqual(self.queries_by_alias('get', '/api/users/me/')[1], 0)
+        # Syncs read the primary so a lagging replica can't make them skip rows
+        self.assertEqual(self.queries_by_alias('get', '/api/rooms/', {'since': '0'})[1], 0)
+
+    def test_reads_stay_on_the_primary_after_a_write_until_the_pin_expires(self):
+        url = f'/api/rooms/{self.room.id}/messages/'
+        primary, replica = self.queries_by_alias('post', url, {'content': 'hello'})
+        self.assertEqual(replica, 0)
+
+        primary, replica = self.queries_by_alias('get', url)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        time.sleep(0.6)
+        self.assertGreater(self.queries_by_alias('get', url)[1], 0)
+
+    def test_pin_reaches_other_workers(self):
+        # The write and the read are handled by different worker processes
+        url = f'/api/rooms/{self.room.id}/messages/'
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        with mock.patch('backend.middleware.cache', FileBasedCache(location, {})):
+            self.queries_by_alias('post', url, {'content': 'hello'})
+        with mock.patch('backend.middleware.cache', FileBasedCache(location, {})):
+            self.assertEqual(self.queries_by_alias('get', url)[1], 0)
+
+    def test_failed_write_does_not_pin(self):
+        url = f'/api/rooms/{self.room.id}/messages/'
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 400)
+        self.assertGreater(self.queries_by_alias('get', url)[1], 0)
+
+
+class RoomSocketTests(TransactionTestCase):
+    """The consumer reads the database from another thread, so the data has to be committed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.room = Room.objects.create(creator=self.user, topic=Topic.objects.create(name='Python'), name='Study')
+        self.application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def communicator(self, room_id, token=None):
+        path = f'/ws/rooms/{room_id}/'
+        if token is not None:
+            path += f'?token={token}'
+        return WebsocketCommunicator(self.application, path)
+
+    async def test_socket_needs_a_valid_token_and_room(self):
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        for communicator, code in (
+            (self.communicator(self.room.id), 4401),
+            (self.communicator(self.room.id, 'not-a-token'), 4401),
+            (self.communicator(self.room.id + 1000, token), 4404),
+        ):
+            self.assertEqual(await communicator.connect(), (False, code))
+
+    async def test_posted_message_is_broadcast_to_the_room(self):
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        communicator = self.communicator(self.room.id, token)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'presence', 'online': 1})
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = await sync_to_async(client.post)(
+            f'/api/rooms/{self.room.id}/messages/', {'content': 'hello'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'message', 'message': response.json()})
+        await communicator.disconnect()
+
+    def test_channel_layer_outage_does_not_fail_the_post(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(InMemoryChannelLayer, 'group_send', side_effect=ConnectionError('layer down')):
+            with self.assertLogs('backend.consumers', 'ERROR'):
+                response = client.post(f'/api/rooms/{self.room.id}/messages/', {'content': 'hello'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Message.objects.filter(room=self.room, content='hello').exists())
+
+
+class PresenceTrackerTests(SimpleTestCase):
+    """
+    Reads this process's rooms only: the trackers' snapshot threads keep
+    writing to the cache, so other tests' trackers would show up there.
+    """
+
+    def setUp(self):
+        self.tracker = PresenceTracker()
+
+    def test_reads_expire_only_the_rooms_asked_for(self):
+        with override_settings(PRESENCE_TTL=-1):
+            self.tracker.heartbeat(1, 10)
+            self.tracker.heartbeat(2, 20)
+        self.tracker.heartbeat(1, 11)
+
+        self.assertEqual(self.tracker.local_rooms([1, 3]), {1: {11}})
+        self.assertIn(20, self.tracker._rooms[2])
+        self.assertEqual(self.tracker.local_rooms(), {1: {11}})
+
+    def test_user_stays_online_until_their_last_socket_closes(self):
+        self.tracker.socket_opened(1, 10)
+        self.tracker.socket_opened(1, 10)
+        self.tracker.socket_closed(1, 10)
+        self.assertEqual(self.tracker.local_rooms([1]), {1: {10}})
+
+        self.tracker.socket_closed(1, 10)
+        self.assertEqual(self.tracker.local_rooms([1]), {})
+        self.assertEqual(self.tracker._sockets, {})
+
+    def test_workers_see_each_others_rooms(self):
+        # Separate cache instances, as each worker process has its own
+        location = self.enterContext(tempfile.TemporaryDirectory())
+        worker, other_worker = FileBasedCache(location, {}), FileBasedCache(location, {})
+        other = PresenceTracker()
+        # A room no other test's tracker has been in
+        room_id = 90001
+        with mock.patch('backend.presence.caches', {'presence': worker}):
+            self.tracker.heartbeat(room_id, 10)
+            self.tracker.snapshot()
+        with mock.patch('backend.presence.caches', {'presence': other_worker}):
+            other.heartbeat(room_id, 11)
+            self.assertEqual(other.online_users([room_id]), {room_id: {10, 11}})
+            self.assertEqual(other.online_counts([room_id, room_id + 1]), {room_id: 2, room_id + 1: 0})
+
+    def test_shared_cache_settings(self):
+        self.assertIn('filebased', load_settings(PRESENCE_CACHE_BACKEND=None)['CACHES']['presence']['BACKEND'])
+        self.assertIn('db', load_settings(PRESENCE_CACHE_BACKEND='db')['CACHES']['presence']['BACKEND'])
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+@override_settings(THROTTLING=True)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.room = Room.objects.create(creator=self.user, topic=Topic.objects.create(name='Python'), name='Study')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_message(self):
+        return self.client.post(f'/api/rooms/{self.room.id}/messages/', {'content': 'hi'})
+
+    def login(self, email, address):
+        return self.client.post('/api/login/', {'email': email, 'password': 'wrong'}, REMOTE_ADDR=address)
+
+    @throttle_rates(**{'message-user': '2/min'})
+    def test_over_the_limit_gets_429_with_retry_after(self):
+        self.assertEqual([self.post_message().status_code for _ in range(2)], [201, 201])
+        response = self.post_message()
+        self.assertEqual(response.status_code, 429)
+        # One token every 30 seconds
+        self.assertEqual(response['Retry-After'], '30')
+        # Reading isn't limited
+        self.assertEqual(self.client.get(f'/api/rooms/{self.room.id}/messages/').status_code, 200)
+
+    @throttle_rates(**{'message-user': '2/min'})
+    def test_bucket_refills_over_time(self):
+        now = time.time()
+        with mock.patch('backend.throttling.time') as clock:
+            clock.time.return_value = now
+            self.post_message()
+            self.post_message()
+            self.assertEqual(self.post_message().status_code, 429)
+
+            clock.time.return_value = now + 31
+            self.assertEqual(self.post_message().status_code, 201)
+            self.assertEqual(self.post_message().status_code, 429)
+
+    @throttle_rates(**{'login-ip': '3/min', 'login-account': '2/min'})
+    def test_login_is_limited_per_address_and_per_account(self):
+        self.login('lama@example.com', '10.0.0.1')
+        self.login('lama@example.com', '10.0.0.1')
+        # Same account from elsewhere: the account's bucket is empty
+        self.assertEqual(self.login(' LAMA@example.com', '10.0.0.2').status_code, 429)
+
+        # Another account from the first address: one left in the address's bucket
+        self.assertNotEqual(self.login('other@example.com', '10.0.0.1').status_code, 429)
+        self.assertEqual(self.login('third@example.com', '10.0.0.1').status_code, 429)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # A fresh registry, so earlier tests' requests don't show up
+        self.registry = MetricsRegistry()
+        self.enterContext(mock.patch('backend.middleware.registry', self.registry))
+        self.enterContext(mock.patch('backend.views.metrics_registry', self.registry))
+        self.user = User.objects.create_user(username='lama', email='lama@example.com', password='secret-pass-123')
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='secret-pass-123', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scrape(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def samples(self, text):
+        samples = {}
+        for line in text.splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_are_recorded_per_url_name(self):
+        Topic.objects.create(name='Python')
+        self.assertEqual(self.client.get('/api/topics/').status_code, 200)
+        self.assertEqual(self.client.get('/api/rooms/999999/').status_code, 404)
+
+        samples = self.samples(self.scrape().content.decode())
+        labels = 'view="topic-list",method="GET"'
+        self.assertEqual(samples['meetmind_http_requests_total{view="topic-list",method="GET",status="200"}'], 1)
+        self.assertEqual(samples['meetmind_http_requests_total{view="room-detail",method="GET",status="404"}'], 1)
+        self.assertEqual(samples[f'meetmind_http_request_duration_seconds_count{{{labels}}}'], 1)
+        self.assertEqual(samples[f'meetmind_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 1)
+        # Counted wherever the view ran its queries, async views' worker thread included
+        self.assertGreater(samples[f'meetmind_db_queries_per_request_sum{{{labels}}}'], 0)
+        self.assertEqual(samples[f'meetmind_db_queries_per_request_bucket{{{labels},le="0"}}'], 0)
+        self.assertEqual(samples[f'meetmind_db_queries_per_request_count{{{labels}}}'], 1)
+        self.assertIn(f'meetmind_db_query_seconds_total{{{labels}}}', samples)
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.registry.observe_request('topic-list', 'GET', 200, 0.003, 0, 0.0)
+        self.registry.observe_request('topic-list', 'GET', 200, 0.2, 4, 0.01)
+        self.registry.observe_request('topic-list', 'GET', 500, 30.0, 60, 0.5)
+
+        samples = self.samples(self.registry.render())
+        labels = 'view="topic-list",method="GET"'
+        latency = [samples[f'meetmind_http_request_duration_seconds_bucket{{{labels},le="{bound}"}}'] for bound in LATENCY_BUCKETS]
+        self.assertEqual(latency, [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2])
+        self.assertEqual(samples[f'meetmind_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], 3)
+        self.assertAlmostEqual(samples[f'meetmind_http_request_duration_seconds_sum{{{labels}}}'], 30.203)
+        self.assertEqual(samples[f'meetmind_db_queries_per_request_bucket{{{labels},le="0"}}'], 1)
+        self.assertEqual(samples[f'meetmind_db_queries_per_request_bucket{{{labels},le="5"}}'], 2)
+        self.assertEqual(samples[f'meetmind_db_queries_per_request_bucket{{{labels},le="50"}}'], 2)
+        self.assertEqual(samples[f'meetmind_db_queries_per_request_sum{{{labels}}}'], 64)
+        self.assertEqual(samples['meetmind_http_requests_total{view="topic-list",method="GET",status="500"}'], 1)
+
+    def test_output_is_prometheus_text_format(self):
+        self.client.get('/api/topics/')
+        response = self.scrape()
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+        text = response.content.decode()
+        self.assertTrue(text.endswith('\n'))
+        self.assertIn('# TYPE meetmind_http_requests_total counter', text)
+        self.assertIn('# TYPE meetmind_http_request_duration_seconds histogram', text)
+        self.assertIn('# TYPE meetmind_db_queries_per_request histogram', text)
+        declared = set()
+        for line in text.splitlines():
+            if line.startswith('# TYPE '):
+                declared.add(line.split()[2])
+            elif not line.startswith('# HELP '):
+                # Every sample follows the TYPE line of its family
+                name = line.split('{')[0].split(' ')[0]
+                family = name.removesuffix('_bucket').removesuffix('_sum').removesuffix('_count')
+                self.assertTrue(name in declared or family in declared, line)
+                float(line.rsplit(' ', 1)[1])
+
+    def test_only_admins_can_scrape(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.assertEqual(APIClient().get('/api/metrics/').status_code, 401)
@@ -0,0 +1,121 @@
+"""
+Token-bucket rate limits for message posting and login.
+
+Each bucket holds up to N tokens and refills at N per period, from the
+DRF-style rates in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] ('30/min' is a
+burst of 30, then one every two seconds). A request takes one token;
+with none left it gets a 429 and a Retry-After for when the next one
+arrives.
+
+Buckets live in the 'throttle' cache, so they need no Redis. It's a file
+cache shared by the workers on a machine by default, or the database with
+THROTTLE_CACHE_BACKEND=db when there are several machines (see settings).
+Updates are serialized within a process but not across processes, so
+concurrent workers may let a request or two past the limit.
+"""
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+
+class TokenBuckets:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        """Take a token from bucket `key`. Returns (allowed, seconds until a token is available)."""
+        cache = caches['throttle']
+        with self._lock:
+            now = time.time()
+            tokens, updated = cache.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens < 1:
+                return False, (1 - tokens) / refill_rate
+            # Once the bucket would have refilled, a missing key means the same thing
+            cache.set(key, (tokens - 1, now), capacity / refill_rate)
+            return True, 0
+
+
+buckets = TokenBuckets()
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 0.5): bucket size and tokens added per second."""
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+class TokenBucketThrottle(ABC, BaseThrottle):
+    """Base class: subclasses set `scope` and say whose bucket a request draws from."""
+    scope = None
+    # Only writes are limited; reads on the same views are not
+    methods = ('POST',)
+
+    @abstractmethod
+    def get_ident_key(self, request):
+        """The bucket's key for this request, or None to let it through unlimited."""
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        if not settings.THROTTLING or request.method not in self.methods:
+            return True
+
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        ident = self.get_ident_key(request)
+        if rate is None or ident is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        allowed, self.retry_after = buckets.take(f'throttle:{self.scope}:{ident}', capacity, refill_rate)
+        registry.increment('meetmind_throttle_checks_total', scope=self.scope, result='allowed' if allowed else 'throttled')
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserThrottle(TokenBucketThrottle):
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_ident_key(self, request):
+        # Honours X-Forwarded-For according to REST_FRAMEWORK['NUM_PROXIES']
+        return self.get_ident(request)
+
+
+class MessageUserThrottle(UserThrottle):
+    scope = 'message-user'
+
+
+class MessageIPThrottle(IPThrottle):
+    scope = 'message-ip'
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login-ip'
+
+
+class LoginAccountThrottle(TokenBucketThrottle):
+    # Per target account, so guessing one password from many addresses is limited too
+    scope = 'login-account'
+
+    def get_ident_key(self, request):
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email:
+            return None
+        return hashlib.md5(email.strip().lower().encode()).hexdigest()
@@ -1,19 +1,31 @@
 from django.urls import path
 from .views import LoginView, SignUpView, CreateRoomView, RoomListView, RoomDetailView, UserProfileView, MessageListView, UserActivityView
-from .views import TopicListView, TopicDetailView
+from .views import TopicListView, TopicDetailView, CacheStatsView, SearchView, MetricsView, DashboardView, HealthView
+from .views import RoomPresenceView, PresenceView, MessageExportView, RoomSimilarView, RecommendedRoomsView
+from .async_views import read_view
 
 urlpatterns = [
     path('api/login/', LoginView.as_view(), name='login'),
     path('api/signup/', SignUpView.as_view(), name='signup'),
     path('api/rooms/create/', CreateRoomView.as_view(), name='create-room'),
-    path('api/rooms/', RoomListView.as_view(), name='list-rooms'),
-    path('api/rooms/<int:pk>/', RoomDetailView.as_view(), name='room-detail'),
-    path('api/rooms/<int:pk>/join/', RoomDetailView.as_view(), {'action': 'join'}, name='join-room'),
-    path('api/rooms/<int:pk>/leave/', RoomDetailView.as_view(), {'action': 'leave'}, name='leave-room'),
+    path('api/rooms/', read_view(RoomListView).as_view(), name='list-rooms'),
+    path('api/rooms/<int:pk>/', read_view(RoomDetailView).as_view(), name='room-detail'),
+    path('api/rooms/<int:pk>/join/', read_view(RoomDetailView).as_view(), {'action': 'join'}, name='join-room'),
+    path('api/rooms/<int:pk>/leave/', read_view(RoomDetailView).as_view(), {'action': 'leave'}, name='leave-room'),
     path('api/users/me/', UserProfileView.as_view(), name='user-profile'),
-    path('api/topics/', TopicListView.as_view(), name='topic-list'),
-    path('api/rooms/<int:room_id>/messages/', MessageListView.as_view(), name='message-list'),
-    path('api/recent-activities/', UserActivityView.as_view(), name='recent-activities'),
-    path('api/topics/<int:pk>/', TopicDetailView.as_view(), name='topic-detail')
+    path('api/topics/', read_view(TopicListView).as_view(), name='topic-list'),
+    path('api/rooms/<int:room_id>/messages/', read_view(MessageListView).as_view(), name='message-list'),
+    path('api/rooms/<int:pk>/messages/export/', read_view(MessageExportView).as_view(), name='message-export'),
+    path('api/recent-activities/', read_view(UserActivityView).as_view(), name='recent-activities'),
+    path('api/topics/<int:pk>/', TopicDetailView.as_view(), name='topic-detail'),
+    path('api/cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('api/search/', SearchView.as_view(), name='search'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('api/health/', HealthView.as_view(), name='health'),
+    path('api/rooms/<int:pk>/presence/', RoomPresenceView.as_view(), name='room-presence'),
+    path('api/presence/', PresenceView.as_view(), name='presence'),
+    path('api/rooms/<int:pk>/similar/', RoomSimilarView.as_view(), name='similar-rooms'),
+    path('api/rooms/recommended/', RecommendedRoomsView.as_view(), name='recommended-rooms')
 ]
 
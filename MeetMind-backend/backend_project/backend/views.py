@@ -1,6 +1,6 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
@@ -20,36 +20,180 @@ from .serializers import TopicSerializer
 User = get_user_model()  # Dynamically get the user model
 
 from .models import Room, Message
-from .serializers import MessageSerializer
+from .serializers import MessageSerializer, MessageSearchSerializer
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from .consumers import broadcast_room_message
+from .export import TranscriptEncoder, accepts_gzip, transcript, transcript_response
+from .pagination import MessageCursorPagination, InvalidCursor
+from .partitions import ArchivedHistory
+from .presence import presence
+from .recommendations import recommended_rooms, similar_rooms
+from .renderers import FAST_RENDERER_CLASSES
+from .rows import MESSAGE_VALUES, ROOM_VALUES, TOPIC_VALUES, message_rows, room_rows, topic_rows
+from .throttling import LoginAccountThrottle, LoginIPThrottle, MessageIPThrottle, MessageUserThrottle
+from .cache import cached_room_list, cached_topic_list
+from . import cache as response_cache
+from .metrics import pool_stats, registry as metrics_registry
+from django.http import HttpResponse
+from django.db import connection, router, transaction
+import time
 
 
 from .models import Activity
+from .activity import record_activity
+from .avatars import avatar_url
+from .sync import room_changes, topic_changes
+from .conditional import content_etag, not_modified, room_list_validators, room_validators, set_validators, topic_list_validators
+from .conditional import ROOM_LIST_VALIDATOR_VALUES, TOPIC_LIST_VALIDATOR_VALUES, room_list_validators_for, topic_list_validators_for
+
+def recent_activities(user):
+    return Activity.objects.filter(user=user).order_by('-timestamp')[:5]  # Limit to 5 recent activities
+
+
+def activity_data(activity):
+    return {
+        "type": activity.type,
+        "description": activity.description,
+        "timestamp": activity.timestamp.strftime('%Y-%m-%d %H:%M')
+    }
+
+
+def recent_activity_data(user):
+    return [activity_data(activity) for activity in recent_activities(user)]
+
+
+def profile_data(user):
+    # The authenticated user comes with the profile attached (CachedJWTAuthentication)
+    return {
+        'avatar': (avatar_url(user.profile) or '') if hasattr(user, 'profile') else '',
+        'username': user.username,
+        'email': user.email,
+        'bio': user.profile.bio if hasattr(user, 'profile') else '',
+        'full_name': user.profile.full_name if hasattr(user, 'profile') else ''
+    }
+
+
+# The room and topic lists, shared by the views here and their async versions
+# (async_views.py), which only differ in how they run the queries.
+
+def room_list_values(topic_id):
+    # The rows plus the fields the list's validators are worked out from
+    rooms = Room.objects.with_participant_ids()
+    if topic_id:
+        rooms = rooms.filter(topic_id=topic_id)
+    return rooms.values(*ROOM_VALUES, *ROOM_LIST_VALIDATOR_VALUES)
+
+
+def room_list_from(values, topic_id):
+    # The list with the validators it's cached and served with
+    return room_list_validators_for(values, topic_id), room_rows(values)
+
+
+def topic_list_values():
+    return Topic.objects.values(*TOPIC_VALUES, *TOPIC_LIST_VALIDATOR_VALUES)
+
+
+def topic_list_from(values):
+    return topic_list_validators_for(values), topic_rows(values)
+
+
+def topic_list_entry():
+    return topic_list_from(list(topic_list_values()))
+
+
+def cached_list_response(entry, hit):
+    """The response for a (validators, data) list entry from the response cache."""
+    (etag, last_modified), data = entry
+    response = Response(data, status=status.HTTP_200_OK, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+    return set_validators(response, etag, last_modified)
+
+
+def message_page_response(page, previous_cursor, next_cursor):
+    return Response({
+        'results': message_rows(page),
+        'previous': previous_cursor,
+        'next': next_cursor
+    }, status=status.HTTP_200_OK)
+
+
+def room_detail_queryset():
+    return Room.objects.select_related('topic').defer('search_vector', 'topic__search_vector')
+
+
+def room_detail_data(room, participants):
+    return {
+        'id': room.id,
+        'name': room.name,
+        'description': room.description,
+        'topic': room.topic.name if room.topic else None,
+        'creator': room.creator_id,
+        'participants': participants
+    }
+
+
+def changes_response(changes, *args):
+    # A delta sync page (backend/sync.py), or 400 for a cursor that doesn't parse
+    try:
+        return Response(changes(*args), status=status.HTTP_200_OK)
+    except InvalidCursor:
+        return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
 
 class UserActivityView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Get recent activities for the authenticated user
-        activities = Activity.objects.filter(user=request.user).order_by('-timestamp')[:5]  # Limit to 5 recent activities
-        activity_data = [
-            {
-                "type": activity.type,
-                "description": activity.description,
-                "timestamp": activity.timestamp.strftime('%Y-%m-%d %H:%M')
-            }
-            for activity in activities
-        ]
-        return Response(activity_data)
+        return Response(recent_activity_data(request.user))
+
+
+class DashboardView(APIView):
+    """
+    Everything the home page needs in one request: profile, the most
+    recently updated rooms, topics with room counts and recent activity.
+    At most one query per section, whatever the data size.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
+    room_limit = 20
+
+    def get(self, request):
+        try:
+            rooms = room_rows(Room.objects.with_participant_ids().values(*ROOM_VALUES)[:self.room_limit + 1])
+            (_, topics), hit = cached_topic_list(topic_list_entry)
+
+            return Response({
+                'profile': profile_data(request.user),
+                'rooms': rooms[:self.room_limit],
+                'more_rooms': len(rooms) > self.room_limit,
+                'topics': topics,
+                'activities': recent_activity_data(request.user)
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            import traceback
+            print(f"Error in DashboardView: {str(e)}")
+            print(traceback.format_exc())
+            return Response({"error": "Failed to load dashboard. Please try again later."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class MessageListView(APIView):
     permission_classes = [IsAuthenticated]
+    # Limits posting only; reading the history isn't throttled
+    throttle_classes = [MessageUserThrottle, MessageIPThrottle]
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get(self, request, room_id):
         room = Room.objects.get(id=room_id)
-        messages = Message.objects.filter(room=room)
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        messages = Message.objects.filter(room=room).values(*MESSAGE_VALUES)
+
+        try:
+            page, previous_cursor, next_cursor = MessageCursorPagination().paginate(
+                messages, request.query_params, archive=ArchivedHistory(room.id)
+            )
+        except InvalidCursor:
+            return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return message_page_response(page, previous_cursor, next_cursor)
 
     def post(self, request, room_id):
         room = Room.objects.get(id=room_id)
@@ -65,27 +209,123 @@ class MessageListView(APIView):
         )
 
         serializer = MessageSerializer(message)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+        # Push the new message to everyone connected to the room's websocket
+        # so they don't have to re-fetch the history to see it.
+        message_data = serializer.data
+        transaction.on_commit(lambda: broadcast_room_message(room.id, dict(message_data)))
+
+        return Response(message_data, status=status.HTTP_201_CREATED)
+
+
+class MessageExportView(APIView):
+    """
+    A room's whole message history, streamed as NDJSON (the default) or CSV
+    (?as=csv), gzipped when the client accepts it (backend/export.py).
+    Only for the room's creator and staff.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_encoder(self, request, room):
+        """(TranscriptEncoder, None), or (None, error response)."""
+        if room.creator_id != request.user.id and not request.user.is_staff:
+            return None, Response({'detail': 'Only the room creator can export its messages.'}, status=status.HTTP_403_FORBIDDEN)
+        file_format = request.query_params.get('as', 'ndjson')
+        if file_format not in TranscriptEncoder.content_types:
+            return None, Response({'detail': 'as must be ndjson or csv.'}, status=status.HTTP_400_BAD_REQUEST)
+        return TranscriptEncoder(file_format, accepts_gzip(request)), None
+
+    def get(self, request, pk):
+        try:
+            room = Room.objects.only('id', 'creator_id').get(pk=pk)
+        except Room.DoesNotExist:
+            return Response({'detail': 'Room not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        encoder, error = self.get_encoder(request, room)
+        if error is not None:
+            return error
+        # The body is read after the view returns, outside the replica
+        # routing, so pick the database now.
+        using = router.db_for_read(Message)
+        content = transcript(encoder, room.id, using, settings.MESSAGE_EXPORT_CHUNK_SIZE)
+        return transcript_response(encoder, room.id, content)
 
 
 
+
+class SearchView(APIView):
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 50
+
+    def get_search(self, search_type):
+        # Each search type is backed by a generated tsvector column with a GIN index
+        if search_type == 'rooms':
+            return Room.objects.with_participant_ids(), RoomSerializer
+        if search_type == 'topics':
+            return Topic.objects.defer('search_vector'), TopicSerializer
+        if search_type == 'messages':
+            return Message.objects.defer('search_vector'), MessageSearchSerializer
+        return None, None
+
+    def get(self, request):
+        query_text = request.query_params.get('q', '').strip()
+        search_type = request.query_params.get('type', 'rooms')
+
+        if not query_text:
+            return Response({'detail': 'Search query is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset, serializer_class = self.get_search(search_type)
+        if queryset is None:
+            return Response({'detail': 'Invalid search type.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            page_size = max(1, min(int(request.query_params.get('page_size', self.page_size)), self.max_page_size))
+        except ValueError:
+            return Response({'detail': 'Invalid page.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        query = SearchQuery(query_text, search_type='websearch', config='english')
+        results = (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-id')
+        )
+
+        offset = (page - 1) * page_size
+        rows = list(results[offset:offset + page_size + 1])
+
+        return Response({
+            'type': search_type,
+            'page': page,
+            'next_page': page + 1 if len(rows) > page_size else None,
+            'results': serializer_class(rows[:page_size], many=True).data
+        }, status=status.HTTP_200_OK)
+
+
 class RoomListView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get(self, request):
         try:
             topic_id = request.query_params.get('topic')
-            if topic_id:
-                rooms = Room.objects.filter(topic_id=topic_id)
-            else:
-                rooms = Room.objects.all()
-            
-            if not rooms.exists():
-                return Response([], status=status.HTTP_200_OK)
-            
-            serializer = RoomSerializer(rooms, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            if topic_id and not topic_id.isdigit():
+                return Response({'detail': 'Invalid topic.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            since = request.query_params.get('since')
+            if since is not None:
+                return changes_response(room_changes, topic_id, since)
+
+            def build():
+                return room_list_from(list(room_list_values(topic_id)), topic_id)
+
+            etag, last_modified = room_list_validators(topic_id)
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            return cached_list_response(*cached_room_list(topic_id, build))
         except Exception as e:
             import traceback
             print(f"Error in RoomListView: {str(e)}")
@@ -97,15 +337,139 @@ class RoomListView(APIView):
 
 
 
+class RoomSimilarView(APIView):
+    """The rooms most like this one (backend/recommendations.py), best first."""
+    permission_classes = [IsAuthenticated]
+    default_limit = 10
+
+    def get(self, request, pk):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.default_limit)), settings.ROOM_SIMILARITY_TOP_K))
+        except ValueError:
+            return Response({'detail': 'Invalid limit.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Room.objects.filter(pk=pk).exists():
+            return Response({'detail': 'Room not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(similar_rooms(pk, limit), status=status.HTTP_200_OK)
+
+
+class RecommendedRoomsView(APIView):
+    """
+    Rooms like the ones the user is in and that they haven't joined yet.
+    Empty for users who aren't in any room.
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.default_limit)), self.max_limit))
+        except ValueError:
+            return Response({'detail': 'Invalid limit.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(recommended_rooms(request.user.id, limit), status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class RoomPresenceView(APIView):
+    """
+    Who is in a room right now. Clients POST a heartbeat every
+    PRESENCE_TTL / 2 seconds or so while the room is open, and DELETE when
+    they leave. Nothing here touches the database, so the room isn't looked
+    up either; heartbeats for a room that doesn't exist simply expire.
+    """
+    permission_classes = [IsAuthenticated]
+    # Heartbeats aren't writes, so they don't pin the user to the primary
+    pins_primary = False
+
+    def get(self, request, pk):
+        users = presence.online_users([pk])[pk]
+        return Response({'room': pk, 'online': len(users), 'users': sorted(users)}, status=status.HTTP_200_OK)
+
+    def post(self, request, pk):
+        presence.heartbeat(pk, request.user.id)
+        return Response({
+            'room': pk,
+            'online': presence.online_counts([pk])[pk],
+            'ttl': settings.PRESENCE_TTL,
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request, pk):
+        presence.leave(pk, request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class PresenceView(APIView):
+    # Online counts for several rooms at once (?rooms=1,2,3), for room lists
+    permission_classes = [IsAuthenticated]
+    max_rooms = 200
+
+    def get(self, request):
+        try:
+            room_ids = [int(room_id) for room_id in request.query_params.get('rooms', '').split(',') if room_id]
+        except ValueError:
+            return Response({'detail': 'rooms must be a comma-separated list of ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        counts = presence.online_counts(room_ids[:self.max_rooms])
+        return Response({str(room_id): count for room_id, count in counts.items()}, status=status.HTTP_200_OK)
+
+
+class HealthView(APIView):
+    # For load balancers and container probes: no login, and nothing cached
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        start = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception as e:
+            print(f"Health check failed: {str(e)}")
+            return Response({'status': 'error', 'database': 'unavailable'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        data = {'status': 'ok', 'database_ms': round((time.perf_counter() - start) * 1000, 2)}
+        pools = pool_stats()
+        if pools:
+            data['pools'] = {
+                alias: {
+                    'size': stats.get('pool_size', 0),
+                    'available': stats.get('pool_available', 0),
+                    'waiting': stats.get('requests_waiting', 0),
+                }
+                for alias, stats in pools.items()
+            }
+        return Response(data, headers={'Cache-Control': 'no-store'})
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats.as_dict())
+
+
 class TopicListView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get(self, request):
         try:
-            topics = Topic.objects.all()
-            print("Fetched topics:", topics)
-            serializer = TopicSerializer(topics, many=True)
-            return Response(serializer.data)
+            since = request.query_params.get('since')
+            if since is not None:
+                return changes_response(topic_changes, since)
+
+            etag, last_modified = topic_list_validators()
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+            return cached_list_response(*cached_topic_list(topic_list_entry))
         except Exception as e:
             import traceback
             print(f"Error in TopicListView: {str(e)}")
@@ -197,7 +561,7 @@ class UserProfileView(APIView):
                 'username': user.username,
                 'email': user.email,
                 'profile': {
-                    'avatar': user.profile.avatar.url if hasattr(user, 'profile') and user.profile.avatar else '',
+                    'avatar': (avatar_url(user.profile) or '') if hasattr(user, 'profile') else '',
                     'bio': user.profile.bio if hasattr(user, 'profile') else '',
                     'full_name': user.profile.full_name if hasattr(user, 'profile') else ''
                 }
@@ -283,16 +647,18 @@ class CreateRoomView(APIView):
         if not name or not description or not topic_name:
             return Response({'detail': 'Missing required fields.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get and create the topic
-        topic, created = Topic.objects.get_or_create(name=topic_name)
+        with transaction.atomic():
+            # Get and create the topic
+            topic, created = Topic.objects.get_or_create(name=topic_name)
 
-        # Create the room
-        room = Room.objects.create(
-            creator=request.user,
-            topic=topic,
-            name=name,
-            description=description
-        )
+            # Create the room
+            room = Room.objects.create(
+                creator=request.user,
+                topic=topic,
+                name=name,
+                description=description
+            )
+            Topic.adjust_room_count(topic.id, 1)
 
         return Response(RoomSerializer(room).data, status=status.HTTP_201_CREATED)
 
@@ -304,15 +670,15 @@ class RoomDetailView(APIView):
 
     def get(self, request, pk):
         try:
-            room = Room.objects.get(pk=pk)
-            return Response({
-                'id': room.id,
-                'name': room.name,
-                'description': room.description,
-                'topic': room.topic.name if room.topic else None,
-                'creator': room.creator.id if room.creator else None,
-                'participants': list(room.participants.values('id'))
-            }, status=status.HTTP_200_OK)
+            etag, last_modified = room_validators(pk)
+            if etag:
+                response = not_modified(request, etag, last_modified)
+                if response is not None:
+                    return response
+
+            room = room_detail_queryset().get(pk=pk)
+            data = room_detail_data(room, list(room.participants.values('id')))
+            return set_validators(Response(data, status=status.HTTP_200_OK), etag, last_modified)
         except Room.DoesNotExist:
             print(f"Room with ID {pk} does not exist")
             return Response({'detail': 'Room not found.'}, status=status.HTTP_404_NOT_FOUND)
@@ -342,20 +708,26 @@ class RoomDetailView(APIView):
             room.name = request.data.get('name', room.name)
             room.description = request.data.get('description', room.description)
             
-            # Update topic if provided
-            topic_name = request.data.get('topic')
-            if topic_name:
-                try:
-                    topic, created = Topic.objects.get_or_create(name=topic_name)
-                    room.topic = topic
-                except Exception as e:
-                    print(f"Error updating topic: {str(e)}")
-                    return Response({'detail': 'Error updating topic'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            room.save()
+            with transaction.atomic():
+                # Update topic if provided
+                old_topic_id = room.topic_id
+                topic_name = request.data.get('topic')
+                if topic_name:
+                    try:
+                        topic, created = Topic.objects.get_or_create(name=topic_name)
+                        room.topic = topic
+                    except Exception as e:
+                        print(f"Error updating topic: {str(e)}")
+                        return Response({'detail': 'Error updating topic'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+                room.save()
+
+                if room.topic_id != old_topic_id:
+                    Topic.adjust_room_count(old_topic_id, -1)
+                    Topic.adjust_room_count(room.topic_id, 1)
 
             # Create activity log
-            Activity.objects.create(
+            record_activity(
                 user=user,
                 type='EDIT_ROOM',
                 description=f'Edited room: {room.name}'
@@ -392,14 +764,18 @@ class RoomDetailView(APIView):
                 )
             
             # Create activity log
-            Activity.objects.create(
+            record_activity(
                 user=user,
                 type='DELETE_ROOM',
                 description=f'Deleted room: {room.name}'
             )
             
             # Delete the room
-            room.delete()
+            with transaction.atomic():
+                _, deleted = room.delete()
+                # A concurrent delete of the same room already took it off the count
+                if deleted.get(Room._meta.label):
+                    Topic.adjust_room_count(room.topic_id, -1)
             
             return Response({'detail': 'Room deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
             
@@ -412,7 +788,7 @@ class RoomDetailView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def post(self, request, pk):
+    def post(self, request, pk, action=None):
         try:
             room = Room.objects.get(pk=pk)
             user = request.user
@@ -423,16 +799,13 @@ class RoomDetailView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
             
-            # Get the action from URL kwargs
-            action = request.parser_context['kwargs'].get('action')
-            
             if action == 'join':
                 # Add user as participant
                 room.participants.add(user)
                 room.save()
                 
                 # Create activity log
-                Activity.objects.create(
+                record_activity(
                     user=user,
                     type='JOIN_ROOM',
                     description=f'Joined room: {room.name}'
@@ -457,7 +830,7 @@ class RoomDetailView(APIView):
                 room.save()
                 
                 # Create activity log
-                Activity.objects.create(
+                record_activity(
                     user=user,
                     type='LEAVE_ROOM',
                     description=f'Left room: {room.name}'
@@ -499,15 +872,13 @@ class UserProfileView(APIView):
 
     def get(self, request, *args, **kwargs):
         try:
-            user = request.user
-            
-            return Response({
-                'avatar': user.profile.avatar.url if hasattr(user, 'profile') and user.profile.avatar else '',
-                'username': user.username,
-                'email': user.email,
-                'bio': user.profile.bio if hasattr(user, 'profile') else '',
-                'full_name': user.profile.full_name if hasattr(user, 'profile') else ''
-            })
+            data = profile_data(request.user)
+
+            etag = content_etag(data)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            return set_validators(Response(data), etag)
         except Exception as e:
             print(f"Profile error: {str(e)}")
             return Response(
@@ -525,7 +896,7 @@ class UserProfileView(APIView):
                 serializer.save()
                 
                 # Create activity log
-                Activity.objects.create(
+                record_activity(
                     user=user,
                     type='UPDATE_PROFILE',
                     description='Updated profile information'
@@ -544,16 +915,10 @@ class UserProfileView(APIView):
         try:
             user = request.user
             
-            # Delete user
+            # Delete user. No activity is logged: the user's activities go
+            # with them.
             user.delete()
             
-            # Create activity log
-            Activity.objects.create(
-                user=user,
-                type='DELETE_ACCOUNT',
-                description='Deleted account'
-            )
-            
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             print(f"Account delete error: {str(e)}")
@@ -596,6 +961,8 @@ class SignUpView(APIView):
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    # Checked before check_password, which is slow on purpose
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
     def post(self, request):
         email = request.data.get('email')
@@ -606,7 +973,7 @@ class LoginView(APIView):
 
         try:
             # Get user by email
-            user = User.objects.get(email=email)
+            user = User.objects.select_related('profile').get(email=email)
             if user.check_password(password):
                 # Create JWT tokens
                 refresh = RefreshToken.for_user(user)
@@ -617,7 +984,7 @@ class LoginView(APIView):
                     'email': user.email,
                     'username': user.username,
                     'profile': {
-                        'avatar': user.profile.avatar.url if hasattr(user, 'profile') and user.profile.avatar else '',
+                        'avatar': (avatar_url(user.profile) or '') if hasattr(user, 'profile') else '',
                         'bio': user.profile.bio if hasattr(user, 'profile') else '',
                         'full_name': user.profile.full_name if hasattr(user, 'profile') else ''
                     }
@@ -2,6 +2,8 @@
 ASGI config for backend_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django as before; websocket connections are routed to
+the consumers in ``backend.routing``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_project.settings')
 
-application = get_asgi_application()
+# Initialize Django before importing anything that touches the models.
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import OriginValidator  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from backend.authentication import JWTAuthMiddleware  # noqa: E402
+from backend.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': OriginValidator(
+        JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
+        settings.CORS_ALLOWED_ORIGINS,
+    ),
+})
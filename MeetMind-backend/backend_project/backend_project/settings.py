@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Loaded before anything reads the environment (DATABASES included)
+load_dotenv()
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -41,12 +48,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 AUTH_USER_MODEL = 'backend.User'
 
 
 MIDDLEWARE = [
+    'backend.middleware.MetricsMiddleware',
+    'backend.middleware.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,27 +86,73 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend_project.wsgi.application'
 
+ASGI_APPLICATION = 'backend_project.asgi.application'
+
+
+# Connection reuse:
+# - DB_CONN_MAX_AGE keeps each worker's connection open between requests
+#   (seconds, 'None' for no limit). For WSGI deployments only: under ASGI
+#   requests run in short-lived threads and their connections would leak.
+# - DB_POOL=True uses psycopg 3's connection pool instead, which is the one
+#   to use under ASGI, where every request may run in a different thread.
+#   Needs the psycopg[pool] package; persistent connections are turned off.
+# - DB_PGBOUNCER=True when connecting through pgbouncer in transaction
+#   mode, which can't keep server-side cursors open across transactions.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False') == 'True'
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', '0')
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'MeetMind',
-        'USER': 'postgres',
-        'PASSWORD': 'LamaAsiri0!',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.getenv('DB_NAME', 'MeetMind'),
+        'USER': os.getenv('DB_USER', 'postgres'),
+        'PASSWORD': os.getenv('DB_PASSWORD', 'LamaAsiri0!'),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else (None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)),
+        # Check a reused connection is still alive before the request uses it
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+        },
     }
 }
 
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        # Seconds a request waits for a free connection before failing
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        # Idle connections above min_size are closed after this many seconds
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+    }
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'backend.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Token buckets for backend/throttling.py: '30/min' allows a burst of 30,
+    # then refills at 30 a minute.
+    'DEFAULT_THROTTLE_RATES': {
+        'message-user': os.getenv('THROTTLE_MESSAGE_USER', '30/min'),
+        'message-ip': os.getenv('THROTTLE_MESSAGE_IP', '120/min'),
+        'login-ip': os.getenv('THROTTLE_LOGIN_IP', '20/min'),
+        'login-account': os.getenv('THROTTLE_LOGIN_ACCOUNT', '10/min'),
+    },
+    # Proxies in front of the app that append to X-Forwarded-For, so the
+    # per-IP limits see the client's address rather than the proxy's
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES')) if os.getenv('NUM_PROXIES') else None,
 }
 
+# Set THROTTLING=False to turn the rate limits off (the benchmarks do).
+THROTTLING = os.getenv('THROTTLING', 'True') == 'True'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,6 +189,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -167,12 +226,186 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
-from dotenv import load_dotenv
-import os
-from pathlib import Path
+SECRET_KEY = os.getenv('SECRET_KEY')
 
-load_dotenv()
 
-BASE_DIR = Path(__file__).resolve().parent.parent
+# Channel layer used to fan room messages out to websocket consumers.
+# The in-memory layer only reaches sockets served by the same process, so
+# multi-process deployments should set CHANNEL_REDIS_URL.
+if os.getenv('CHANNEL_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [os.getenv('CHANNEL_REDIS_URL')],
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+
+# Activity log writes are buffered in-process and flushed with bulk_create
+# (backend/activity.py). Set ACTIVITY_LOG_BUFFERED=False to write them
+# synchronously in the request instead.
+ACTIVITY_LOG_BUFFERED = os.getenv('ACTIVITY_LOG_BUFFERED', 'True') == 'True'
+ACTIVITY_LOG_BUFFER_SIZE = int(os.getenv('ACTIVITY_LOG_BUFFER_SIZE', '100'))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', '2'))
+# Activities kept waiting while the database is unavailable; the oldest go past this
+ACTIVITY_LOG_MAX_PENDING = int(os.getenv('ACTIVITY_LOG_MAX_PENDING', '10000'))
+
+# Retention for the activity log, enforced by `manage.py prune_activities`
+# (run it daily from cron). 0 turns either limit off.
+ACTIVITY_RETENTION_DAYS = int(os.getenv('ACTIVITY_RETENTION_DAYS', '90'))
+ACTIVITY_MAX_PER_USER = int(os.getenv('ACTIVITY_MAX_PER_USER', '200'))
+ACTIVITY_PRUNE_BATCH_SIZE = int(os.getenv('ACTIVITY_PRUNE_BATCH_SIZE', '1000'))
+
+
+# Cache used for the topic and room list responses (backend/cache.py).
+# A write bumps the lists' generation in this cache, so every worker has to
+# share it or the others keep serving the old lists until they expire. By
+# default it's a file cache the workers on this machine share; with several
+# machines set CACHE_BACKEND=db (after `manage.py createcachetable`).
+# CACHE_BACKEND=locmem is only for a single worker process (WEB_CONCURRENCY).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+if CACHE_BACKEND == 'locmem':
+    if WEB_CONCURRENCY > 1:
+        raise ImproperlyConfigured('CACHE_BACKEND=locmem is per process; use file or db with WEB_CONCURRENCY > 1.')
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'api_cache',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        },
+    }
+
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', '300'))
+
+# Rate-limit buckets (backend/throttling.py). Every worker has to see the
+# same buckets, or each one allows the full rate on its own, so they never
+# live in per-process memory: by default a file cache shared by the
+# workers on this machine. With several machines behind a load balancer
+# set THROTTLE_CACHE_BACKEND=db (after `manage.py createcachetable`) to
+# share them through the database.
+if os.getenv('THROTTLE_CACHE_BACKEND') == 'db':
+    CACHES['throttle'] = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'throttle_cache',
+    }
+else:
+    CACHES['throttle'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION', str(BASE_DIR / '.throttle-cache')),
+    }
+
+
+# Background work such as avatar resizing (backend/tasks.py) runs on a thread
+# pool after the request's transaction commits. BACKGROUND_TASKS_EAGER=True
+# runs it inline instead.
+BACKGROUND_TASKS_EAGER = os.getenv('BACKGROUND_TASKS_EAGER', 'False') == 'True'
+
+
+# How long (seconds) an authenticated user and their profile are kept in the
+# per-process cache used by CachedJWTAuthentication. 0 turns the cache off.
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', '30'))
+
+
+# Serve the read-heavy endpoints (room list/detail, messages, topics, recent
+# activity) from the async views in backend/async_views.py. They only pay
+# off under the ASGI server; set ASYNC_VIEWS=False for a WSGI deployment.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'True') == 'True'
+
+
+# Delta sync for the room and topic lists (?since=, backend/sync.py).
+# Tombstones for deleted rows are kept this long; clients with an older
+# cursor get a full list instead.
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+SYNC_CURSOR_LAG = float(os.getenv('SYNC_CURSOR_LAG', '5'))
+
+
+# backend_message is partitioned by month (backend/partitions.py).
+# `manage.py message_partitions` keeps this many months of partitions ready
+# ahead of time, and with --archive moves months older than
+# MESSAGE_HOT_MONTHS into MessageArchive.
+MESSAGE_PARTITION_MONTHS_AHEAD = int(os.getenv('MESSAGE_PARTITION_MONTHS_AHEAD', '3'))
+MESSAGE_HOT_MONTHS = int(os.getenv('MESSAGE_HOT_MONTHS', '12'))
+
+
+# Read replicas (backend/routers.py). DB_REPLICA_HOSTS is a comma-separated
+# list of host[:port], reached with the default database's name and
+# credentials. GET requests to REPLICA_READ_VIEWS read from a replica; a
+# user who just wrote something reads from the primary for
+# REPLICA_PIN_SECONDS afterwards.
+REPLICA_DATABASES = []
+for _host in filter(None, (host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    _alias = f'replica{len(REPLICA_DATABASES) + 1}'
+    _host, _, _port = _host.partition(':')
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(_alias)
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+REPLICA_READ_VIEWS = [
+    'list-rooms', 'topic-list', 'message-list', 'message-export', 'recent-activities', 'room-detail',
+    'similar-rooms', 'recommended-rooms',
+]
+REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', '10'))
+
+
+# Room presence (backend/presence.py): a user counts as online in a room
+# for PRESENCE_TTL seconds after their last heartbeat. Each worker writes
+# its share to the 'presence' cache every PRESENCE_SNAPSHOT_INTERVAL seconds
+# and reads the others' from there, so like the rate-limit buckets it's a
+# file cache the workers on this machine share, or the database with
+# PRESENCE_CACHE_BACKEND=db (after `manage.py createcachetable`).
+PRESENCE_TTL = float(os.getenv('PRESENCE_TTL', '60'))
+PRESENCE_SNAPSHOT_INTERVAL = float(os.getenv('PRESENCE_SNAPSHOT_INTERVAL', '10'))
+if os.getenv('PRESENCE_CACHE_BACKEND') == 'db':
+    CACHES['presence'] = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'presence_cache',
+    }
+else:
+    CACHES['presence'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('PRESENCE_CACHE_LOCATION', str(BASE_DIR / '.presence-cache')),
+    }
+
+
+# Message history export (backend/export.py): rows read, encoded and sent
+# per chunk. Larger chunks mean fewer round trips but more memory.
+MESSAGE_EXPORT_CHUNK_SIZE = int(os.getenv('MESSAGE_EXPORT_CHUNK_SIZE', '2000'))
+
 
-SECRET_KEY = os.getenv('SECRET_KEY')  
\ No newline at end of file
+# Room recommendations (backend/recommendations.py): each room keeps its
+# ROOM_SIMILARITY_TOP_K most similar rooms. Sharing a topic adds
+# ROOM_SIMILARITY_TOPIC_WEIGHT to the participant overlap (a cosine, 0-1);
+# rooms with nobody in common are only considered among the topic's
+# ROOM_SIMILARITY_TOPIC_CANDIDATES rooms with the most participants. The
+# batch job works on ROOM_SIMILARITY_BATCH_SIZE rooms at a time.
+ROOM_SIMILARITY_TOP_K = int(os.getenv('ROOM_SIMILARITY_TOP_K', '20'))
+ROOM_SIMILARITY_TOPIC_WEIGHT = float(os.getenv('ROOM_SIMILARITY_TOPIC_WEIGHT', '0.2'))
+ROOM_SIMILARITY_TOPIC_CANDIDATES = int(os.getenv('ROOM_SIMILARITY_TOPIC_CANDIDATES', '20'))
+ROOM_SIMILARITY_BATCH_SIZE = int(os.getenv('ROOM_SIMILARITY_BATCH_SIZE', '2000'))
@@ -10,6 +10,7 @@ function Home() {
   const [user, setUser] = useState({})
   const [rooms, setRooms] = useState([])
   const [topics, setTopics] = useState([])
+  const [activities, setActivities] = useState(null)
   const [error, setError] = useState('')
   const [searchQuery, setSearchQuery] = useState('')
   const [showDropdown, setShowDropdown] = useState(false)
@@ -17,93 +18,41 @@ function Home() {
   const navigate = useNavigate()
 
   useEffect(() => {
-    const fetchUserProfile = async () => {
+    // Profile, rooms, topics and recent activity all come from one request
+    const fetchDashboard = async () => {
       const token = localStorage.getItem('access')
       if (!token) {
         setError('Not authenticated. Please login first.')
+        setLoading(false)
         return
       }
 
       try {
-        const response = await axios.get('http://127.0.0.1:8000/api/users/me/', {
+        const response = await axios.get('http://127.0.0.1:8000/api/dashboard/', {
           headers: { Authorization: `Bearer ${token}` },
         })
-        setUser(response.data);
+        setUser(response.data.profile)
+        setRooms(response.data.rooms)
+        setTopics(response.data.topics)
+        setActivities(response.data.activities)
       } catch (err) {
-        if (err.response?.status === 401) {
-          setError('Session expired. Please login again.')
-        } else {
-          setError('Error fetching user profile')
-        }
-        console.log(err)
-      }
-    }
+        console.error('Error fetching dashboard:', err)
 
-    const handleLogout = () => {
-      localStorage.removeItem('access')
-      localStorage.removeItem('refresh')
-      navigate('/login')
-    }
-
-    const fetchRooms = async () => {
-      const token = localStorage.getItem('access')
-      if (!token) {
-        setError('Not authenticated. Please login first.')
-        return
-      }
-
-      try {
-        const response = await axios.get('http://127.0.0.1:8000/api/rooms/', {
-          headers: { Authorization: `Bearer ${token}` },
-        })
-        console.log('Rooms response:', response.data)
-        setRooms(response.data)
-      } catch (err) {
-        console.error('Full error details:', err)
-        console.error('Error response:', err.response?.data)
-        
         if (err.response?.status === 401) {
           setError('Session expired. Please login again.')
         } else if (err.response?.status === 403) {
           setError('Access denied. Please contact support.')
-        } else if (err.response?.status === 404) {
-          setError('No rooms found.')
         } else if (err.response?.status === 500) {
           setError('Server error. Please try again later.')
         } else {
-          setError(`Error fetching rooms: ${err.message || 'Please try again later.'}`)
-        }
-      }
-    }
-
-    const fetchTopics = async () => {
-      const token = localStorage.getItem('access')
-      if (!token) {
-        setError('Not authenticated. Please login first.')
-        setLoading(false)
-        return
-      }
-
-      try {
-        const response = await axios.get('http://127.0.0.1:8000/api/topics/', {
-          headers: { Authorization: `Bearer ${token}` },
-        })
-        setTopics(response.data)
-        setLoading(false)
-      } catch (err) {
-        if (err.response?.status === 401) {
-          setError('Session expired. Please login again.')
-        } else {
-          setError(`Error fetching topics: ${err.response?.data?.error || 'Please try again later.'}`)
+          setError(`Error loading the dashboard: ${err.message || 'Please try again later.'}`)
         }
-        console.error('Error fetching topics:', err)
+      } finally {
         setLoading(false)
       }
     }
 
-    fetchUserProfile()
-    fetchRooms()
-    fetchTopics()
+    fetchDashboard()
   }, [])
 
   const handleLogout = () => {
@@ -239,7 +188,7 @@ function Home() {
               )}
             </div>
 
-            <RecentActivity />
+            <RecentActivity activities={activities} />
           </div>
         </div>
       </div>
@@ -12,7 +12,9 @@ const ACTIVITY_TYPES = {
   ROOM_UPDATE: 'Updated Room'
 }
 
-function RecentActivity() {
+// Pass `activities` when the parent already has them (Home gets them from
+// /api/dashboard/); otherwise they're fetched here.
+function RecentActivity({ activities: providedActivities }) {
   const [activities, setActivities] = useState([])
   const [error, setError] = useState('')
   const [loading, setLoading] = useState(true)
@@ -42,6 +44,14 @@ function RecentActivity() {
   }
 
   useEffect(() => {
+    if (providedActivities !== undefined) {
+      if (providedActivities !== null) {
+        setActivities(providedActivities)
+        setLoading(false)
+      }
+      return
+    }
+
     const fetchActivities = async () => {
       const token = localStorage.getItem('access')
       
@@ -112,7 +122,7 @@ function RecentActivity() {
     }
 
     fetchActivities()
-  }, [navigate])
+  }, [navigate, providedActivities])
 
   return (
     <div className="fixed right-4 top-20 bg-gradient-to-br from-purple-900/90 to-gray-900/90 rounded-t-xl shadow-lg">
@@ -14,6 +14,7 @@ function StudyRoom() {
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
   const [showLeaveConfirmation, setShowLeaveConfirmation] = useState(false)
+  const [online, setOnline] = useState(null)
 
   useEffect(() => {
     console.log('StudyRoom component mounted with roomId:', roomId)
@@ -40,8 +41,8 @@ function StudyRoom() {
           headers: { 'Authorization': `Bearer ${token}` }
         })
 
-        // Filter messages to ensure they belong to this room
-        const filteredMessages = messagesResponse.data.filter(message => message.room === roomId)
+        // Messages come back newest page first, oldest to newest within the page
+        const roomMessages = messagesResponse.data.results
 
         console.log('Messages response:', JSON.stringify(messagesResponse.data, null, 2))
 
@@ -51,7 +52,7 @@ function StudyRoom() {
 
         if (roomData && messagesResponse.data) {
           setRoom(roomData)
-          setMessages(filteredMessages)
+          setMessages(roomMessages)
           setError('')
         } else {
           setError('Invalid response from server')
@@ -68,6 +69,46 @@ function StudyRoom() {
     fetchRoomData()
   }, [roomId])
 
+  useEffect(() => {
+    const token = localStorage.getItem('access')
+    if (!token) return
+
+    // The server pushes every new message for this room over the socket,
+    // so we don't need to re-fetch the whole history to see them
+    const socket = new WebSocket(`ws://127.0.0.1:8000/ws/rooms/${roomId}/?token=${token}`)
+
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data)
+      if (data.type === 'message') {
+        addMessage(data.message)
+      } else if (data.type === 'presence' || data.type === 'pong') {
+        setOnline(data.online)
+      }
+    }
+
+    // Pings keep us counted as online in the room (the server forgets us
+    // a minute after the last one) and bring back the current count
+    const heartbeat = setInterval(() => {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'ping' }))
+      }
+    }, 25000)
+
+    return () => {
+      clearInterval(heartbeat)
+      socket.close()
+    }
+  }, [roomId])
+
+  const addMessage = (message) => {
+    // Our own messages arrive both from the POST response and the socket
+    setMessages(prevMessages => (
+      prevMessages.some(existing => existing.id === message.id)
+        ? prevMessages
+        : [...prevMessages, message]
+    ))
+  }
+
   const handleSendMessage = async (e) => {
     e.preventDefault() // Prevent form submission
     const token = localStorage.getItem('access')
@@ -94,7 +135,7 @@ function StudyRoom() {
       )
 
       // Add the new message to the state
-      setMessages(prevMessages => [...prevMessages, response.data])
+      addMessage(response.data)
       
       // Clear the input field
       setNewMessage('')
@@ -166,7 +207,12 @@ function StudyRoom() {
           <div className="flex flex-col lg:flex-row gap-8">
             <div className="lg:w-1/3 bg-gray-800/50 rounded-xl p-6">
               <div className="flex items-center justify-between mb-6">
-                <h1 className="text-2xl font-bold text-purple-400">{room.name}</h1>
+                <div>
+                  <h1 className="text-2xl font-bold text-purple-400">{room.name}</h1>
+                  {online !== null && (
+                    <p className="text-sm text-green-400">{online} online now</p>
+                  )}
+                </div>
                 <button
                   onClick={() => setShowLeaveConfirmation(true)}
                   className="px-4 py-2 bg-red-600/90 text-white rounded-md hover:bg-red-700/90 transition-colors"
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import axios from 'axios'
 import { useParams, useNavigate } from 'react-router-dom'
+import { syncRooms } from '../roomSync'
 
 
 
@@ -45,11 +46,8 @@ function StudyRooms() {
 
       try {
         setLoading(true)
-        const response = await axios.get(`http://127.0.0.1:8000/api/rooms/?topic=${topicId}`, {
-          headers: { Authorization: `Bearer ${token}` },
-        })
-        console.log("Rooms fetched:", response.data)
-        setRooms(response.data)
+        const syncedRooms = await syncRooms(token, topicId)
+        setRooms(syncedRooms)
         setError('')
       } catch (error) {
         console.error('Error fetching rooms:', error)
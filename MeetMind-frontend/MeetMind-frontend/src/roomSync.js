@@ -0,0 +1,50 @@
+import axios from 'axios'
+
+const ROOMS_URL = 'http://127.0.0.1:8000/api/rooms/'
+
+const storageKey = (topicId) => `rooms:${topicId || 'all'}`
+
+const loadStored = (topicId) => {
+  try {
+    return JSON.parse(localStorage.getItem(storageKey(topicId)))
+  } catch {
+    return null
+  }
+}
+
+// Keeps a copy of each room list in localStorage and only asks the API for
+// the rooms that changed (and the ids that were deleted) since the last sync.
+export async function syncRooms(token, topicId) {
+  const stored = loadStored(topicId)
+  const params = { since: stored?.cursor || '0' }
+  if (topicId) {
+    params.topic = topicId
+  }
+
+  let response
+  try {
+    response = await axios.get(ROOMS_URL, {
+      headers: { Authorization: `Bearer ${token}` },
+      params,
+    })
+  } catch (err) {
+    if (err.response?.status === 400 && stored) {
+      // Cursor we can't use any more; start over with a full sync
+      localStorage.removeItem(storageKey(topicId))
+      return syncRooms(token, topicId)
+    }
+    throw err
+  }
+
+  const { results, deleted, cursor, reset } = response.data
+  const roomsById = new Map(reset || !stored ? [] : stored.rooms.map((room) => [room.id, room]))
+  deleted.forEach((id) => roomsById.delete(id))
+  results.forEach((room) => roomsById.set(room.id, room))
+
+  // Same order as the API's full list: most recently updated first
+  const rooms = [...roomsById.values()].sort(
+    (a, b) => new Date(b.updated) - new Date(a.updated) || new Date(b.created) - new Date(a.created)
+  )
+  localStorage.setItem(storageKey(topicId), JSON.stringify({ cursor, rooms }))
+  return rooms
+}